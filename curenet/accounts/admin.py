@@ -1,12 +1,126 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import User, PatientProfile, DoctorProfile, Clinic
+from . import approvals, archival, export, search
+from .models import (
+    User, PatientProfile, DoctorProfile, Clinic, SearchDocument, AvailabilityRule, Appointment, MedicalRecord,
+    ArchivedPatientProfile, ArchivedDoctorProfile, AuditEvent, Job,
+)
+from .pagination import EstimatedCountPaginator
+
+# Most full-text matches the admin changelist considers per search
+ADMIN_SEARCH_LIMIT = 1000
+# Most clinics offered in the changelist sidebar filter
+CLINIC_FILTER_LIMIT = 50
+
+
+class FullTextSearchMixin:
+    """
+    Answer changelist searches from the full-text index instead of joined
+    ``icontains`` scans over ``search_fields``.
+    """
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        ids = search.search_ids(search_term, self.search_kind, limit=ADMIN_SEARCH_LIMIT)
+        return queryset.filter(pk__in=ids), False
+
+
+class ClinicListFilter(admin.RelatedFieldListFilter):
+    """
+    Clinic sidebar filter bounded to the first CLINIC_FILTER_LIMIT active
+    clinics (plus the selected one), instead of every clinic.
+    """
+
+    def field_choices(self, field, request, model_admin):
+        clinics = Clinic.objects.filter(is_active=True).order_by('name').values_list('pk', 'name')
+        choices = list(clinics[:CLINIC_FILTER_LIMIT])
+        if self.lookup_val and not any(str(pk) in self.lookup_val for pk, _ in choices):
+            if not all(value.isdigit() for value in self.lookup_val):
+                # Redirected to ?e=1 like Django's own filters
+                raise IncorrectLookupParameters(f'Invalid clinic id in {self.lookup_val}.')
+            choices += list(Clinic.objects.filter(pk__in=self.lookup_val).values_list('pk', 'name'))
+        return choices
+
+
+class ActiveListFilter(admin.SimpleListFilter):
+    """
+    Status filter that shows active profiles unless asked otherwise, so the
+    default changelist reads and counts the partial ``*_active_idx`` index.
+    """
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return [('inactive', 'Inactive'), ('all', 'All')]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'Active',
+        }
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        if self.value() == 'all':
+            return queryset
+        return queryset.filter(is_active=self.value() != 'inactive')
+
+
+class OnlyChangeList(ChangeList):
+    """Changelist that loads only the columns its admin lists."""
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        return queryset.only(*self.model_admin.list_only)
+
+
+class ChangelistPerformanceMixin:
+    """
+    Changelist defaults for large tables: estimated counts, no second
+    unfiltered COUNT(*), and a narrow SELECT when ``list_only`` is set.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_only = None
+
+    def get_changelist(self, request, **kwargs):
+        return OnlyChangeList if self.list_only else super().get_changelist(request, **kwargs)
+
+
+class ExportMixin:
+    """Admin action streaming the selected rows as a CSV roster."""
+
+    def export_csv(self, request, queryset):
+        """Admin action to stream selected rows as CSV."""
+        name = export.roster_for_model(self.model)
+        chunks = export.stream_roster(name, 'csv', queryset=queryset)
+        if isinstance(request, ASGIRequest):
+            chunks = export.aiter_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{name}.csv"'
+        return response
+    export_csv.short_description = 'Export selected rows as CSV'
 
 
 @admin.register(Clinic)
-class ClinicAdmin(admin.ModelAdmin):
+class ClinicAdmin(ExportMixin, FullTextSearchMixin, admin.ModelAdmin):
     """Admin interface for Clinic model."""
+    search_kind = SearchDocument.Kind.CLINIC
+    actions = ['export_csv']
     list_display = ['name', 'phone_number', 'email', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'email', 'phone_number', 'address']
@@ -62,10 +176,17 @@ class PatientProfileInline(admin.StackedInline):
 
 
 @admin.register(PatientProfile)
-class PatientProfileAdmin(admin.ModelAdmin):
+class PatientProfileAdmin(ExportMixin, ChangelistPerformanceMixin, admin.ModelAdmin):
     """Admin interface for PatientProfile."""
+    actions = ['export_csv']
     list_display = ['user', 'gender', 'date_of_birth', 'phone_number', 'is_active', 'created_at']
-    list_filter = ['gender', 'is_active', 'created_at']
+    list_select_related = ['user']
+    list_only = [
+        'gender', 'date_of_birth', 'phone_number', 'is_active', 'created_at',
+        'user__username', 'user__role',
+    ]
+    autocomplete_fields = ['user']
+    list_filter = [ActiveListFilter, 'gender', 'created_at']
     search_fields = ['user__username', 'user__email', 'user__first_name', 'user__last_name', 'phone_number']
     readonly_fields = ['created_at', 'updated_at']
     fieldsets = (
@@ -99,11 +220,27 @@ class DoctorProfileInline(admin.StackedInline):
     fields = ('specialization', 'qualification', 'experience_years', 'clinic', 'is_approved', 'is_active')
 
 
+class AvailabilityRuleInline(admin.TabularInline):
+    """Weekly working hours; `manage.py materializeslots` turns them into slots."""
+    model = AvailabilityRule
+    extra = 0
+    fields = ('weekday', 'start_time', 'end_time', 'slot_minutes', 'clinic', 'valid_from', 'valid_until', 'is_active')
+    autocomplete_fields = ['clinic']
+
+
 @admin.register(DoctorProfile)
-class DoctorProfileAdmin(admin.ModelAdmin):
+class DoctorProfileAdmin(ExportMixin, FullTextSearchMixin, ChangelistPerformanceMixin, admin.ModelAdmin):
     """Admin interface for DoctorProfile."""
+    search_kind = SearchDocument.Kind.DOCTOR
+    inlines = [AvailabilityRuleInline]
     list_display = ['user', 'specialization', 'clinic', 'qualification', 'experience_years', 'is_approved', 'is_active', 'created_at']
-    list_filter = ['specialization', 'is_approved', 'is_active', 'clinic', 'created_at']
+    list_filter = [ActiveListFilter, 'specialization', 'is_approved', ('clinic', ClinicListFilter), 'created_at']
+    list_select_related = ['user', 'clinic']
+    list_only = [
+        'specialization', 'qualification', 'experience_years', 'is_approved', 'is_active', 'created_at',
+        'user__username', 'user__role', 'user__first_name', 'user__last_name', 'clinic__name',
+    ]
+    autocomplete_fields = ['user', 'clinic']
     search_fields = [
         'user__username', 'user__email', 'user__first_name', 'user__last_name',
         'specialization', 'qualification', 'clinic__name'
@@ -130,28 +267,28 @@ class DoctorProfileAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
-    actions = ['approve_doctors', 'reject_doctors']
+    actions = ['approve_doctors', 'reject_doctors', 'export_csv']
     
     def approve_doctors(self, request, queryset):
         """Admin action to approve selected doctors."""
-        # Check for doctors without clinic assignment
-        doctors_without_clinic = queryset.filter(clinic__isnull=True)
-        if doctors_without_clinic.exists():
+        # Approves every selected doctor with a clinic; the rest are reported
+        result = approvals.approve(queryset)
+        if result.blocked:
             self.message_user(
                 request, 
-                f'Warning: {doctors_without_clinic.count()} doctor(s) do not have a clinic assigned. '
-                f'Please assign clinics individually before approving.',
+                f'Warning: {len(result.blocked)} doctor(s) do not have a clinic assigned and were not approved. '
+                f'Please assign clinics before approving them.',
                 level='warning'
             )
-            return
-        
-        updated = queryset.update(is_approved=True)
-        self.message_user(request, f'{updated} doctor(s) approved successfully.')
+        if result.approved:
+            self.message_user(request, f'{len(result.approved)} doctor(s) approved successfully.')
+        if result.already_approved:
+            self.message_user(request, f'{len(result.already_approved)} doctor(s) were already approved.')
     approve_doctors.short_description = 'Approve selected doctors (requires clinic assignment)'
     
     def reject_doctors(self, request, queryset):
         """Admin action to reject selected doctors."""
-        updated = queryset.update(is_approved=False)
+        updated = approvals.reject(queryset)
         self.message_user(request, f'{updated} doctor(s) rejected.')
     reject_doctors.short_description = 'Reject selected doctors'
 
@@ -160,3 +297,111 @@ class DoctorProfileAdmin(admin.ModelAdmin):
         if obj:  # editing an existing object
             readonly.append('user')
         return readonly
+
+
+@admin.register(Appointment)
+class AppointmentAdmin(admin.ModelAdmin):
+    """Admin interface for Appointment."""
+    list_display = ['start', 'doctor', 'patient', 'clinic', 'status', 'created_at']
+    list_filter = ['status', 'start']
+    list_select_related = ['doctor__user', 'patient__user', 'clinic']
+    autocomplete_fields = ['doctor', 'patient', 'clinic']
+    raw_id_fields = ['slot']
+    date_hierarchy = 'start'
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(MedicalRecord)
+class MedicalRecordAdmin(admin.ModelAdmin):
+    """Admin interface for MedicalRecord. Contents are uploaded through the API."""
+    list_display = ['title', 'patient', 'doctor', 'filename', 'content_type', 'created_at']
+    list_select_related = ['patient__user', 'doctor__user', 'blob']
+    autocomplete_fields = ['patient', 'doctor']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['blob', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
+class ArchivedProfileAdmin(admin.ModelAdmin):
+    """Read-only view of archived profiles; ``restore`` moves them back."""
+    profile_model = None
+    list_select_related = ['user']
+    search_fields = ['user__username', 'user__email']
+    date_hierarchy = 'archived_at'
+    actions = ['restore']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def restore(self, request, queryset):
+        """Admin action to move the selected profiles back, still inactive."""
+        result = archival.restore(self.profile_model, queryset.values_list('pk', flat=True))
+        self.message_user(
+            request, f'{len(result.restored)} profile(s) restored. Reactivate them from their profile page.'
+        )
+        if result.skipped:
+            self.message_user(
+                request,
+                f'{len(result.skipped)} profile(s) not restored; their user has a new profile: '
+                f'{", ".join(map(str, result.skipped))}.',
+                level='warning'
+            )
+    restore.short_description = 'Restore selected profiles'
+
+
+@admin.register(ArchivedPatientProfile)
+class ArchivedPatientProfileAdmin(ArchivedProfileAdmin):
+    """Admin interface for ArchivedPatientProfile."""
+    profile_model = PatientProfile
+    list_display = ['user', 'gender', 'date_of_birth', 'updated_at', 'archived_at']
+
+
+@admin.register(ArchivedDoctorProfile)
+class ArchivedDoctorProfileAdmin(ArchivedProfileAdmin):
+    """Admin interface for ArchivedDoctorProfile."""
+    profile_model = DoctorProfile
+    list_display = ['user', 'specialization', 'clinic', 'updated_at', 'archived_at']
+    list_select_related = ['user', 'clinic']
+
+
+@admin.register(AuditEvent)
+class AuditEventAdmin(ChangelistPerformanceMixin, admin.ModelAdmin):
+    """Read-only view of the audit trail; search by subject id."""
+    list_display = ['at', 'subject', 'subject_id', 'action', 'actor_id', 'changes']
+    list_filter = ['subject', 'action']
+    search_fields = ['=subject_id']
+    date_hierarchy = 'at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(ChangelistPerformanceMixin, admin.ModelAdmin):
+    """Queued, running and failed background jobs; finished jobs are deleted."""
+    list_display = ['id', 'kind', 'status', 'attempts', 'run_at', 'claim', 'created_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['kind', 'payload', 'status', 'attempts', 'run_at', 'claim', 'claimed_at', 'last_error', 'created_at']
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_jobs(self, request, queryset):
+        """Admin action to queue failed jobs again with a fresh attempt count."""
+        count = queryset.filter(status=Job.Status.FAILED).update(
+            status=Job.Status.QUEUED, attempts=0, run_at=timezone.now(),
+        )
+        self.message_user(request, f'{count} failed job(s) queued again.')
+    retry_jobs.short_description = 'Retry selected failed jobs'
@@ -0,0 +1,174 @@
+"""
+Appointment scheduling.
+
+Availability rules are materialized into Slot rows ahead of time
+(``materialize``), with ``bulk_create(ignore_conflicts=True)`` against the
+(doctor, start) unique constraint so reruns only add missing slots.
+
+Booking never checks and then inserts. It claims the slot with a
+conditional ``UPDATE ... WHERE is_booked = false`` (the first writer
+wins; everyone else updates zero rows) and inserts the appointment in the
+same transaction, with the partial unique constraint on (doctor, start)
+for BOOKED appointments as the last line of defence. Lock timeouts and
+serialization failures are retried with jittered backoff.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from django.db import IntegrityError, OperationalError, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from .models import Appointment, AvailabilityRule, DoctorProfile, Slot
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.005  # seconds, doubled per attempt
+# Days ahead ``rematerialize`` covers at least (``materializeslots`` default)
+HORIZON_DAYS = 14
+
+# Sent after slots change state, with doctor_id and the affected starts
+slots_changed = Signal()
+
+
+class SlotUnavailable(Exception):
+    """The slot does not exist, is already booked or has started."""
+
+
+class DoctorNotListed(Exception):
+    """The doctor is not approved and active, so takes no bookings."""
+
+
+def _rule_slots(rule, day, clinic_id):
+    start = timezone.make_aware(datetime.combine(day, rule.start_time))
+    end = timezone.make_aware(datetime.combine(day, rule.end_time))
+    length = timedelta(minutes=rule.slot_minutes)
+    while start + length <= end:
+        yield Slot(doctor_id=rule.doctor_id, clinic_id=clinic_id, start=start, end=start + length)
+        start += length
+
+
+def materialize(doctors, start_date, days, batch_size=1000):
+    """
+    Create the slots of ``doctors`` (a DoctorProfile queryset) for ``days``
+    days from ``start_date``. Existing slots are left alone. Returns the
+    number of slots considered.
+    """
+    rules = (
+        AvailabilityRule.objects.filter(doctor__in=doctors, is_active=True)
+        .select_related('doctor')
+        .order_by('doctor_id', 'weekday', 'start_time')
+    )
+    by_weekday = {}
+    for rule in rules:
+        by_weekday.setdefault(rule.weekday, []).append(rule)
+
+    slots, changed = [], {}
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        for rule in by_weekday.get(day.weekday(), []):
+            if (rule.valid_from and day < rule.valid_from) or (rule.valid_until and day > rule.valid_until):
+                continue
+            for slot in _rule_slots(rule, day, rule.clinic_id or rule.doctor.clinic_id):
+                slots.append(slot)
+                changed.setdefault(slot.doctor_id, []).append(slot.start)
+    Slot.objects.bulk_create(slots, batch_size=batch_size, ignore_conflicts=True)
+    for doctor_id, starts in changed.items():
+        slots_changed.send(sender=Slot, doctor_id=doctor_id, starts=starts)
+    return len(slots)
+
+
+def rematerialize(doctor_id, horizon_days=HORIZON_DAYS):
+    """
+    Rebuild the future free slots of a doctor after its rules changed.
+
+    Drops the unbooked future slots no appointment refers to and
+    materializes the rules again for the next ``horizon_days`` and for
+    any later day that had dropped slots. Returns the number of slots
+    dropped.
+    """
+    free = Slot.objects.filter(
+        doctor_id=doctor_id, is_booked=False, start__gte=timezone.now(), appointments__isnull=True,
+    )
+    dropped = list(free.values_list('pk', 'start'))
+    Slot.objects.filter(pk__in=[pk for pk, _ in dropped]).delete()
+    doctors = DoctorProfile.objects.filter(pk=doctor_id)
+    today = timezone.localdate()
+    materialize(doctors, today, horizon_days)
+    for day in sorted({timezone.localdate(start) for _, start in dropped}):
+        if (day - today).days >= horizon_days:
+            materialize(doctors, day, 1)
+    if dropped:
+        # Refresh the index of the days that lost slots as well
+        slots_changed.send(sender=Slot, doctor_id=doctor_id, starts=[start for _, start in dropped])
+    return len(dropped)
+
+
+def free_slots(doctor_ids, after=None, until=None, limit=20):
+    """The next free slots of ``doctor_ids`` from ``after`` (default now), soonest first."""
+    slots = Slot.objects.filter(doctor_id__in=doctor_ids, is_booked=False, start__gte=after or timezone.now())
+    if until is not None:
+        slots = slots.filter(start__lt=until)
+    return slots.order_by('start', 'doctor_id')[:limit]
+
+
+def retrying(operation):
+    """Run ``operation``, retrying lock timeouts and serialization failures."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return operation()
+        except OperationalError:
+            # Lock timeout or serialization failure; the transaction rolled back
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def book(patient, doctor_id, start, reason=''):
+    """
+    Book the slot of ``doctor_id`` starting at ``start`` for ``patient``.
+    Raises DoctorNotListed when the doctor is not listed, SlotUnavailable
+    when the slot does not exist, is taken or is in the past.
+    """
+    if start < timezone.now():
+        raise SlotUnavailable(f'Slot of doctor {doctor_id} at {start} has already started.')
+
+    def claim():
+        with transaction.atomic():
+            claimed = Slot.objects.filter(
+                doctor_id=doctor_id, doctor__in=DoctorProfile.objects.listed(), start=start, is_booked=False,
+            ).update(is_booked=True)
+            if not claimed:
+                # Only failed claims pay for telling the two cases apart
+                if not DoctorProfile.objects.listed().filter(pk=doctor_id).exists():
+                    raise DoctorNotListed(f'Doctor {doctor_id} is not taking appointments.')
+                raise SlotUnavailable(f'Slot of doctor {doctor_id} at {start} is not available.')
+            slot = Slot.objects.only('id', 'clinic_id').get(doctor_id=doctor_id, start=start)
+            return Appointment.objects.create(
+                slot=slot, doctor_id=doctor_id, patient=patient, clinic_id=slot.clinic_id,
+                start=start, reason=reason,
+            )
+
+    try:
+        appointment = retrying(claim)
+    except IntegrityError:
+        # A stale BOOKED appointment still holds (doctor, start)
+        raise SlotUnavailable(f'Slot of doctor {doctor_id} at {start} is not available.')
+    slots_changed.send(sender=Slot, doctor_id=doctor_id, starts=[start])
+    return appointment
+
+
+def cancel(appointment):
+    """Cancel a booked appointment and free its slot."""
+    def release():
+        with transaction.atomic():
+            cancelled = Appointment.objects.filter(pk=appointment.pk, status=Appointment.Status.BOOKED).update(
+                status=Appointment.Status.CANCELLED, updated_at=timezone.now(),
+            )
+            if cancelled:
+                Slot.objects.filter(pk=appointment.slot_id).update(is_booked=False)
+            return cancelled
+
+    if retrying(release):
+        appointment.status = Appointment.Status.CANCELLED
+        slots_changed.send(sender=Slot, doctor_id=appointment.doctor_id, starts=[appointment.start])
+        return True
+    return False
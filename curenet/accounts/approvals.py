@@ -0,0 +1,146 @@
+"""
+Bulk doctor approval.
+
+Selections are partitioned into approvable and blocked (no clinic) doctors
+with one query, then updated in short chunked transactions so approving
+tens of thousands of rows never holds long locks. Once a run finishes a
+single ``doctors_approved`` signal is sent for every approved doctor.
+"""
+import csv
+from dataclasses import dataclass, field
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from . import audit, search
+from .models import Clinic, DoctorProfile
+from .services import invalidate_account_status
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Sent once per approval run with doctor_ids and user_ids of the approved
+doctors_approved = Signal()
+
+
+class UnknownClinics(ValueError):
+    """A clinic mapping names clinics that do not exist."""
+
+    def __init__(self, clinic_ids):
+        super().__init__(f'Unknown clinic(s): {", ".join(map(str, clinic_ids))}.')
+        self.clinic_ids = clinic_ids
+
+
+@dataclass
+class ApprovalResult:
+    approved: list = field(default_factory=list)
+    blocked: list = field(default_factory=list)
+    already_approved: list = field(default_factory=list)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def partition(queryset):
+    """
+    Split ``queryset`` into approvable, blocked (clinic missing) and
+    already approved rows in a single query. Returns three lists of
+    (doctor_id, user_id) pairs.
+    """
+    approvable, blocked, already_approved = [], [], []
+    rows = queryset.values_list('pk', 'user_id', 'clinic_id', 'is_approved').order_by('pk')
+    for pk, user_id, clinic_id, is_approved in rows:
+        if is_approved:
+            already_approved.append((pk, user_id))
+        else:
+            (blocked if clinic_id is None else approvable).append((pk, user_id))
+    return approvable, blocked, already_approved
+
+
+def _update_chunks(rows, chunk_size, action, **fields):
+    """
+    Apply ``fields`` to (doctor_id, user_id) rows, one transaction per
+    chunk, auditing them as ``action``.
+    """
+    for chunk in chunked(rows, chunk_size):
+        doctor_ids = [pk for pk, _ in chunk]
+        with transaction.atomic():
+            DoctorProfile.all_objects.filter(pk__in=doctor_ids).update(updated_at=timezone.now(), **fields)
+            audit.record(action, DoctorProfile, doctor_ids)
+        # update() sends no post_save, so refresh cached statuses here
+        invalidate_account_status([user_id for _, user_id in chunk])
+
+
+def assign_clinics(mapping, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Assign clinics from ``mapping`` ({doctor_id: clinic_id}), issuing one
+    UPDATE per clinic and chunk. Raises UnknownClinics before any update
+    when a clinic does not exist. Returns the number of rows updated.
+    """
+    by_clinic = {}
+    for doctor_id, clinic_id in mapping.items():
+        by_clinic.setdefault(clinic_id, []).append(doctor_id)
+    unknown = set(by_clinic) - set(Clinic.objects.filter(pk__in=list(by_clinic)).values_list('pk', flat=True))
+    if unknown:
+        raise UnknownClinics(sorted(unknown))
+    updated = 0
+    for clinic_id, doctor_ids in by_clinic.items():
+        for chunk in chunked(doctor_ids, chunk_size):
+            with transaction.atomic():
+                doctors = DoctorProfile.all_objects.filter(pk__in=chunk)
+                updated += doctors.update(clinic_id=clinic_id, updated_at=timezone.now())
+                audit.record(audit.Action.ASSIGN_CLINIC, DoctorProfile, chunk, {'clinic_id': clinic_id})
+                # The documents carry the clinic name, and update() sends no post_save
+                search.reindex_doctors(doctors, chunk_size)
+    return updated
+
+
+def read_clinic_mapping(file):
+    """Read a ``doctor_id,clinic_id`` CSV (with header) into a dict."""
+    return {
+        int(row['doctor_id']): int(row['clinic_id'])
+        for row in csv.DictReader(file)
+    }
+
+
+def approve(queryset, chunk_size=DEFAULT_CHUNK_SIZE, clinic=None, clinic_mapping=None):
+    """
+    Approve the doctors in ``queryset`` that have (or are given) a clinic.
+
+    ``clinic`` is assigned to every selected doctor without one;
+    ``clinic_mapping`` ({doctor_id: clinic_id}) assigns per selected
+    doctor first, and is ignored for doctors outside ``queryset``. Doctors
+    still without a clinic are returned as blocked. Doctors approved
+    before are left alone (no audit event, signal or email) and returned
+    as already_approved.
+    """
+    approvable, blocked, already_approved = partition(queryset)
+    if clinic_mapping:
+        selected = {pk for pk, _ in approvable + blocked}
+        mapping = {pk: clinic_id for pk, clinic_id in clinic_mapping.items() if pk in selected}
+        assign_clinics(mapping, chunk_size)
+        approvable = sorted(approvable + [row for row in blocked if row[0] in mapping])
+        blocked = [row for row in blocked if row[0] not in mapping]
+    if clinic is not None and blocked:
+        assign_clinics({pk: clinic.pk for pk, _ in blocked}, chunk_size)
+        approvable, blocked = sorted(approvable + blocked), []
+
+    _update_chunks(approvable, chunk_size, audit.Action.APPROVE, is_approved=True)
+    if approvable:
+        doctors_approved.send(
+            sender=DoctorProfile,
+            doctor_ids=[pk for pk, _ in approvable],
+            user_ids=[user_id for _, user_id in approvable],
+        )
+    return ApprovalResult(
+        approved=[pk for pk, _ in approvable],
+        blocked=[pk for pk, _ in blocked],
+        already_approved=[pk for pk, _ in already_approved],
+    )
+
+
+def reject(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Withdraw approval from every doctor in ``queryset``."""
+    rows = list(queryset.values_list('pk', 'user_id').order_by('pk'))
+    _update_chunks(rows, chunk_size, audit.Action.REJECT, is_approved=False)
+    return len(rows)
@@ -0,0 +1,130 @@
+"""
+Cold archival of deactivated profiles.
+
+Profiles inactive since before a cutoff are copied into the
+``Archived*Profile`` tables and deleted from the hot ones in batches, one
+transaction each, so the hot tables and their indexes hold only accounts
+that are in use. A profile still referenced by appointments, medical
+records or (for doctors) availability rules stays where it is: those rows
+point at it by foreign key and deleting it would cascade them away.
+
+A restore moves rows back under their old ids, still deactivated;
+reactivating them is an admin decision. Rows whose user has been given a
+new profile since stay archived.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Case, Exists, OuterRef, Value, When
+from django.utils import timezone
+from . import audit, search
+from .models import (
+    Appointment, ArchivedDoctorProfile, ArchivedPatientProfile, AvailabilityRule, DoctorProfile,
+    MedicalRecord, PatientProfile,
+)
+from .services import invalidate_account_status
+
+DEFAULT_BATCH_SIZE = 500
+
+ARCHIVES = {
+    PatientProfile: ArchivedPatientProfile,
+    DoctorProfile: ArchivedDoctorProfile,
+}
+# (model, field) of the rows that keep a profile in the hot table
+REFERENCES = {
+    PatientProfile: [(Appointment, 'patient'), (MedicalRecord, 'patient')],
+    DoctorProfile: [(Appointment, 'doctor'), (MedicalRecord, 'doctor'), (AvailabilityRule, 'doctor')],
+}
+
+
+@dataclass
+class RestoreResult:
+    restored: list = field(default_factory=list)
+    # Archived ids whose user has a profile in the hot table again
+    skipped: list = field(default_factory=list)
+
+
+def _columns(model):
+    """Attribute names copied between ``model`` and its archive."""
+    return [field.attname for field in ARCHIVES[model]._meta.concrete_fields if field.name != 'archived_at']
+
+
+def cutoff_for(days, now=None):
+    """Last-change time before which an inactive profile is archived."""
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def archivable(model, cutoff):
+    """Deactivated ``model`` profiles unchanged since ``cutoff`` that nothing references."""
+    queryset = model.all_objects.filter(is_active=False, updated_at__lt=cutoff)
+    for related, field in REFERENCES[model]:
+        queryset = queryset.exclude(Exists(related.objects.filter(**{field: OuterRef('pk')})))
+    return queryset
+
+
+def archive(model, days, batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """
+    Move ``model`` profiles inactive for more than ``days`` days into the
+    archive table. Returns the number of profiles moved.
+    """
+    cutoff = cutoff_for(days, now)
+    archive_model, columns = ARCHIVES[model], _columns(model)
+    candidates = archivable(model, cutoff).select_for_update().order_by('updated_at')
+    moved = 0
+    while True:
+        with transaction.atomic():
+            # Locked, so no appointment can start referencing them meanwhile
+            rows = list(candidates.values(*columns)[:batch_size])
+            if not rows:
+                break
+            archive_model.objects.bulk_create([archive_model(**row) for row in rows])
+            ids = [row['id'] for row in rows]
+            # Sends post_delete, which drops cached statuses and search documents
+            model.all_objects.filter(pk__in=ids).delete()
+            audit.record(audit.Action.ARCHIVE, model, ids)
+        moved += len(rows)
+        if len(rows) < batch_size:
+            break
+        # Referenced profiles skipped so far are not walked again
+        candidates = candidates.filter(updated_at__gte=rows[-1]['updated_at'])
+    return moved
+
+
+def restore(model, ids, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Move the archived ``model`` profiles with the given ids back into the
+    hot table, skipping those whose user has a live profile again.
+    Returns a RestoreResult.
+    """
+    archive_model, columns = ARCHIVES[model], _columns(model)
+    ids = sorted(set(ids))
+    result = RestoreResult()
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            rows = list(
+                archive_model.objects.select_for_update()
+                .filter(pk__in=ids[start:start + batch_size]).values(*columns)
+            )
+            taken = set(
+                model.all_objects.filter(user_id__in=[row['user_id'] for row in rows])
+                .values_list('user_id', flat=True)
+            )
+            result.skipped += [row['id'] for row in rows if row['user_id'] in taken]
+            rows = [row for row in rows if row['user_id'] not in taken]
+            if not rows:
+                continue
+            chunk = [row['id'] for row in rows]
+            # updated_at becomes now, so the profile is not archived again
+            # right away; auto_now_add overwrote created_at, so put it back
+            model.all_objects.bulk_create([model(**row) for row in rows])
+            model.all_objects.filter(pk__in=chunk).update(created_at=Case(
+                *[When(pk=row['id'], then=Value(row['created_at'])) for row in rows]
+            ))
+            archive_model.objects.filter(pk__in=chunk).delete()
+            audit.record(audit.Action.RESTORE, model, chunk)
+        # bulk_create sends no post_save
+        invalidate_account_status([row['user_id'] for row in rows])
+        if model is DoctorProfile:
+            search.index_new_doctors(chunk)
+        result.restored += chunk
+    return result
@@ -0,0 +1,128 @@
+"""
+ASGI-native versions of the login and dashboard views.
+
+They use the async ORM and async auth API end to end, so under ASGI no
+request is handed to a sync thread. The sync views in ``views.py`` stay
+in place for WSGI; ``accounts.urls`` picks the set per ``ASYNC_VIEWS``.
+Templates get ``user`` passed explicitly, since the lazy ``request.user``
+must not be evaluated from async code.
+"""
+from django.shortcuts import render, redirect
+from django.contrib.auth import aauthenticate, alogin
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from . import throttling
+from .middleware import aget_profile
+from .models import User
+from .services import LoginDecision, adecide_login
+
+
+async def login_view(request):
+    """Async login view with doctor approval check."""
+    current_user = await request.auser()
+    if current_user.is_authenticated:
+        return redirect('accounts:profile_redirect')
+
+    if request.method == 'POST':
+        username = request.POST.get('username')
+        password = request.POST.get('password')
+
+        retry_after = await throttling.acheck(request, username)
+        if retry_after is not None:
+            return throttling.throttled_response(request, retry_after, {'user': current_user})
+
+        user = await aauthenticate(request, username=username, password=password)
+
+        if user is not None:
+            await throttling.areset(username)
+            decision = await adecide_login(user)
+            if decision == LoginDecision.PENDING_APPROVAL:
+                messages.error(request, 'Your account is pending admin approval. Please wait for approval before logging in.')
+                return render(request, 'accounts/login.html', {'error': 'Account pending approval', 'user': current_user})
+            if decision == LoginDecision.DEACTIVATED:
+                messages.error(request, 'Your account has been deactivated. Please contact admin.')
+                return render(request, 'accounts/login.html', {'error': 'Account deactivated', 'user': current_user})
+
+            await alogin(request, user)
+            if decision == LoginDecision.NEEDS_PROFILE:
+                # Registered but profile not created yet
+                if user.role == User.Role.DOCTOR:
+                    return redirect('accounts:create_doctor_profile')
+                return redirect('accounts:create_patient_profile')
+            return redirect('accounts:profile_redirect')
+        else:
+            await throttling.arecord_failure(username)
+            messages.error(request, 'Invalid username or password.')
+
+    return render(request, 'accounts/login.html', {'user': current_user})
+
+
+@login_required
+async def profile_redirect(request):
+    """Redirect user based on their role and profile status."""
+    user = await request.auser()
+    profile = await aget_profile(request)
+
+    if user.role == User.Role.PATIENT:
+        if not profile:
+            return redirect('accounts:create_patient_profile')
+        return render(request, 'accounts/patient_dashboard.html', {
+            'user': user,
+            'profile': profile
+        })
+
+    elif user.role == User.Role.DOCTOR:
+        if not profile:
+            return redirect('accounts:create_doctor_profile')
+        if profile.is_approved:
+            return render(request, 'accounts/doctor_dashboard.html', {
+                'user': user,
+                'profile': profile
+            })
+        else:
+            messages.warning(request, 'Your account is pending admin approval.')
+            return render(request, 'accounts/pending_approval.html', {'user': user})
+
+    elif user.role == User.Role.ADMIN:
+        return redirect('admin:index')
+
+    return redirect('accounts:login')
+
+
+@login_required
+async def patient_dashboard(request):
+    """Async patient dashboard view."""
+    user = await request.auser()
+    if user.role != User.Role.PATIENT:
+        messages.error(request, 'Access denied.')
+        return redirect('accounts:profile_redirect')
+
+    profile = await aget_profile(request)
+    if not profile:
+        return redirect('accounts:create_patient_profile')
+
+    return render(request, 'accounts/patient_dashboard.html', {
+        'user': user,
+        'profile': profile
+    })
+
+
+@login_required
+async def doctor_dashboard(request):
+    """Async doctor dashboard view."""
+    user = await request.auser()
+    if user.role != User.Role.DOCTOR:
+        messages.error(request, 'Access denied.')
+        return redirect('accounts:profile_redirect')
+
+    profile = await aget_profile(request)
+    if not profile:
+        return redirect('accounts:create_doctor_profile')
+    if not profile.is_approved:
+        messages.warning(request, 'Your account is pending admin approval.')
+        return render(request, 'accounts/pending_approval.html', {'user': user})
+
+    return render(request, 'accounts/doctor_dashboard.html', {
+        'user': user,
+        'profile': profile
+    })
@@ -0,0 +1,133 @@
+"""
+Append-only audit trail of profile changes.
+
+Events are buffered in process and written with one ``bulk_create`` when
+``AUDIT['BATCH_SIZE']`` are pending or the oldest has waited
+``AUDIT['MAX_AGE']`` seconds (checked as events arrive, outside
+requests), and when a request finishes, after its response has gone
+out. A request therefore runs no audit INSERT itself, and a bulk action
+writes one per batch instead of one per row. Events join the buffer only once their
+transaction commits, so rolled-back changes are not audited; events
+still buffered when a process is killed are lost.
+
+The actor is the user of the request being served (``AuditMiddleware``);
+changes made by management commands have none.
+"""
+import atexit
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from functools import partial
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from .models import AuditEvent, DoctorProfile, PatientProfile
+
+logger = logging.getLogger(__name__)
+
+Action = AuditEvent.Action
+Subject = AuditEvent.Subject
+
+SUBJECTS = {
+    PatientProfile: Subject.PATIENT,
+    DoctorProfile: Subject.DOCTOR,
+}
+
+_request = ContextVar('audit_request', default=None)
+_lock = threading.Lock()
+# (subject, subject_id, action, actor_id, changes, at) tuples, oldest first
+_pending = []
+_oldest = None
+
+
+def _config():
+    return settings.AUDIT
+
+
+def bind_request(request):
+    """Make ``request.user`` the actor of events recorded in this context; returns a reset token."""
+    return _request.set(request)
+
+
+def unbind_request(token):
+    _request.reset(token)
+
+
+def current_actor_id():
+    request = _request.get()
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def record(action, model, subject_ids, changes=None):
+    """
+    Audit ``action`` on the ``model`` profiles with ``subject_ids``. The
+    events are buffered when the current transaction commits.
+    """
+    if not _config()['ENABLED']:
+        return
+    subject, actor_id, at = SUBJECTS[model], current_actor_id(), timezone.now()
+    rows = [(subject, pk, action, actor_id, changes, at) for pk in subject_ids]
+    if rows:
+        transaction.on_commit(partial(_buffer, rows))
+
+
+def _buffer(rows):
+    global _oldest
+    config = _config()
+    with _lock:
+        if not _pending:
+            _oldest = time.monotonic()
+        _pending.extend(rows)
+        due = len(_pending) >= config['BATCH_SIZE'] or time.monotonic() - _oldest >= config['MAX_AGE']
+    # Within a request the flush waits for request_finished
+    if due and _request.get() is None:
+        flush()
+
+
+def pending():
+    """Number of buffered events."""
+    return len(_pending)
+
+
+def flush():
+    """Write every buffered event; returns the number written."""
+    global _oldest
+    with _lock:
+        rows = _pending[:]
+        del _pending[:]
+        _oldest = None
+    if not rows:
+        return 0
+    try:
+        AuditEvent.objects.bulk_create(
+            [
+                AuditEvent(subject=subject, subject_id=subject_id, action=action, actor_id=actor_id,
+                           changes=changes, at=at)
+                for subject, subject_id, action, actor_id, changes, at in rows
+            ],
+            batch_size=_config()['BATCH_SIZE'],
+        )
+    except DatabaseError:
+        _requeue(rows)
+        logger.exception('Could not write %d audit events; they stay buffered', len(rows))
+        return 0
+    return len(rows)
+
+
+def _requeue(rows):
+    global _oldest
+    limit = _config()['MAX_PENDING']
+    with _lock:
+        _pending[:0] = rows
+        _oldest = time.monotonic()
+        dropped = len(_pending) - limit
+        if dropped > 0:
+            del _pending[:dropped]
+    if dropped > 0:
+        logger.error('Dropped the %d oldest unwritten audit events', dropped)
+
+
+# Management commands and other short-lived processes
+atexit.register(flush)
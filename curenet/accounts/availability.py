@@ -0,0 +1,136 @@
+"""
+Materialized availability index.
+
+For every doctor and day an AvailabilityDay row holds a bitmap of free
+slot starts at 5-minute granularity (288 bits, 36 bytes). ``refresh``
+rebuilds the rows of the days a booking, cancellation or
+materialization touched, from the Slot rows, holding the row lock so
+concurrent refreshes cannot write stale bitmaps.
+
+``first_available`` answers "first free <specialization> this week"
+with one query over the index. It takes the bitmaps of the candidate
+doctors and finds the earliest set bits with integer bit operations, so
+no per-doctor slot queries run. Slots that do not start on a 5-minute
+boundary are not indexed.
+"""
+import heapq
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.utils import timezone
+from .appointments import retrying
+from .models import AvailabilityDay, DoctorProfile, LISTED_DOCTOR, Slot
+
+GRANULARITY_MINUTES = 5
+BITS_PER_DAY = 24 * 60 // GRANULARITY_MINUTES
+BITMAP_BYTES = BITS_PER_DAY // 8
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def slot_start(day, position):
+    minutes = position * GRANULARITY_MINUTES
+    return timezone.make_aware(datetime.combine(day, time(minutes // 60, minutes % 60)))
+
+
+def bit_of(moment):
+    """Bitmap position of ``moment`` within its local day, or None if unaligned."""
+    local = timezone.localtime(moment)
+    minutes = local.hour * 60 + local.minute
+    if minutes % GRANULARITY_MINUTES or local.second or local.microsecond:
+        return None
+    return minutes // GRANULARITY_MINUTES
+
+
+def encode(bits):
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def decode(bitmap):
+    return int.from_bytes(bytes(bitmap), 'little')
+
+
+def set_bits(bits, limit=None):
+    """Positions of the set bits of ``bits``, lowest first."""
+    positions = []
+    while bits and (limit is None or len(positions) < limit):
+        lowest = bits & -bits
+        positions.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return positions
+
+
+def _refresh_day(doctor_id, day):
+    start = day_start(day)
+    with transaction.atomic():
+        row, _ = AvailabilityDay.objects.select_for_update().get_or_create(
+            doctor_id=doctor_id, day=day, defaults={'bitmap': encode(0)},
+        )
+        bits = 0
+        free = Slot.objects.filter(
+            doctor_id=doctor_id, is_booked=False, start__gte=start, start__lt=day_start(day + timedelta(days=1)),
+        )
+        for moment in free.values_list('start', flat=True):
+            position = bit_of(moment)
+            if position is not None:
+                bits |= 1 << position
+        row.bitmap = encode(bits)
+        row.free_slots = bits.bit_count()
+        row.save(update_fields=['bitmap', 'free_slots'])
+
+
+def refresh(doctor_id, days):
+    """Rebuild the index rows of ``doctor_id`` for ``days`` from its free slots."""
+    for day in sorted(set(days)):
+        retrying(lambda: _refresh_day(doctor_id, day))
+
+
+def refresh_starts(doctor_id, starts):
+    refresh(doctor_id, {timezone.localdate(moment) for moment in starts})
+
+
+def first_available(specialization, after=None, days=7, limit=10, clinic_id=None):
+    """
+    The earliest free slots across listed doctors of ``specialization``
+    within ``days`` days from ``after`` (default now), as (start,
+    doctor_id) pairs, soonest first.
+    """
+    after = after or timezone.now()
+    first_day = timezone.localdate(after)
+    doctors = DoctorProfile.objects.filter(LISTED_DOCTOR, specialization=specialization)
+    if clinic_id is not None:
+        doctors = doctors.filter(clinic_id=clinic_id)
+    rows = (
+        AvailabilityDay.objects.filter(
+            day__gte=first_day, day__lt=first_day + timedelta(days=days), free_slots__gt=0, doctor__in=doctors,
+        )
+        .order_by('day', 'doctor_id')
+        .values_list('day', 'doctor_id', 'bitmap')
+    )
+
+    # Bits before ``after`` on its own day are masked off
+    local_after = timezone.localtime(after)
+    minutes = local_after.hour * 60 + local_after.minute + (1 if local_after.second or local_after.microsecond else 0)
+    first_bit = -(-minutes // GRANULARITY_MINUTES)
+    first_day_mask = ~((1 << first_bit) - 1)
+
+    found, current_day, day_candidates = [], None, []
+
+    def flush():
+        for position, doctor_id in heapq.nsmallest(limit - len(found), day_candidates):
+            found.append((slot_start(current_day, position), doctor_id))
+
+    for day, doctor_id, bitmap in rows.iterator(chunk_size=2000):
+        if day != current_day:
+            flush()
+            if len(found) >= limit:
+                break
+            current_day, day_candidates = day, []
+        bits = decode(bitmap)
+        if day == first_day:
+            bits &= first_day_mask
+        day_candidates.extend((position, doctor_id) for position in set_bits(bits, limit))
+    else:
+        flush()
+    return found[:limit]
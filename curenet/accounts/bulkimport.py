@@ -0,0 +1,245 @@
+"""
+Bulk import of patients and doctors.
+
+Input rows stream from CSV or NDJSON and are processed in batches: each
+batch is validated in memory, checked for existing usernames and emails
+with one ``IN`` query, has its passwords hashed in a process pool (or
+left unusable for invite-pending accounts), and is inserted with
+``bulk_create`` in its own transaction. Bad rows are reported and skipped
+without aborting the import.
+"""
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from . import audit, search
+from .models import Clinic, DoctorProfile, PatientProfile, User
+
+DEFAULT_BATCH_SIZE = 1000
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+PATIENT_FIELDS = ('date_of_birth', 'gender', 'phone_number', 'address')
+DOCTOR_FIELDS = ('specialization', 'qualification', 'experience_years', 'clinic_id')
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    errors: list = field(default_factory=list)  # (line number, message)
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+
+def read_rows(file, fmt):
+    """Yield (line number, dict) pairs from a CSV or NDJSON file."""
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield line_number, exc
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker():
+    # Spawned workers (non-fork platforms) need Django configured
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _clean(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def _clean_field(model, name, value):
+    """``value`` converted and validated like ``model``'s field ``name`` would on save."""
+    field = model._meta.get_field(name)
+    if field.is_relation:
+        # Only the id here; clinics are looked up once per batch
+        field = field.target_field
+    return field.clean(value, None)
+
+
+def _validate(line, row, report):
+    """Return cleaned row data, or None after reporting why it is invalid."""
+    if isinstance(row, Exception):
+        report.error(line, f'Invalid JSON: {row}')
+        return None
+    if not isinstance(row, dict):
+        report.error(line, 'Expected an object.')
+        return None
+    data = {key: _clean(value) for key, value in row.items() if value not in (None, '')}
+    for key, value in data.items():
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            report.error(line, f'{key} must be a string or a number.')
+            return None
+    role = str(data.get('role', '')).upper()
+    if role not in (User.Role.PATIENT, User.Role.DOCTOR):
+        report.error(line, 'role must be PATIENT or DOCTOR.')
+        return None
+    data['role'] = role
+    for required in ('username', 'email'):
+        if not data.get(required):
+            report.error(line, f'{required} is required.')
+            return None
+    if not isinstance(data.get('password', ''), str):
+        report.error(line, 'password must be a string.')
+        return None
+    if role == User.Role.DOCTOR:
+        if not data.get('specialization') or not data.get('qualification'):
+            report.error(line, 'Doctors need specialization and qualification.')
+            return None
+        data.setdefault('experience_years', 0)
+    profile = (PatientProfile, PATIENT_FIELDS) if role == User.Role.PATIENT else (DoctorProfile, DOCTOR_FIELDS)
+    # The database would otherwise reject (PostgreSQL) or keep (SQLite)
+    # overlong and malformed values
+    for model, names in ((User, USER_FIELDS), profile):
+        for name in names:
+            if name not in data:
+                continue
+            try:
+                data[name] = _clean_field(model, name, data[name])
+            except ValidationError as exc:
+                report.error(line, f'{name}: {" ".join(exc.messages)}')
+                return None
+    return data
+
+
+class Importer:
+    """
+    Import rows in batches. ``hash_workers`` sizes the password hashing
+    process pool (0 hashes inline); with ``invite`` every account gets an
+    unusable password and passwords in the input are ignored.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, hash_workers=0, invite=False):
+        self.batch_size = batch_size
+        self.hash_workers = hash_workers
+        self.invite = invite
+        self.report = ImportReport()
+        self._pool = None
+
+    def __enter__(self):
+        if self.hash_workers and not self.invite:
+            self._pool = ProcessPoolExecutor(max_workers=self.hash_workers, initializer=_init_worker)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def run(self, rows):
+        for batch in batches(rows, self.batch_size):
+            self.import_batch(batch)
+        return self.report
+
+    def _hash(self, passwords):
+        if self.invite:
+            return [make_password(None) for _ in passwords]
+        if self._pool is None:
+            return [make_password(password) for password in passwords]
+        return list(self._pool.map(make_password, passwords, chunksize=64))
+
+    def _check_uniqueness(self, candidates):
+        # Compared ignoring case, like the Lower() unique indexes; those still
+        # reject what Python and the database fold differently on insert.
+        usernames = {data['username'].lower() for _, data in candidates}
+        emails = {data['email'].lower() for _, data in candidates}
+        taken = User.objects.alias(username_key=Lower('username'), email_key=Lower('email')).filter(
+            Q(username_key__in=usernames) | Q(email_key__in=emails)
+        )
+        taken_usernames, taken_emails = set(), set()
+        for username, email in taken.values_list('username', 'email'):
+            taken_usernames.add(username.lower())
+            taken_emails.add(email.lower())
+
+        clinic_ids = {data['clinic_id'] for _, data in candidates if 'clinic_id' in data}
+        known_clinics = set()
+        if clinic_ids:
+            known_clinics = set(Clinic.objects.filter(pk__in=clinic_ids).values_list('pk', flat=True))
+
+        unique, seen_usernames, seen_emails = [], set(), set()
+        for line, data in candidates:
+            username, email = data['username'].lower(), data['email'].lower()
+            if username in taken_usernames or username in seen_usernames:
+                self.report.error(line, f'Username {data["username"]!r} already exists.')
+            elif email in taken_emails or email in seen_emails:
+                self.report.error(line, f'Email {data["email"]!r} already exists.')
+            elif 'clinic_id' in data and data['clinic_id'] not in known_clinics:
+                self.report.error(line, f'Clinic {data["clinic_id"]} does not exist.')
+            else:
+                seen_usernames.add(username)
+                seen_emails.add(email)
+                unique.append((line, data))
+        return unique
+
+    def import_batch(self, batch):
+        candidates = []
+        for line, row in batch:
+            data = _validate(line, row, self.report)
+            if data is not None:
+                candidates.append((line, data))
+        if not candidates:
+            return
+        candidates = self._check_uniqueness(candidates)
+        if not candidates:
+            return
+        passwords = self._hash([data.get('password') for _, data in candidates])
+        try:
+            with transaction.atomic():
+                self._insert([(data, password) for (_, data), password in zip(candidates, passwords)])
+            self.report.created += len(candidates)
+        except IntegrityError:
+            # A concurrent writer took a username or email; retry row by row
+            for (line, data), password in zip(candidates, passwords):
+                try:
+                    with transaction.atomic():
+                        self._insert([(data, password)])
+                    self.report.created += 1
+                except IntegrityError as exc:
+                    self.report.error(line, f'Could not insert: {exc}')
+
+    def _insert(self, rows):
+        users = User.objects.bulk_create([
+            User(
+                username=data['username'], email=data['email'], role=data['role'],
+                first_name=data.get('first_name', ''), last_name=data.get('last_name', ''),
+                password=password,
+            )
+            for data, password in rows
+        ])
+        patients, doctors = [], []
+        for user, (data, _) in zip(users, rows):
+            if user.role == User.Role.PATIENT:
+                patients.append(PatientProfile(user=user, **{k: data[k] for k in PATIENT_FIELDS if k in data}))
+            else:
+                doctors.append(DoctorProfile(user=user, **{k: data[k] for k in DOCTOR_FIELDS if k in data}))
+        patients = PatientProfile.objects.bulk_create(patients)
+        doctors = DoctorProfile.objects.bulk_create(doctors)
+        # bulk_create sends no post_save, so index and audit the new profiles here
+        search.index_new_doctors([doctor.pk for doctor in doctors])
+        audit.record(audit.Action.CREATE, PatientProfile, [patient.pk for patient in patients])
+        audit.record(audit.Action.CREATE, DoctorProfile, [doctor.pk for doctor in doctors])
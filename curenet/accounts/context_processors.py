@@ -0,0 +1,3 @@
+def profile(request):
+    """Expose the request's role profile to every template."""
+    return {'profile': getattr(request, 'profile', None)}
@@ -0,0 +1,123 @@
+"""
+Streaming roster export.
+
+Rows are read with ``values_list`` projections through
+``QuerySet.iterator(chunk_size=...)`` and encoded line by line, so memory
+stays flat whatever the row count. The primary key is always the first
+column: an interrupted export resumes by passing the last key seen as
+``after``. Under ASGI, Django reads a synchronous streaming response
+whole into memory before sending it; wrap the chunks with ``aiter_chunks``
+there.
+"""
+import csv
+import json
+import zlib
+from datetime import date, datetime
+from asgiref.sync import sync_to_async
+from .models import Clinic, DoctorProfile, PatientProfile
+
+DEFAULT_CHUNK_SIZE = 2000
+# Encoded bytes collected before a chunk is yielded (and compressed)
+BUFFER_SIZE = 64 * 1024
+
+ROSTERS = {
+    'patients': (PatientProfile, [
+        'id', 'user__username', 'user__email', 'user__first_name', 'user__last_name',
+        'date_of_birth', 'gender', 'phone_number', 'is_active', 'created_at',
+    ]),
+    'doctors': (DoctorProfile, [
+        'id', 'user__username', 'user__email', 'user__first_name', 'user__last_name',
+        'specialization', 'qualification', 'experience_years', 'clinic_id', 'clinic__name',
+        'is_approved', 'is_active', 'created_at',
+    ]),
+    'clinics': (Clinic, [
+        'id', 'name', 'address', 'phone_number', 'email', 'is_active', 'created_at',
+    ]),
+}
+FORMATS = ('csv', 'ndjson')
+
+
+def roster_for_model(model):
+    """Name of the roster exporting ``model``."""
+    for name, (roster_model, _) in ROSTERS.items():
+        if roster_model is model:
+            return name
+    raise KeyError(model)
+
+
+class _Echo:
+    """File-like object whose write() returns the written value."""
+
+    def write(self, value):
+        return value
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _lines(columns, rows, fmt):
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), default=_json_default) + '\n'
+
+
+def _buffered(lines):
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_roster(name, fmt='csv', queryset=None, after=None, chunk_size=DEFAULT_CHUNK_SIZE, gzip=False):
+    """
+    Yield the ``name`` roster as encoded byte chunks.
+
+    ``queryset`` narrows the rows (e.g. an admin selection); ``after``
+    resumes after the given primary key.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format {fmt!r}.')
+    model, columns = ROSTERS[name]
+    if queryset is None:
+        queryset = model._default_manager.all()
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    rows = queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+
+    chunks = _buffered(_lines(columns, rows, fmt))
+    return _gzipped(chunks) if gzip else chunks
+
+
+async def aiter_chunks(chunks):
+    """Async iterator over ``chunks``, each produced in a worker thread."""
+    chunks = iter(chunks)
+    # Thread-sensitive, so every step runs on the thread holding the cursor
+    step = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await step(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
@@ -19,9 +19,16 @@ class UserRegistrationForm(UserCreationForm):
         model = User
         fields = ('username', 'email', 'password1', 'password2', 'role', 'first_name', 'last_name')
 
+    def clean_username(self):
+        # UserCreationForm's own check is an iexact scan
+        username = self.cleaned_data.get('username')
+        if username and User.objects.with_username(username).exists():
+            raise ValidationError("A user with that username already exists.")
+        return username
+
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
+        if User.objects.with_email(email).exists():
             raise ValidationError("A user with this email already exists.")
         return email
 
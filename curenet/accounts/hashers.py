@@ -0,0 +1,72 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+def hashing_setting(name, default):
+    """Read a key of the PASSWORD_HASHING settings dict."""
+    return getattr(settings, 'PASSWORD_HASHING', {}).get(name, default)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """
+    Scrypt hasher whose cost comes from PASSWORD_HASHING. Changing the cost
+    makes ``must_update`` true, so stored hashes are upgraded on next login.
+    """
+
+    @property
+    def work_factor(self):
+        return hashing_setting('SCRYPT_WORK_FACTOR', ScryptPasswordHasher.work_factor)
+
+    @property
+    def parallelism(self):
+        return hashing_setting('SCRYPT_PARALLELISM', ScryptPasswordHasher.parallelism)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2 hasher whose cost comes from PASSWORD_HASHING (needs argon2-cffi)."""
+
+    @property
+    def time_cost(self):
+        return hashing_setting('ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return hashing_setting('ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return hashing_setting('ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
+
+
+_executor = None
+
+
+def get_hashing_executor():
+    """
+    Return the bounded thread pool used for hashing off the event loop, or
+    None when PASSWORD_HASHING['EXECUTOR_WORKERS'] is unset.
+    """
+    global _executor
+    workers = hashing_setting('EXECUTOR_WORKERS', None)
+    if not workers:
+        return None
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hasher')
+    return _executor
+
+
+async def run_hasher(func, *args, **kwargs):
+    """
+    Run a CPU-bound hashing call (make_password, check_password, ...)
+    without blocking the event loop. Uses the bounded executor when
+    configured, otherwise a non thread-sensitive sync_to_async thread.
+    """
+    executor = get_hashing_executor()
+    if executor is None:
+        return await sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
@@ -0,0 +1,241 @@
+"""
+Per-view performance instrumentation.
+
+``PerformanceMiddleware`` measures every request's wall time, database
+queries and time, template render time and response size, and files them
+under the resolved URL name (``accounts:login``...). Queries are timed by
+an ``execute_wrapper`` each connection gets on creation (see
+``accounts.signals``), templates by ``TimedDjangoTemplates``; both find
+the current request through a context variable, so async views and their
+``sync_to_async`` threads are covered too.
+
+Totals are kept per process and served in the Prometheus text format by
+``metrics_view``. Each response also carries a ``Server-Timing`` header.
+Views listed in ``VIEW_QUERY_BUDGETS`` that run more queries are logged,
+or raise ``QueryBudgetExceeded`` when ``QUERY_BUDGET_ACTION`` is 'raise'
+(the default under tests).
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+UNRESOLVED = '<unresolved>'
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'template_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+_current = ContextVar('accounts_request_stats', default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    """``execute_wrapper`` counting and timing queries of the current request."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+class TimedTemplate:
+    """Backend template wrapper adding its render time to the request."""
+
+    def __init__(self, template):
+        self.template = template
+
+    @property
+    def origin(self):
+        return self.template.origin
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times recorded."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class ViewMetrics:
+    __slots__ = ('requests', 'duration', 'buckets', 'queries', 'db_time', 'template_time', 'response_bytes')
+
+    def __init__(self):
+        self.requests = 0
+        self.duration = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.response_bytes = 0
+
+
+class Registry:
+    """Per-process metric totals keyed by view name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, duration, stats, response_bytes):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            metrics.requests += 1
+            metrics.duration += duration
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[index] += 1
+            metrics.queries += stats.queries
+            metrics.db_time += stats.db_time
+            metrics.template_time += stats.template_time
+            metrics.response_bytes += response_bytes
+
+    def get(self, view):
+        return self._views.get(view)
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = [
+                '# HELP curenet_view_duration_seconds Wall time per request.',
+                '# TYPE curenet_view_duration_seconds histogram',
+            ]
+            for view, metrics in views:
+                label = _label(view)
+                for bound, count in zip(DURATION_BUCKETS, metrics.buckets):
+                    lines.append(f'curenet_view_duration_seconds_bucket{{view="{label}",le="{bound}"}} {count}')
+                lines.append(f'curenet_view_duration_seconds_bucket{{view="{label}",le="+Inf"}} {metrics.requests}')
+                lines.append(f'curenet_view_duration_seconds_sum{{view="{label}"}} {metrics.duration:.6f}')
+                lines.append(f'curenet_view_duration_seconds_count{{view="{label}"}} {metrics.requests}')
+            counters = [
+                ('curenet_view_db_queries_total', 'Database queries.', 'queries', '{}'),
+                ('curenet_view_db_seconds_total', 'Time spent in database queries.', 'db_time', '{:.6f}'),
+                ('curenet_view_template_seconds_total', 'Time spent rendering templates.', 'template_time', '{:.6f}'),
+                ('curenet_view_response_bytes_total', 'Response body bytes.', 'response_bytes', '{}'),
+            ]
+            for name, help_text, attr, template in counters:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for view, metrics in views:
+                    lines.append(f'{name}{{view="{_label(view)}"}} ' + template.format(getattr(metrics, attr)))
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+registry = Registry()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED
+
+
+def check_budget(view, stats):
+    budget = getattr(settings, 'VIEW_QUERY_BUDGETS', {}).get(view)
+    if budget is None or stats.queries <= budget:
+        return
+    message = f'{view} ran {stats.queries} queries, over its budget of {budget}.'
+    if getattr(settings, 'QUERY_BUDGET_ACTION', 'log') == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def server_timing(duration, stats):
+    return (
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+        f'tpl;dur={stats.template_time * 1000:.1f}, '
+        f'total;dur={duration * 1000:.1f}'
+    )
+
+
+class PerformanceMiddleware:
+    """
+    Record per-view metrics and add a ``Server-Timing`` header. Goes
+    first, so the time spent in other middleware is included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _finish(self, request, response, start, stats):
+        duration = time.perf_counter() - start
+        size = 0 if response.streaming else len(response.content)
+        view = view_name(request)
+        registry.record(view, duration, stats, size)
+        response['Server-Timing'] = server_timing(duration, stats)
+        check_budget(view, stats)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, start = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, start, stats)
+
+    async def __acall__(self, request):
+        stats, start = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, start, stats)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, open to INTERNAL_IPS and staff only."""
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS and not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
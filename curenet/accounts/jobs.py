@@ -0,0 +1,187 @@
+"""
+Background jobs without a broker.
+
+Jobs are rows of the ``Job`` table, enqueued in the caller's transaction
+(so a job exists exactly when the change that asked for it committed)
+and run by ``manage.py runworker``. A worker claims the oldest due job
+together with up to ``batch_size`` more of the same kind and hands them
+to the kind's handler in one call, so e.g. 500 approval emails share one
+SMTP connection.
+
+Claims use ``SELECT ... FOR UPDATE SKIP LOCKED`` where the backend has
+it (PostgreSQL, MySQL 8, Oracle), so workers never wait on each other's
+rows. SQLite has no row locks; there the claiming transaction holds the
+database write lock (transactions start IMMEDIATE, see curenet.database)
+and concurrent claims simply queue. Either way the claiming UPDATE only
+takes jobs that are still queued and tags them with a claim token, and
+claims read from the primary.
+
+A handler that raises fails its whole batch: each job is retried after
+``JOBS['BACKOFF'] * 2 ** (attempts - 1)`` seconds (at most
+``JOBS['BACKOFF_MAX']``) until ``JOBS['MAX_ATTEMPTS']``, then kept as
+FAILED. Jobs are therefore run at least once; handlers should tolerate a
+repeat. Jobs left RUNNING by a worker that died are queued again once
+their claim is ``JOBS['LEASE']`` seconds old.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from . import routers
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+Status = Job.Status
+
+
+@dataclass(frozen=True)
+class Handler:
+    func: object
+    batch_size: int
+
+
+# kind -> Handler
+HANDLERS = {}
+
+
+def _config():
+    return settings.JOBS
+
+
+def handler(kind, batch_size=1):
+    """
+    Register the decorated function as the handler of ``kind`` jobs. It
+    is called with a list of up to ``batch_size`` payloads.
+    """
+    def register(func):
+        HANDLERS[kind] = Handler(func, batch_size)
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, delay=0):
+    """Queue one ``kind`` job, due in ``delay`` seconds."""
+    return enqueue_many(kind, [payload or {}], delay)[0]
+
+
+def enqueue_many(kind, payloads, delay=0):
+    """Queue a ``kind`` job per payload with one INSERT per batch."""
+    if kind not in HANDLERS:
+        raise KeyError(f'No handler for {kind!r} jobs.')
+    run_at = timezone.now() + timedelta(seconds=delay)
+    return Job.objects.bulk_create(
+        [Job(kind=kind, payload=payload, run_at=run_at) for payload in payloads], batch_size=1000,
+    )
+
+
+def backoff(attempts):
+    """Seconds before retrying a job that has failed ``attempts`` times."""
+    config = _config()
+    return min(config['BACKOFF'] * 2 ** (attempts - 1), config['BACKOFF_MAX'])
+
+
+def worker_name(index=0):
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def claim(worker, kinds=None):
+    """
+    Claim the oldest due job and up to its handler's batch size of due
+    jobs of the same kind. Returns the claimed jobs, marked RUNNING.
+    """
+    now = timezone.now()
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    token = f'{worker}:{uuid.uuid4().hex[:12]}'
+    with routers.primary(), transaction.atomic():
+        due = Job.objects.filter(status=Status.QUEUED, run_at__lte=now).order_by('run_at')
+        if kinds:
+            due = due.filter(kind__in=kinds)
+        if skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        first = due.values_list('kind', flat=True).first()
+        if first is None:
+            return []
+        batch_size = HANDLERS[first].batch_size if first in HANDLERS else 1
+        ids = list(due.filter(kind=first).values_list('pk', flat=True)[:batch_size])
+        # The status guard keeps a job another claim took meanwhile out
+        Job.objects.filter(pk__in=ids, status=Status.QUEUED).update(
+            status=Status.RUNNING, claim=token, claimed_at=now, attempts=F('attempts') + 1,
+        )
+    with routers.primary():
+        return list(Job.objects.filter(pk__in=ids, claim=token).order_by('run_at', 'pk'))
+
+
+def run(jobs):
+    """Run a claimed batch: delete the jobs on success, retry or fail them on error."""
+    if not jobs:
+        return
+    kind = jobs[0].kind
+    ids = [job.pk for job in jobs]
+    try:
+        entry = HANDLERS.get(kind)
+        if entry is None:
+            raise LookupError(f'No handler for {kind!r} jobs.')
+        entry.func([job.payload for job in jobs])
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('%d %s job(s) failed', len(jobs), kind, exc_info=True)
+        _retry_or_fail(jobs, error)
+    else:
+        Job.objects.filter(pk__in=ids).delete()
+
+
+def _retry_or_fail(jobs, error):
+    now, limit = timezone.now(), _config()['MAX_ATTEMPTS']
+    # Jobs of a batch usually share their attempt count: one UPDATE each
+    by_attempts = {}
+    for job in jobs:
+        by_attempts.setdefault(job.attempts, []).append(job.pk)
+    with transaction.atomic():
+        for attempts, ids in by_attempts.items():
+            if attempts >= limit:
+                Job.objects.filter(pk__in=ids).update(status=Status.FAILED, claim='', last_error=error)
+            else:
+                Job.objects.filter(pk__in=ids).update(
+                    status=Status.QUEUED, claim='', claimed_at=None, last_error=error,
+                    run_at=now + timedelta(seconds=backoff(attempts)),
+                )
+
+
+def requeue_stale():
+    """Queue again the jobs whose claim outlived ``JOBS['LEASE']``; returns how many."""
+    expired = timezone.now() - timedelta(seconds=_config()['LEASE'])
+    return Job.objects.filter(status=Status.RUNNING, claimed_at__lt=expired).update(
+        status=Status.QUEUED, claim='', claimed_at=None,
+    )
+
+
+def work(worker, stop, once=False, kinds=None):
+    """
+    Claim and run batches until ``stop`` (a threading.Event) is set, or,
+    with ``once``, until no job is due. Lost jobs are requeued on start
+    and then every lease while idle. Returns the number of jobs run.
+    """
+    config = _config()
+    done, requeue_at = 0, 0.0
+    while not stop.is_set():
+        if time.monotonic() >= requeue_at:
+            requeue_stale()
+            requeue_at = time.monotonic() + config['LEASE']
+        jobs = claim(worker, kinds)
+        if not jobs:
+            if once:
+                break
+            stop.wait(config['POLL_INTERVAL'])
+            continue
+        run(jobs)
+        done += len(jobs)
+    return done
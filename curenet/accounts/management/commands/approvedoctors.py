@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts import approvals
+from accounts.models import Clinic, DoctorProfile
+
+
+class Command(BaseCommand):
+    help = 'Approves pending doctors in chunked transactions, optionally assigning clinics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', type=int, nargs='+', help='Doctor profile ids to approve (default: all pending)')
+        parser.add_argument('--clinic', type=int, help='Clinic id assigned to selected doctors without a clinic')
+        parser.add_argument('--clinic-csv', type=str, help='CSV file with doctor_id,clinic_id columns')
+        parser.add_argument('--chunk-size', type=int, default=approvals.DEFAULT_CHUNK_SIZE,
+                            help='Rows updated per transaction')
+
+    def handle(self, *args, **options):
+        queryset = DoctorProfile.objects.filter(is_approved=False, is_active=True)
+        if options['ids']:
+            queryset = queryset.filter(pk__in=options['ids'])
+
+        clinic = None
+        if options['clinic'] is not None:
+            try:
+                clinic = Clinic.objects.get(pk=options['clinic'])
+            except Clinic.DoesNotExist:
+                raise CommandError(f'Clinic {options["clinic"]} does not exist.')
+
+        mapping = None
+        if options['clinic_csv']:
+            try:
+                with open(options['clinic_csv'], newline='') as file:
+                    mapping = approvals.read_clinic_mapping(file)
+            except (OSError, KeyError, ValueError) as exc:
+                raise CommandError(f'Could not read clinic mapping: {exc}')
+
+        try:
+            result = approvals.approve(
+                queryset, chunk_size=options['chunk_size'], clinic=clinic, clinic_mapping=mapping
+            )
+        except approvals.UnknownClinics as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(f'Approved {len(result.approved)} doctor(s).'))
+        if result.blocked:
+            self.stdout.write(self.style.WARNING(
+                f'{len(result.blocked)} doctor(s) have no clinic assigned and were skipped.'
+            ))
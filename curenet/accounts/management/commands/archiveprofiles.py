@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts import archival
+from accounts.models import DoctorProfile, PatientProfile
+
+KINDS = {'patients': PatientProfile, 'doctors': DoctorProfile}
+
+
+class Command(BaseCommand):
+    help = 'Moves profiles deactivated for longer than --days into the archive tables, or restores them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Days a profile must have been inactive')
+        parser.add_argument('--kind', choices=sorted(KINDS), help='Profiles to archive (default: both)')
+        parser.add_argument('--batch-size', type=int, default=archival.DEFAULT_BATCH_SIZE,
+                            help='Profiles moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the profiles that would move')
+        parser.add_argument('--restore', type=int, nargs='+', metavar='ID',
+                            help='Restore the archived profiles with these ids (needs --kind)')
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else sorted(KINDS)
+        if options['restore']:
+            if not options['kind']:
+                raise CommandError('--restore needs --kind.')
+            model = KINDS[options['kind']]
+            result = archival.restore(model, options['restore'], options['batch_size'])
+            label = model._meta.verbose_name.lower()
+            self.stdout.write(self.style.SUCCESS(f'Restored {len(result.restored)} {label}(s).'))
+            if result.skipped:
+                ids = ', '.join(map(str, result.skipped))
+                self.stdout.write(self.style.WARNING(
+                    f'Skipped {len(result.skipped)} {label}(s) whose user has a new profile: {ids}.'
+                ))
+            return
+
+        for kind in kinds:
+            model = KINDS[kind]
+            label = model._meta.verbose_name.lower()
+            if options['dry_run']:
+                count = archival.archivable(model, archival.cutoff_for(options['days'])).count()
+                self.stdout.write(f'{count} {label}(s) would be archived.')
+            else:
+                count = archival.archive(model, options['days'], options['batch_size'])
+                self.stdout.write(self.style.SUCCESS(f'Archived {count} {label}(s).'))
@@ -30,11 +30,11 @@ class Command(BaseCommand):
             return
 
         # Check if user already exists
-        if User.objects.filter(username=username).exists():
+        if User.objects.with_username(username).exists():
             self.stdout.write(self.style.ERROR(f'User with username "{username}" already exists.'))
             return
 
-        if User.objects.filter(email=email).exists():
+        if User.objects.with_email(email).exists():
             self.stdout.write(self.style.ERROR(f'User with email "{email}" already exists.'))
             return
 
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts import export
+
+
+class Command(BaseCommand):
+    help = 'Streams the patient, doctor or clinic roster as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', choices=sorted(export.ROSTERS), help='Roster to export')
+        parser.add_argument('--format', choices=export.FORMATS, default='csv', help='Output format')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output (needs --output)')
+        parser.add_argument('--after', type=int, help='Resume after this primary key')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE,
+                            help='Rows fetched from the database per round trip')
+        parser.add_argument('--output', type=str, help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        if options['gzip'] and not options['output']:
+            raise CommandError('--gzip needs --output.')
+        chunks = export.stream_roster(
+            options['roster'], options['format'], after=options['after'],
+            chunk_size=options['chunk_size'], gzip=options['gzip'],
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
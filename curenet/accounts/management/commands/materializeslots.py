@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts import appointments
+from accounts.models import DoctorProfile
+
+
+class Command(BaseCommand):
+    help = "Creates bookable slots from the doctors' availability rules"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=appointments.HORIZON_DAYS, help='Days ahead to materialize, from today')
+        parser.add_argument('--ids', type=int, nargs='+', help='Doctor profile ids (default: all listed doctors)')
+
+    def handle(self, *args, **options):
+        doctors = DoctorProfile.objects.listed()
+        if options['ids']:
+            doctors = doctors.filter(pk__in=options['ids'])
+        count = appointments.materialize(doctors, timezone.localdate(), options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Materialized {count} slot(s) over {options["days"]} day(s).'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from accounts import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the doctor and clinic full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Documents inserted per batch')
+
+    def handle(self, *args, **options):
+        written = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {written} search document(s).'))
@@ -0,0 +1,50 @@
+import signal
+import threading
+from django.core.management.base import BaseCommand
+from django.db import connection
+from accounts import jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (emails and other slow side effects) until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Worker threads claiming jobs')
+        parser.add_argument('--kinds', nargs='+', help='Only run jobs of these kinds (default: all)')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            # Finish the batch in hand, then exit
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous[signum] = signal.signal(signum, lambda *_: stop.set())
+        try:
+            done = self.run_workers(stop, options)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f'Ran {done} job(s).'))
+
+    def run_workers(self, stop, options):
+        if options['concurrency'] == 1:
+            return jobs.work(jobs.worker_name(), stop, options['once'], options['kinds'])
+        counts = []
+
+        def worker(index):
+            try:
+                counts.append(jobs.work(jobs.worker_name(index), stop, options['once'], options['kinds']))
+            finally:
+                # Each thread opened its own connection
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(index,), name=f'runworker-{index}')
+            for index in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(counts)
@@ -0,0 +1,130 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from . import audit, routers
+from .services import role_profile
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+PIN_COOKIE = 'curenet_primary'
+
+
+def get_profile(request):
+    """Return the role profile of ``request.user``, memoized on the request."""
+    if not hasattr(request, '_cached_profile'):
+        user = request.user
+        request._cached_profile = role_profile(user) if user.is_authenticated else None
+    return request._cached_profile
+
+
+async def aget_profile(request):
+    """Async counterpart of get_profile, sharing the same memo."""
+    if not hasattr(request, '_cached_profile'):
+        user = await request.auser()
+        request._cached_profile = role_profile(user) if user.is_authenticated else None
+    return request._cached_profile
+
+
+class ProfileMiddleware:
+    """
+    Attach a lazy ``request.profile`` holding the role-specific profile.
+
+    The profile and the doctor's clinic are joined into the session user
+    query by ``ProfileBackend``, so resolving it costs no extra query. Must
+    come after ``AuthenticationMiddleware``. Async views should await
+    ``aget_profile`` instead, which fills the same memo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.profile = SimpleLazyObject(lambda: get_profile(request))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_profile(request))
+        return await self.get_response(request)
+
+
+class PrimaryPinningMiddleware:
+    """
+    Route a request's accounts reads to the primary when it is unsafe
+    (it is about to write) or arrives within ``REPLICA_PIN_SECONDS`` of a
+    write by the same browser; see ``accounts.routers``. Goes first, so
+    the session user lookup is routed too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _pinned(self, request):
+        return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    def _finish(self, token, response):
+        if routers.end(token):
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.begin(self._pinned(request))
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            routers.end(token)
+            raise
+        return self._finish(token, response)
+
+    async def __acall__(self, request):
+        token = routers.begin(self._pinned(request))
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            routers.end(token)
+            raise
+        return self._finish(token, response)
+
+
+class AuditMiddleware:
+    """
+    Make the request's user the actor of audit events recorded while it
+    is served (see ``accounts.audit``). Must come after
+    ``AuthenticationMiddleware``; the user is only resolved if an event is
+    recorded.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = audit.bind_request(request)
+        try:
+            return self.get_response(request)
+        finally:
+            audit.unbind_request(token)
+
+    async def __acall__(self, request):
+        token = audit.bind_request(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            audit.unbind_request(token)
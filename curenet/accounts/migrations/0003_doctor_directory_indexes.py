@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_doctorprofile_is_approved'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_approved', True)), fields=['id'], name='doctor_listed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_approved', True)), fields=['specialization', 'id'], name='doctor_listed_spec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_approved', True)), fields=['clinic', 'id'], name='doctor_listed_clinic_idx'),
+        ),
+    ]
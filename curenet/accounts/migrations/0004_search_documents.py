@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:07
+
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE accounts_search_fts USING fts5(
+        body, kind UNINDEXED,
+        content='accounts_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    "CREATE VIRTUAL TABLE accounts_search_vocab USING fts5vocab(accounts_search_fts, row)",
+    """
+    CREATE TRIGGER accounts_search_ai AFTER INSERT ON accounts_searchdocument BEGIN
+        INSERT INTO accounts_search_fts(rowid, body, kind) VALUES (new.id, new.body, new.kind);
+    END
+    """,
+    """
+    CREATE TRIGGER accounts_search_ad AFTER DELETE ON accounts_searchdocument BEGIN
+        INSERT INTO accounts_search_fts(accounts_search_fts, rowid, body, kind)
+        VALUES ('delete', old.id, old.body, old.kind);
+    END
+    """,
+    """
+    CREATE TRIGGER accounts_search_au AFTER UPDATE ON accounts_searchdocument BEGIN
+        INSERT INTO accounts_search_fts(accounts_search_fts, rowid, body, kind)
+        VALUES ('delete', old.id, old.body, old.kind);
+        INSERT INTO accounts_search_fts(rowid, body, kind) VALUES (new.id, new.body, new.kind);
+    END
+    """,
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS accounts_search_au",
+    "DROP TRIGGER IF EXISTS accounts_search_ad",
+    "DROP TRIGGER IF EXISTS accounts_search_ai",
+    "DROP TABLE IF EXISTS accounts_search_vocab",
+    "DROP TABLE IF EXISTS accounts_search_fts",
+]
+POSTGRES_FORWARD = [
+    "CREATE INDEX accounts_search_tsv_idx ON accounts_searchdocument "
+    "USING GIN (to_tsvector('simple', body))",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS accounts_search_tsv_idx",
+]
+
+
+def run_for_vendor(sqlite, postgresql):
+    def run(apps, schema_editor):
+        statements = {'sqlite': sqlite, 'postgresql': postgresql}.get(schema_editor.connection.vendor, [])
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_doctor_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('doctor', 'Doctor'), ('clinic', 'Clinic')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('body', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Search Document',
+                'verbose_name_plural': 'Search Documents',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        # Full-text index over the documents: FTS5 on SQLite, a GIN
+        # tsvector index on PostgreSQL, nothing elsewhere.
+        migrations.RunPython(
+            run_for_vendor(SQLITE_FORWARD, POSTGRES_FORWARD),
+            run_for_vendor(SQLITE_REVERSE, POSTGRES_REVERSE),
+        ),
+    ]
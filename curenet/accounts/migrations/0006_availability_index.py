@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_appointments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bitmap', models.BinaryField(max_length=36)),
+                ('free_slots', models.PositiveSmallIntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_days', to='accounts.doctorprofile')),
+            ],
+            options={
+                'verbose_name': 'Availability Day',
+                'verbose_name_plural': 'Availability Days',
+                'indexes': [models.Index(condition=models.Q(('free_slots__gt', 0)), fields=['day', 'doctor'], name='availability_free_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'day'), name='unique_availability_day')],
+            },
+        ),
+    ]
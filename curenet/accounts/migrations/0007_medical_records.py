@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_availability_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Record Blob',
+                'verbose_name_plural': 'Record Blobs',
+            },
+        ),
+        migrations.CreateModel(
+            name='MedicalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='medical_records', to='accounts.doctorprofile')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='medical_records', to='accounts.patientprofile')),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='records', to='accounts.recordblob')),
+            ],
+            options={
+                'verbose_name': 'Medical Record',
+                'verbose_name_plural': 'Medical Records',
+                'indexes': [models.Index(fields=['patient', '-created_at'], name='record_patient_idx')],
+            },
+        ),
+    ]
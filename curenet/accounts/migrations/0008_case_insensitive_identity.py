@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:41
+
+import accounts.models
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+# Distinct keys per collision-scan query
+BATCH_SIZE = 10000
+# Colliding values listed in the error
+REPORT_LIMIT = 20
+
+
+def find_collisions(queryset, field, batch_size=BATCH_SIZE):
+    """
+    (lowercased value, count) of the values of ``field`` shared by several
+    rows ignoring case. Walks an index on ``Lower(field)`` in batches of
+    distinct keys, so memory and each query stay bounded on large tables.
+    """
+    keys = queryset.annotate(key=Lower(field)).values('key').annotate(rows=Count('pk')).order_by('key')
+    collisions, last = [], None
+    while True:
+        batch = list((keys if last is None else keys.filter(key__gt=last))[:batch_size])
+        collisions.extend((row['key'], row['rows']) for row in batch if row['rows'] > 1)
+        if len(batch) < batch_size:
+            return collisions
+        last = batch[-1]['key']
+
+
+def check_collisions(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    problems = []
+    for field in ('email', 'username'):
+        collisions = find_collisions(User._base_manager.all(), field)
+        if not collisions:
+            continue
+        listed = ', '.join(f'{key!r} ({rows} users)' for key, rows in collisions[:REPORT_LIMIT])
+        more = f' and {len(collisions) - REPORT_LIMIT} more' if len(collisions) > REPORT_LIMIT else ''
+        problems.append(f'{len(collisions)} {field} values differ only in case: {listed}{more}')
+    if problems:
+        raise RuntimeError(
+            'Cannot make user emails and usernames unique ignoring case. Rename or merge these '
+            'accounts, then migrate again. ' + '; '.join(problems)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_medical_records'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', accounts.models.UserManager()),
+            ],
+        ),
+        # Non-unique first, so the collision scan is an index walk
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='user_email_lower_scan'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='user_username_lower_scan'),
+        ),
+        migrations.RunPython(check_collisions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(max_length=254),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='user_email_ci_unique', violation_error_message='A user with this email already exists.'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='user_username_ci_unique', violation_error_message='A user with that username already exists.'),
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_email_lower_scan',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_username_lower_scan',
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:46
+
+import django.db.models.deletion
+import django.db.models.manager
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_case_insensitive_identity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDoctorProfile',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('specialization', models.CharField(max_length=100)),
+                ('qualification', models.CharField(max_length=100)),
+                ('experience_years', models.PositiveIntegerField(default=0)),
+                ('is_approved', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Doctor Profile',
+                'verbose_name_plural': 'Archived Doctor Profiles',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPatientProfile',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date_of_birth', models.DateField(blank=True, null=True)),
+                ('gender', models.CharField(blank=True, choices=[('M', 'Male'), ('F', 'Female'), ('O', 'Other')], max_length=1, null=True)),
+                ('phone_number', models.CharField(blank=True, max_length=20, null=True)),
+                ('address', models.TextField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Patient Profile',
+                'verbose_name_plural': 'Archived Patient Profiles',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='doctorprofile',
+            options={'default_manager_name': 'all_objects', 'verbose_name': 'Doctor Profile', 'verbose_name_plural': 'Doctor Profiles'},
+        ),
+        migrations.AlterModelOptions(
+            name='patientprofile',
+            options={'default_manager_name': 'all_objects', 'verbose_name': 'Patient Profile', 'verbose_name_plural': 'Patient Profiles'},
+        ),
+        migrations.AlterModelManagers(
+            name='doctorprofile',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='patientprofile',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at'], name='doctor_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(condition=models.Q(('is_active', True), _negated=True), fields=['updated_at'], name='doctor_inactive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientprofile',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='patient_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientprofile',
+            index=models.Index(condition=models.Q(('is_active', True), _negated=True), fields=['updated_at'], name='patient_inactive_idx'),
+        ),
+        migrations.AddField(
+            model_name='archiveddoctorprofile',
+            name='clinic',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.clinic'),
+        ),
+        migrations.AddField(
+            model_name='archiveddoctorprofile',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archived_doctor_profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedpatientprofile',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archived_patient_profile', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
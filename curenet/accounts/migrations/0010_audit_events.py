@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_soft_delete_and_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.PositiveSmallIntegerField(choices=[(1, 'Patient profile'), (2, 'Doctor profile')])),
+                ('subject_id', models.PositiveBigIntegerField()),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'Created'), (2, 'Updated'), (3, 'Approved'), (4, 'Rejected'), (5, 'Clinic assigned'), (6, 'Archived'), (7, 'Restored')])),
+                ('actor_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('changes', models.JSONField(blank=True, null=True)),
+                ('at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Audit Event',
+                'verbose_name_plural': 'Audit Events',
+                'indexes': [models.Index(fields=['subject', 'subject_id', 'at'], name='audit_subject_idx')],
+            },
+        ),
+    ]
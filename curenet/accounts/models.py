@@ -1,5 +1,6 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.db import NotSupportedError, models
+from django.db.models.functions import Lower
 
 
 class Clinic(models.Model):
@@ -23,6 +24,31 @@ class Clinic(models.Model):
         verbose_name_plural = 'Clinics'
 
 
+class UserQuerySet(models.QuerySet):
+    """
+    Case-insensitive identity lookups. Each compares ``LOWER(column)`` with
+    ``LOWER(value)``, so it is a seek on the matching unique index rather
+    than the scan ``iexact`` would do.
+    """
+
+    def with_email(self, email):
+        return self.alias(email_key=Lower('email')).filter(email_key=Lower(models.Value(email)))
+
+    def with_username(self, username):
+        return self.alias(username_key=Lower('username')).filter(username_key=Lower(models.Value(username)))
+
+    def with_identifier(self, identifier):
+        """Users whose username or email is ``identifier``; at most two."""
+        key = Lower(models.Value(identifier))
+        return self.alias(username_key=Lower('username'), email_key=Lower('email')).filter(
+            models.Q(username_key=key) | models.Q(email_key=key)
+        )
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     """
     Custom User model supporting Patient, Doctor, and Admin roles.
@@ -35,7 +61,10 @@ class User(AbstractUser):
         ADMIN = 'ADMIN', 'Admin'
 
     role = models.CharField(max_length=10, choices=Role.choices, db_index=True)  # Added: db_index for fast role lookups
-    email = models.EmailField(unique=True)
+    # Unique ignoring case, see Meta.constraints
+    email = models.EmailField()
+
+    objects = UserManager()
 
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
@@ -43,6 +72,31 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        constraints = [
+            models.UniqueConstraint(
+                Lower('email'), name='user_email_ci_unique',
+                violation_error_message='A user with this email already exists.',
+            ),
+            models.UniqueConstraint(
+                Lower('username'), name='user_username_ci_unique',
+                violation_error_message='A user with that username already exists.',
+            ),
+        ]
+
+
+# Profiles that are not soft-deleted; also the condition of the ``*_active_idx`` indexes
+ACTIVE = models.Q(is_active=True)
+
+
+class ActiveManager(models.Manager):
+    """
+    Manager of the rows matching ``ACTIVE``. Models using it as ``objects``
+    keep an unfiltered ``all_objects`` as their default manager, so the
+    admin, related managers and validation still see deactivated rows.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(ACTIVE)
 
 
 class PatientProfile(models.Model):
@@ -65,12 +119,35 @@ class PatientProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return f"Patient: {self.user.username}"
 
     class Meta:
         verbose_name = 'Patient Profile'
         verbose_name_plural = 'Patient Profiles'
+        default_manager_name = 'all_objects'
+        indexes = [
+            models.Index(fields=['id'], condition=ACTIVE, name='patient_active_idx'),
+            # Archival candidates (accounts.archival)
+            models.Index(fields=['updated_at'], condition=~ACTIVE, name='patient_inactive_idx'),
+        ]
+
+
+# Doctors shown publicly; also the condition of the directory's partial indexes
+LISTED_DOCTOR = models.Q(is_approved=True, is_active=True)
+
+
+class DoctorProfileQuerySet(models.QuerySet):
+    def listed(self):
+        """Approved, active doctors, matching the partial directory indexes."""
+        return self.filter(LISTED_DOCTOR)
+
+
+class DoctorProfileManager(ActiveManager.from_queryset(DoctorProfileQuerySet)):
+    pass
 
 
 class DoctorProfile(models.Model):
@@ -90,9 +167,369 @@ class DoctorProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DoctorProfileManager()
+    all_objects = DoctorProfileQuerySet.as_manager()
+
     def __str__(self):
         return f"Dr. {self.user.first_name} {self.user.last_name} - {self.specialization}"
 
     class Meta:
         verbose_name = 'Doctor Profile'
         verbose_name_plural = 'Doctor Profiles'
+        default_manager_name = 'all_objects'
+        # Added: partial indexes for keyset pagination of the directory
+        indexes = [
+            # Not on id, where it would compete with doctor_listed_idx
+            models.Index(fields=['created_at'], condition=ACTIVE, name='doctor_active_idx'),
+            models.Index(fields=['updated_at'], condition=~ACTIVE, name='doctor_inactive_idx'),
+            models.Index(fields=['id'], condition=LISTED_DOCTOR, name='doctor_listed_idx'),
+            models.Index(fields=['specialization', 'id'], condition=LISTED_DOCTOR, name='doctor_listed_spec_idx'),
+            models.Index(fields=['clinic', 'id'], condition=LISTED_DOCTOR, name='doctor_listed_clinic_idx'),
+        ]
+
+
+class ArchivedPatientProfile(models.Model):
+    """
+    A deactivated patient profile moved out of the hot table by
+    accounts.archival. Keeps the profile's id, which a restore reuses.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='archived_patient_profile')
+    date_of_birth = models.DateField(null=True, blank=True)
+    gender = models.CharField(max_length=1, choices=PatientProfile.Gender.choices, null=True, blank=True)
+    phone_number = models.CharField(max_length=20, null=True, blank=True)
+    address = models.TextField(null=True, blank=True)
+    is_active = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived patient: {self.user_id}"
+
+    class Meta:
+        verbose_name = 'Archived Patient Profile'
+        verbose_name_plural = 'Archived Patient Profiles'
+
+
+class ArchivedDoctorProfile(models.Model):
+    """
+    A deactivated doctor profile moved out of the hot table by
+    accounts.archival. Keeps the profile's id, which a restore reuses.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='archived_doctor_profile')
+    clinic = models.ForeignKey(Clinic, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    specialization = models.CharField(max_length=100)
+    qualification = models.CharField(max_length=100)
+    experience_years = models.PositiveIntegerField(default=0)
+    is_approved = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived doctor: {self.user_id}"
+
+    class Meta:
+        verbose_name = 'Archived Doctor Profile'
+        verbose_name_plural = 'Archived Doctor Profiles'
+
+
+class SearchDocument(models.Model):
+    """
+    Denormalized search text for a doctor or clinic, kept in sync by
+    accounts.search and mirrored into the full-text index.
+    """
+    class Kind(models.TextChoices):
+        DOCTOR = 'doctor', 'Doctor'
+        CLINIC = 'clinic', 'Clinic'
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    object_id = models.PositiveBigIntegerField()
+    body = models.TextField()
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id}"
+
+    class Meta:
+        verbose_name = 'Search Document'
+        verbose_name_plural = 'Search Documents'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+
+
+class AvailabilityRule(models.Model):
+    """
+    Weekly working hours of a doctor, materialized into Slots by
+    accounts.appointments.
+    """
+    class Weekday(models.IntegerChoices):
+        MONDAY = 0, 'Monday'
+        TUESDAY = 1, 'Tuesday'
+        WEDNESDAY = 2, 'Wednesday'
+        THURSDAY = 3, 'Thursday'
+        FRIDAY = 4, 'Friday'
+        SATURDAY = 5, 'Saturday'
+        SUNDAY = 6, 'Sunday'
+
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='availability_rules')
+    # Defaults to the doctor's clinic when not set
+    clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    weekday = models.PositiveSmallIntegerField(choices=Weekday.choices)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+    valid_from = models.DateField(null=True, blank=True)
+    valid_until = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.doctor_id} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+    class Meta:
+        verbose_name = 'Availability Rule'
+        verbose_name_plural = 'Availability Rules'
+        constraints = [
+            models.CheckConstraint(condition=models.Q(start_time__lt=models.F('end_time')), name='rule_starts_before_end'),
+            models.CheckConstraint(condition=models.Q(slot_minutes__gt=0), name='rule_positive_slot_length'),
+        ]
+
+
+class Slot(models.Model):
+    """
+    One bookable period of a doctor. Materialized ahead of time from the
+    availability rules; ``is_booked`` flips when an appointment takes it.
+    """
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='slots')
+    clinic = models.ForeignKey(Clinic, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    is_booked = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.doctor_id} @ {self.start:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        verbose_name = 'Slot'
+        verbose_name_plural = 'Slots'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'start'], name='unique_doctor_slot'),
+        ]
+        indexes = [
+            # "Next free slots" of a doctor, and across doctors by time
+            models.Index(fields=['doctor', 'start'], condition=models.Q(is_booked=False), name='slot_free_doctor_idx'),
+            models.Index(fields=['start', 'doctor'], condition=models.Q(is_booked=False), name='slot_free_start_idx'),
+        ]
+
+
+class Appointment(models.Model):
+    """
+    A patient's booking of a doctor's slot. At most one BOOKED appointment
+    may exist per doctor and start, enforced by the database.
+    """
+    class Status(models.TextChoices):
+        BOOKED = 'BOOKED', 'Booked'
+        CANCELLED = 'CANCELLED', 'Cancelled'
+        COMPLETED = 'COMPLETED', 'Completed'
+
+    slot = models.ForeignKey(Slot, on_delete=models.PROTECT, related_name='appointments')
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='appointments')
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='appointments')
+    clinic = models.ForeignKey(Clinic, on_delete=models.SET_NULL, null=True, blank=True, related_name='appointments')
+    start = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.BOOKED)
+    reason = models.CharField(max_length=255, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.patient_id} with {self.doctor_id} @ {self.start:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        verbose_name = 'Appointment'
+        verbose_name_plural = 'Appointments'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'start'], condition=models.Q(status='BOOKED'), name='unique_active_booking',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['patient', 'start'], name='appointment_patient_idx'),
+            models.Index(fields=['doctor', 'start'], name='appointment_doctor_idx'),
+        ]
+
+
+class AvailabilityDay(models.Model):
+    """
+    Free slots of a doctor on one day as a bitmap (bit i: a free slot
+    starts i * 5 minutes after midnight). Maintained by
+    accounts.availability from the Slot rows.
+    """
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='availability_days')
+    day = models.DateField()
+    bitmap = models.BinaryField(max_length=36)
+    free_slots = models.PositiveSmallIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.doctor_id} on {self.day}: {self.free_slots} free"
+
+    class Meta:
+        verbose_name = 'Availability Day'
+        verbose_name_plural = 'Availability Days'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'day'], name='unique_availability_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'doctor'], condition=models.Q(free_slots__gt=0), name='availability_free_day_idx'),
+        ]
+
+
+class RecordBlob(models.Model):
+    """
+    Content of one or more medical records, stored once per SHA-256 under
+    MEDICAL_RECORDS_ROOT (see accounts.records).
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+    class Meta:
+        verbose_name = 'Record Blob'
+        verbose_name_plural = 'Record Blobs'
+
+
+class MedicalRecord(models.Model):
+    """
+    A scan, PDF or other document in a patient's medical record.
+    """
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='medical_records')
+    # Doctor who added the record, if not the patient
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='medical_records')
+    blob = models.ForeignKey(RecordBlob, on_delete=models.PROTECT, related_name='records')
+    title = models.CharField(max_length=200)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.title} ({self.patient_id})"
+
+    class Meta:
+        verbose_name = 'Medical Record'
+        verbose_name_plural = 'Medical Records'
+        indexes = [
+            models.Index(fields=['patient', '-created_at'], name='record_patient_idx'),
+        ]
+
+
+class AuditEventQuerySet(models.QuerySet):
+    """Audit events are append-only: no bulk updates or deletes."""
+
+    def update(self, **kwargs):
+        raise NotSupportedError('Audit events are append-only.')
+
+    def delete(self):
+        raise NotSupportedError('Audit events are append-only.')
+
+
+class AuditEvent(models.Model):
+    """
+    One audited change of a profile, written in batches by accounts.audit.
+    Kept compact: small integer codes, and the actor as a bare id so that
+    deleting a user neither cascades into nor rewrites the trail.
+    """
+    class Action(models.IntegerChoices):
+        CREATE = 1, 'Created'
+        UPDATE = 2, 'Updated'
+        APPROVE = 3, 'Approved'
+        REJECT = 4, 'Rejected'
+        ASSIGN_CLINIC = 5, 'Clinic assigned'
+        ARCHIVE = 6, 'Archived'
+        RESTORE = 7, 'Restored'
+
+    class Subject(models.IntegerChoices):
+        PATIENT = 1, 'Patient profile'
+        DOCTOR = 2, 'Doctor profile'
+
+    subject = models.PositiveSmallIntegerField(choices=Subject.choices)
+    subject_id = models.PositiveBigIntegerField()
+    action = models.PositiveSmallIntegerField(choices=Action.choices)
+    # None for changes made outside a request (management commands)
+    actor_id = models.PositiveBigIntegerField(null=True, blank=True)
+    changes = models.JSONField(null=True, blank=True)
+    at = models.DateTimeField()
+
+    objects = AuditEventQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.get_subject_display()} #{self.subject_id} {self.get_action_display().lower()}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise NotSupportedError('Audit events are append-only.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise NotSupportedError('Audit events are append-only.')
+
+    class Meta:
+        verbose_name = 'Audit Event'
+        verbose_name_plural = 'Audit Events'
+        indexes = [
+            models.Index(fields=['subject', 'subject_id', 'at'], name='audit_subject_idx'),
+        ]
+
+
+class Job(models.Model):
+    """
+    A unit of background work (an email, a slow side effect) run by
+    ``manage.py runworker``; see accounts.jobs. Rows are deleted once they
+    succeed, so the table only holds queued, running and failed jobs.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', 'Queued'
+        RUNNING = 'RUNNING', 'Running'
+        FAILED = 'FAILED', 'Failed'
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Not run before this time; pushed back by retries
+    run_at = models.DateTimeField()
+    # Set while running: which claim took the job, and when
+    claim = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display().lower()})"
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            # Next due job, and due jobs of its kind for a batch
+            models.Index(fields=['run_at'], condition=models.Q(status='QUEUED'), name='job_due_idx'),
+            models.Index(fields=['kind', 'run_at'], condition=models.Q(status='QUEUED'), name='job_due_kind_idx'),
+            # Expired leases of crashed workers
+            models.Index(fields=['claimed_at'], condition=models.Q(status='RUNNING'), name='job_running_idx'),
+        ]
@@ -0,0 +1,44 @@
+"""
+Account emails.
+
+Sent by the job queue (accounts.jobs) instead of the request that asks
+for them, one SMTP connection per batch of jobs.
+"""
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from . import jobs, routers
+from .models import User
+
+WELCOME = 'welcome_email'
+DOCTOR_APPROVED = 'doctor_approved_email'
+
+
+def _send(template, subject, payloads):
+    """Render ``template`` for each payload's user and send them over one connection."""
+    # From the primary: the users may have been created moments ago
+    with routers.primary():
+        users = list(User.objects.filter(pk__in=[payload['user_id'] for payload in payloads]))
+    messages = [
+        EmailMessage(subject, render_to_string(template, {'user': user}), to=[user.email])
+        for user in users if user.email
+    ]
+    with get_connection() as connection:
+        connection.send_messages(messages)
+
+
+@jobs.handler(WELCOME, batch_size=100)
+def send_welcome_emails(payloads):
+    _send('accounts/email/welcome.txt', 'Welcome to CureNet', payloads)
+
+
+@jobs.handler(DOCTOR_APPROVED, batch_size=500)
+def send_approval_emails(payloads):
+    _send('accounts/email/doctor_approved.txt', 'Your CureNet account has been approved', payloads)
+
+
+def queue_welcome(user):
+    jobs.enqueue(WELCOME, {'user_id': user.pk})
+
+
+def queue_approval_emails(user_ids):
+    jobs.enqueue_many(DOCTOR_APPROVED, [{'user_id': pk} for pk in user_ids])
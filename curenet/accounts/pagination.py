@@ -0,0 +1,77 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Below this many rows an exact COUNT(*) is cheap enough to keep
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimated_row_count(model, using='default', index=None):
+    """
+    Planner's row estimate for ``model``'s table, or for the rows covered
+    by its partial ``index``, or None when the backend keeps none:
+    pg_class.reltuples on PostgreSQL, sqlite_stat1 (filled by ANALYZE) on
+    SQLite.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [index or table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # A stat starts with the row count its index covers; partial
+            # indexes cover fewer rows, so the largest is the table's.
+            sql = (
+                "SELECT MAX(CAST(substr(stat, 1, instr(stat || ' ', ' ') - 1) AS INTEGER)) "
+                "FROM sqlite_stat1 WHERE tbl = %s"
+            )
+            params = [table]
+            if index:
+                sql += ' AND idx = %s'
+                params.append(index)
+            cursor.execute(sql, params)
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def _covering_index(queryset):
+    """
+    Name of a partial index of the queryset's model whose condition is the
+    queryset's whole filter (e.g. ``ACTIVE`` rows), or None.
+    """
+    for index in queryset.model._meta.indexes:
+        if index.condition is not None:
+            filtered = queryset.model._base_manager.filter(index.condition)
+            if filtered.query.where == queryset.query.where:
+                return index.name
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the planner's row estimate instead of COUNT(*) for
+    unfiltered querysets over large tables, and for querysets filtered to
+    exactly the rows of a partial index.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query'):
+            estimate = None
+            if not queryset.query.where:
+                estimate = estimated_row_count(queryset.model, queryset.db)
+            else:
+                index = _covering_index(queryset)
+                if index is not None:
+                    estimate = estimated_row_count(queryset.model, queryset.db, index)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
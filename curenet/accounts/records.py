@@ -0,0 +1,280 @@
+"""
+Medical record storage.
+
+Record contents are stored once per SHA-256 under
+``MEDICAL_RECORDS_ROOT`` (``ab/cd/abcd...``), shared by every record with
+the same bytes. Uploads never sit in memory: ``HashingUploadHandler``
+streams each chunk to a temporary file inside the records root while
+hashing it, and ``store`` then moves that file into place with a rename,
+or drops it when the content is already stored.
+
+Downloads go through ``record_response``. With ``MEDICAL_RECORDS_SENDFILE``
+set to 'x-accel' (nginx) or 'x-sendfile' (Apache) the front server sends
+the file, including ranges. Otherwise a full download is a FileResponse,
+which WSGI servers pass to sendfile(), and a ``Range`` request is
+answered 206 with chunks read by ``os.pread``. Under ASGI, Django reads a
+synchronous streaming response whole into memory before sending it, so
+there both are streamed by an async iterator reading the chunks in a
+worker thread. Memory use stays flat whatever the file size.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from .models import Appointment, MedicalRecord, RecordBlob, User
+
+CHUNK_SIZE = 256 * 1024
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RecordTooLarge(Exception):
+    pass
+
+
+def root():
+    return os.fspath(settings.MEDICAL_RECORDS_ROOT)
+
+
+def blob_path(sha256):
+    return os.path.join(root(), sha256[:2], sha256[2:4], sha256)
+
+
+def _temporary_file():
+    directory = os.path.join(root(), 'tmp')
+    os.makedirs(directory, exist_ok=True)
+    # Same filesystem as the blobs, so storing is a rename
+    return tempfile.NamedTemporaryFile(dir=directory, delete=False)
+
+
+class HashedTemporaryFile(UploadedFile):
+    """An upload written to the records root, with its SHA-256."""
+
+    def __init__(self, file, name, content_type, size, charset, sha256):
+        super().__init__(file, name, content_type, size, charset)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Stream file uploads to the records root in chunks, hashing them on the
+    way. Install it on the request before POST data is read.
+    """
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = _temporary_file()
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.MEDICAL_RECORD_MAX_BYTES:
+            self.too_large = True
+            self._discard()
+            raise StopUpload()
+        self.file.write(raw_data)
+        self.hash.update(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        return HashedTemporaryFile(
+            self.file, self.file_name, self.content_type, file_size, self.charset, self.hash.hexdigest(),
+        )
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self._discard()
+
+    def _discard(self):
+        self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+
+def discard(upload):
+    """Delete the temporary file of an upload that was not stored."""
+    upload.file.close()
+    try:
+        os.unlink(upload.temporary_file_path())
+    except FileNotFoundError:
+        pass
+
+
+def _blob_for(path, sha256, size):
+    """Move the hashed file at ``path`` into place; returns its RecordBlob."""
+    target = blob_path(sha256)
+    if os.path.exists(target):
+        os.unlink(path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+    try:
+        with transaction.atomic():
+            blob, _ = RecordBlob.objects.get_or_create(sha256=sha256, defaults={'size': size})
+    except IntegrityError:
+        # Stored concurrently by another upload of the same content
+        blob = RecordBlob.objects.get(sha256=sha256)
+    return blob
+
+
+def store(upload, patient, title, doctor=None):
+    """Create a MedicalRecord for an upload received by HashingUploadHandler."""
+    upload.file.close()
+    blob = _blob_for(upload.temporary_file_path(), upload.sha256, upload.size)
+    return MedicalRecord.objects.create(
+        patient=patient, doctor=doctor, blob=blob, title=title or upload.name,
+        filename=upload.name, content_type=upload.content_type or 'application/octet-stream',
+    )
+
+
+def store_file(source, patient, title, filename, content_type='application/octet-stream', doctor=None):
+    """Create a MedicalRecord from a readable binary file, copying it in chunks."""
+    digest, size = hashlib.sha256(), 0
+    with _temporary_file() as target:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            size += len(chunk)
+            if size > settings.MEDICAL_RECORD_MAX_BYTES:
+                target.close()
+                os.unlink(target.name)
+                raise RecordTooLarge(filename)
+            target.write(chunk)
+            digest.update(chunk)
+    blob = _blob_for(target.name, digest.hexdigest(), size)
+    return MedicalRecord.objects.create(
+        patient=patient, doctor=doctor, blob=blob, title=title, filename=filename, content_type=content_type,
+    )
+
+
+def can_access(user, patient):
+    """Whether ``user`` may read and add records of ``patient``."""
+    if user.is_staff:
+        return True
+    if user.role == User.Role.PATIENT:
+        return patient.user_id == user.pk
+    if user.role == User.Role.DOCTOR:
+        # A cancelled booking is no treatment relationship
+        return Appointment.objects.filter(
+            patient=patient, doctor__user=user,
+            status__in=[Appointment.Status.BOOKED, Appointment.Status.COMPLETED],
+        ).exists()
+    return False
+
+
+def parse_range(header, size):
+    """
+    The (start, end) byte range, end inclusive, of a single-range
+    ``Range`` header; None to send the whole file (no, malformed or
+    multi-range header). Raises ValueError when unsatisfiable.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, end):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        offset = start
+        while offset <= end:
+            chunk = os.pread(fd, min(CHUNK_SIZE, end - offset + 1), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+    finally:
+        os.close(fd)
+
+
+async def _aread_range(path, start, end):
+    pread = sync_to_async(os.pread, thread_sensitive=False)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        offset = start
+        while offset <= end:
+            chunk = await pread(fd, min(CHUNK_SIZE, end - offset + 1), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+    finally:
+        os.close(fd)
+
+
+def record_response(request, record):
+    """Response sending ``record``'s content, honouring Range and If-Range."""
+    blob = record.blob
+    path = blob_path(blob.sha256)
+    etag = f'"{blob.sha256}"'
+    headers = {
+        'Content-Disposition': content_disposition_header(True, record.filename),
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+    }
+
+    mode = getattr(settings, 'MEDICAL_RECORDS_SENDFILE', None)
+    if mode == 'x-accel':
+        relative = os.path.relpath(path, root())
+        headers['X-Accel-Redirect'] = settings.MEDICAL_RECORDS_ACCEL_PREFIX.rstrip('/') + '/' + relative
+        return HttpResponse(content_type=record.content_type, headers=headers)
+    if mode == 'x-sendfile':
+        headers['X-Sendfile'] = path
+        return HttpResponse(content_type=record.content_type, headers=headers)
+
+    read_range = _aread_range if isinstance(request, ASGIRequest) else _read_range
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, blob.size)
+        except ValueError:
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{blob.size}'})
+        if byte_range is not None:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(path, start, end), status=206, content_type=record.content_type, headers=headers,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{blob.size}'
+            response['Content-Length'] = str(end - start + 1)
+            return response
+
+    if read_range is _aread_range:
+        response = StreamingHttpResponse(
+            read_range(path, 0, blob.size - 1), content_type=record.content_type, headers=headers,
+        )
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=record.content_type, headers=headers)
+    response['Content-Length'] = str(blob.size)
+    return response
@@ -0,0 +1,81 @@
+"""
+Primary/replica routing for the accounts app.
+
+Reads of accounts models go to a random alias from ``DATABASE_REPLICAS``
+and writes go to ``default``. Once a request writes, its remaining reads
+are pinned to the primary, and ``PrimaryPinningMiddleware`` sets a cookie
+that keeps the browser's reads on the primary for
+``REPLICA_PIN_SECONDS``, so a user sees their own writes (e.g. the
+dashboard right after ``create_patient_profile``) despite replica lag.
+Without replicas configured every query uses ``default``.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+PRIMARY = 'default'
+
+
+class RoutingState:
+    """Per-request routing flags, shared with threads the request spawns."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('accounts_routing_state', default=None)
+
+
+def begin(pinned=False):
+    """Start tracking a request; returns a token for ``end``."""
+    return _state.set(RoutingState(pinned))
+
+
+def end(token):
+    """Stop tracking a request; returns whether it wrote to the primary."""
+    state = _state.get()
+    _state.reset(token)
+    return state.wrote
+
+
+@contextmanager
+def primary():
+    """Send every accounts read in the block to the primary."""
+    token = begin(pinned=True)
+    try:
+        yield
+    finally:
+        end(token)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'accounts':
+            return None
+        state = _state.get()
+        aliases = replicas()
+        if not aliases or (state is not None and state.pinned):
+            return PRIMARY
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != 'accounts':
+            return None
+        state = _state.get()
+        if state is not None:
+            # Read-your-writes for the rest of this request
+            state.pinned = state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        pool = {PRIMARY, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
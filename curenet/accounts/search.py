@@ -0,0 +1,192 @@
+"""
+Full-text search over doctors and clinics.
+
+Each doctor and clinic has one SearchDocument holding its denormalized
+text. On SQLite the documents are mirrored into an FTS5 table by
+triggers; on PostgreSQL they are matched through a GIN tsvector index.
+Other backends fall back to ``icontains`` on the document body. Query
+terms match as prefixes; on SQLite a query with no hits is retried with
+each term widened to close spellings from the FTS vocabulary.
+"""
+import difflib
+import re
+from django.db import connection, transaction
+from .models import Clinic, DoctorProfile, SearchDocument
+
+Kind = SearchDocument.Kind
+
+# Spelling candidates considered per query term
+MAX_SUGGESTIONS = 3
+SUGGESTION_CUTOFF = 0.75
+
+
+def doctor_document(profile):
+    user = profile.user
+    parts = [
+        user.first_name, user.last_name, user.username, user.email,
+        profile.specialization, profile.qualification,
+        profile.clinic.name if profile.clinic else '',
+    ]
+    return ' '.join(part for part in parts if part)
+
+
+def clinic_document(clinic):
+    parts = [clinic.name, clinic.address, clinic.email, clinic.phone_number]
+    return ' '.join(part for part in parts if part)
+
+
+def _doctors():
+    # Deactivated doctors stay searchable in the admin
+    return DoctorProfile.all_objects.select_related('user', 'clinic')
+
+
+def index_doctor(profile):
+    SearchDocument.objects.update_or_create(
+        kind=Kind.DOCTOR, object_id=profile.pk, defaults={'body': doctor_document(profile)}
+    )
+
+
+def index_new_doctors(profile_ids, batch_size=1000):
+    """Bulk-create documents for doctors that have none yet (bulk imports)."""
+    profiles = _doctors().filter(pk__in=profile_ids)
+    SearchDocument.objects.bulk_create(
+        [SearchDocument(kind=Kind.DOCTOR, object_id=profile.pk, body=doctor_document(profile))
+         for profile in profiles],
+        batch_size=batch_size,
+    )
+
+
+def reindex_doctors(profiles, batch_size=1000):
+    """
+    Rewrite the documents of ``profiles`` (a DoctorProfile queryset) after
+    a bulk update, with one upsert per batch.
+    """
+    batch = []
+    for profile in profiles.select_related('user', 'clinic').iterator(chunk_size=batch_size):
+        batch.append(SearchDocument(kind=Kind.DOCTOR, object_id=profile.pk, body=doctor_document(profile)))
+        if len(batch) >= batch_size:
+            _upsert(batch)
+            batch = []
+    _upsert(batch)
+
+
+def _upsert(documents):
+    SearchDocument.objects.bulk_create(
+        documents, update_conflicts=True, unique_fields=['kind', 'object_id'], update_fields=['body', 'updated_at'],
+    )
+
+
+def index_doctors_of_user(user):
+    """Reindex the doctor profile of ``user``, if any, after a name change."""
+    for profile in _doctors().filter(user=user):
+        index_doctor(profile)
+
+
+def index_clinic(clinic):
+    """
+    Reindex a clinic whose document changed, and its doctors, whose
+    documents carry its name, with one upsert per batch.
+    """
+    body = clinic_document(clinic)
+    stored = SearchDocument.objects.filter(kind=Kind.CLINIC, object_id=clinic.pk).values_list('body', flat=True)
+    if stored.first() == body:
+        return
+    with transaction.atomic():
+        _upsert([SearchDocument(kind=Kind.CLINIC, object_id=clinic.pk, body=body)])
+        reindex_doctors(DoctorProfile.all_objects.filter(clinic=clinic))
+
+
+def remove(kind, object_id):
+    SearchDocument.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild(batch_size=1000):
+    """Recreate every search document; returns the number written."""
+    written = 0
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        sources = [
+            (Kind.CLINIC, Clinic.objects.all(), clinic_document),
+            (Kind.DOCTOR, _doctors(), doctor_document),
+        ]
+        for kind, queryset, build in sources:
+            batch = []
+            for obj in queryset.iterator(chunk_size=batch_size):
+                batch.append(SearchDocument(kind=kind, object_id=obj.pk, body=build(obj)))
+                if len(batch) >= batch_size:
+                    written += len(SearchDocument.objects.bulk_create(batch))
+                    batch = []
+            written += len(SearchDocument.objects.bulk_create(batch))
+    return written
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _sqlite_match(terms):
+    # Quoted terms keep FTS5 operators in user input from being parsed
+    return ' AND '.join(
+        '(' + ' OR '.join(f'"{option}"*' for option in options) + ')'
+        for options in terms
+    )
+
+
+def _sqlite_suggestions(term):
+    """Close spellings of ``term`` from the FTS vocabulary."""
+    with connection.cursor() as cursor:
+        # Limit candidates to terms sharing the first letter
+        cursor.execute(
+            'SELECT term FROM accounts_search_vocab WHERE term >= %s AND term < %s',
+            [term[0], term[0] + '\uffff'],
+        )
+        vocabulary = [row[0] for row in cursor.fetchall()]
+    return difflib.get_close_matches(term, vocabulary, n=MAX_SUGGESTIONS, cutoff=SUGGESTION_CUTOFF)
+
+
+def _sqlite_search(terms, kind, limit):
+    sql = (
+        'SELECT d.object_id FROM accounts_search_fts f '
+        'JOIN accounts_searchdocument d ON d.id = f.rowid '
+        'WHERE accounts_search_fts MATCH %s AND d.kind = %s '
+        'ORDER BY bm25(accounts_search_fts) LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_sqlite_match(terms), kind, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgres_search(terms, kind, limit):
+    tsquery = ' & '.join(
+        '(' + ' | '.join(f'{option}:*' for option in options) + ')' for options in terms
+    )
+    sql = (
+        "SELECT object_id FROM accounts_searchdocument "
+        "WHERE kind = %s AND to_tsvector('simple', body) @@ to_tsquery('simple', %s) "
+        "ORDER BY ts_rank(to_tsvector('simple', body), to_tsquery('simple', %s)) DESC LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [kind, tsquery, tsquery, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_ids(query, kind, limit=50):
+    """Return ids of ``kind`` objects matching ``query``, best match first."""
+    words = tokenize(query)
+    if not words:
+        return []
+    terms = [[word] for word in words]
+
+    if connection.vendor == 'sqlite':
+        ids = _sqlite_search(terms, kind, limit)
+        if not ids:
+            terms = [[word] + _sqlite_suggestions(word) for word in words]
+            ids = _sqlite_search(terms, kind, limit)
+        return ids
+    if connection.vendor == 'postgresql':
+        return _postgres_search(terms, kind, limit)
+
+    documents = SearchDocument.objects.filter(kind=kind)
+    for word in words:
+        documents = documents.filter(body__icontains=word)
+    return list(documents.values_list('object_id', flat=True)[:limit])
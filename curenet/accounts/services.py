@@ -0,0 +1,172 @@
+from enum import Enum
+from typing import NamedTuple
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from .models import User, DoctorProfile
+
+# Bump when the shape of AccountStatus changes so stale entries are ignored.
+STATUS_CACHE_VERSION = 1
+
+
+class LoginDecision(Enum):
+    """Outcome of the role/profile checks performed after authentication."""
+    OK = 'ok'
+    PENDING_APPROVAL = 'pending_approval'
+    DEACTIVATED = 'deactivated'
+    NEEDS_PROFILE = 'needs_profile'
+
+
+def _cached_profile(user, attr):
+    """
+    Return the profile under ``attr`` or None. Relies on the profile having
+    been joined by ``ProfileBackend``; a missing reverse one-to-one raises
+    DoesNotExist without a query once it has been select_related.
+    """
+    try:
+        return getattr(user, attr)
+    except ObjectDoesNotExist:
+        return None
+
+
+def role_profile(user):
+    """
+    Return the profile matching the user's role, or None for admins and
+    users who have not created their profile yet.
+    """
+    if user.role == User.Role.DOCTOR:
+        return _cached_profile(user, 'doctor_profile')
+    if user.role == User.Role.PATIENT:
+        return _cached_profile(user, 'patient_profile')
+    return None
+
+
+def archived_profile(user):
+    """The archived profile of the user's role (see accounts.archival), or None."""
+    if user.role == User.Role.DOCTOR:
+        return _cached_profile(user, 'archived_doctor_profile')
+    if user.role == User.Role.PATIENT:
+        return _cached_profile(user, 'archived_patient_profile')
+    return None
+
+
+class AccountStatus(NamedTuple):
+    """Approval/active flags of a user's role profile, as cached."""
+    role: str
+    has_profile: bool
+    is_approved: bool
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user):
+        profile = role_profile(user)
+        if profile is None:
+            # An archived profile was deactivated before it was moved
+            archived = archived_profile(user) is not None
+            return cls(user.role, archived, archived, False)
+        # Patients need no approval
+        is_approved = getattr(profile, 'is_approved', True)
+        return cls(user.role, True, is_approved, profile.is_active)
+
+
+def _status_key(user_id):
+    return f'accounts:status:{user_id}'
+
+
+def get_account_status(user):
+    """
+    Return the cached AccountStatus of ``user``.
+
+    On a miss the status is built from the user's profiles, which costs no
+    query for users loaded by ``accounts.backends.ProfileBackend``.
+    """
+    key = _status_key(user.pk)
+    status = cache.get(key, version=STATUS_CACHE_VERSION)
+    if status is None:
+        status = AccountStatus.from_user(user)
+        cache.set(
+            key, status,
+            timeout=getattr(settings, 'ACCOUNT_STATUS_CACHE_TIMEOUT', 300),
+            version=STATUS_CACHE_VERSION,
+        )
+    return status
+
+
+async def aget_account_status(user):
+    """
+    Async counterpart of ``get_account_status`` using the async cache API.
+    ``user`` must have its profiles joined (as ``ProfileBackend`` loads
+    it): building the status on a miss then touches no lazy relation.
+    """
+    key = _status_key(user.pk)
+    status = await cache.aget(key, version=STATUS_CACHE_VERSION)
+    if status is None:
+        status = AccountStatus.from_user(user)
+        await cache.aset(
+            key, status,
+            timeout=getattr(settings, 'ACCOUNT_STATUS_CACHE_TIMEOUT', 300),
+            version=STATUS_CACHE_VERSION,
+        )
+    return status
+
+
+def invalidate_account_status(user_ids):
+    """
+    Drop cached statuses, e.g. after a bulk update that skips signals.
+    This reaches other workers only through a shared default cache;
+    otherwise their copies expire after ACCOUNT_STATUS_CACHE_TIMEOUT.
+    """
+    cache.delete_many([_status_key(pk) for pk in user_ids], version=STATUS_CACHE_VERSION)
+
+
+def _login_decision(status):
+    if not status.has_profile:
+        return LoginDecision.NEEDS_PROFILE
+    if not status.is_approved:
+        return LoginDecision.PENDING_APPROVAL
+    if not status.is_active:
+        return LoginDecision.DEACTIVATED
+    return LoginDecision.OK
+
+
+def decide_login(user):
+    """
+    Decide whether an authenticated user may log in.
+
+    Reads the cached account status, so no query is issued on a cache hit
+    or for a user loaded by ``accounts.backends.ProfileBackend``.
+    """
+    if user.role not in (User.Role.DOCTOR, User.Role.PATIENT):
+        return LoginDecision.OK
+    return _login_decision(get_account_status(user))
+
+
+async def adecide_login(user):
+    """Async counterpart of ``decide_login`` for the ASGI login view."""
+    if user.role not in (User.Role.DOCTOR, User.Role.PATIENT):
+        return LoginDecision.OK
+    return _login_decision(await aget_account_status(user))
+
+
+def directory_queryset(specialization=None, clinic_id=None, min_experience=None):
+    """
+    Listed doctors for the public directory, ordered by id for keyset
+    pagination. Filters map onto the partial ``doctor_listed_*`` indexes;
+    ``only()`` keeps the joined user and clinic rows narrow.
+    """
+    doctors = (
+        DoctorProfile.objects.listed()
+        .select_related('user', 'clinic')
+        .only(
+            'id', 'specialization', 'qualification', 'experience_years',
+            'user__first_name', 'user__last_name', 'clinic__id', 'clinic__name',
+        )
+        .order_by('id')
+    )
+    if specialization:
+        doctors = doctors.filter(specialization=specialization)
+    if clinic_id is not None:
+        doctors = doctors.filter(clinic_id=clinic_id)
+    if min_experience is not None:
+        doctors = doctors.filter(experience_years__gte=min_experience)
+    return doctors
@@ -0,0 +1,115 @@
+import logging
+from django.conf import settings
+from django.db import OperationalError
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from . import appointments, approvals, audit, availability, notifications, search
+from .appointments import slots_changed
+from .instrumentation import time_query
+from .models import User, PatientProfile, DoctorProfile, Clinic, SearchDocument, AvailabilityRule
+from .services import invalidate_account_status
+
+logger = logging.getLogger(__name__)
+
+# User fields that appear in a doctor's search document
+SEARCHED_USER_FIELDS = {'first_name', 'last_name', 'username', 'email'}
+# Clinic fields that appear in search documents
+SEARCHED_CLINIC_FIELDS = {'name', 'address', 'email', 'phone_number'}
+
+
+@receiver([post_save, post_delete], sender=PatientProfile)
+@receiver([post_save, post_delete], sender=DoctorProfile)
+def invalidate_profile_status(sender, instance, **kwargs):
+    """Keep the account status cache in step with profile changes."""
+    invalidate_account_status([instance.user_id])
+
+
+@receiver(post_save, sender=PatientProfile)
+@receiver(post_save, sender=DoctorProfile)
+def audit_profile_change(sender, instance, created, update_fields=None, **kwargs):
+    changes = {'fields': sorted(update_fields)} if update_fields else None
+    audit.record(audit.Action.CREATE if created else audit.Action.UPDATE, sender, [instance.pk], changes)
+
+
+@receiver(approvals.doctors_approved)
+def queue_approval_emails(sender, user_ids, **kwargs):
+    notifications.queue_approval_emails(user_ids)
+
+
+@receiver(request_finished)
+def flush_audit_trail(sender, **kwargs):
+    # After the response has been sent
+    audit.flush()
+
+
+@receiver(post_save, sender=DoctorProfile)
+def index_doctor(sender, instance, **kwargs):
+    search.index_doctor(instance)
+
+
+@receiver(post_delete, sender=DoctorProfile)
+def unindex_doctor(sender, instance, **kwargs):
+    search.remove(SearchDocument.Kind.DOCTOR, instance.pk)
+
+
+@receiver(post_save, sender=Clinic)
+def index_clinic(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCHED_CLINIC_FIELDS & set(update_fields):
+        return
+    search.index_clinic(instance)
+
+
+@receiver(post_delete, sender=Clinic)
+def unindex_clinic(sender, instance, **kwargs):
+    search.remove(SearchDocument.Kind.CLINIC, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def reindex_doctor_user(sender, instance, created, update_fields=None, **kwargs):
+    # Skip new users (no profile yet) and saves such as last_login updates
+    if created or instance.role != User.Role.DOCTOR:
+        return
+    if update_fields is not None and not SEARCHED_USER_FIELDS & set(update_fields):
+        return
+    search.index_doctors_of_user(instance)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS to each new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            # In-memory databases (tests) cannot use WAL; skip them
+            if name == 'journal_mode' and connection.is_in_memory_db():
+                continue
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # The wrapper stays installed across reconnects of the same wrapper
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+@receiver([post_save, post_delete], sender=AvailabilityRule)
+def rematerialize_slots(sender, instance, origin=None, **kwargs):
+    # A rule deleted along with its doctor leaves nothing to rebuild
+    if origin is not None and getattr(origin, 'model', type(origin)) is not AvailabilityRule:
+        return
+    appointments.rematerialize(instance.doctor_id)
+
+
+@receiver(slots_changed)
+def refresh_availability(sender, doctor_id, starts, **kwargs):
+    try:
+        availability.refresh_starts(doctor_id, starts)
+    except OperationalError:
+        # The booking itself has committed; the next change of these days
+        # rewrites their index rows
+        logger.warning('Availability index of doctor %s not refreshed', doctor_id, exc_info=True)
@@ -1,3 +1,1729 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from datetime import date, datetime, time, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin as django_admin
+from django.contrib.admin.sites import site
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, NotSupportedError, OperationalError, connection, connections, transaction
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import include, path, reverse
+from django.utils import timezone
+from . import (
+    appointments, approvals, archival, async_views, audit, availability, bulkimport, export, instrumentation, jobs,
+    notifications, records, routers, search, services, signals, throttling,
+)
+from .models import User, PatientProfile, DoctorProfile, Clinic, SearchDocument, AvailabilityRule, Appointment, Slot
+from .models import ArchivedDoctorProfile, ArchivedPatientProfile, AuditEvent, Job, MedicalRecord, RecordBlob
+from .forms import UserRegistrationForm
+from .hashers import run_hasher
+from .middleware import PIN_COOKIE, PrimaryPinningMiddleware
+from .urls import build_urlpatterns
+from curenet import caches as caches_config, database
+from .services import LoginDecision, decide_login, directory_queryset, get_account_status
 
-# Create your tests here.
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def make_user(username, role, password='pass12345', **extra):
+    return User.objects.create_user(
+        username=username, email=extra.pop('email', f'{username}@example.com'),
+        password=password, role=role, **extra
+    )
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LoginTests(TestCase):
+    """Login decisions and the query budget of the login path."""
+
+    # One joined user+profiles SELECT and the last_login UPDATE; the other
+    # seven are database session bookkeeping (key check, INSERT, UPDATE and
+    # their savepoints).
+    LOGIN_QUERY_BUDGET = 9
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic = Clinic.objects.create(name='Central')
+        cls.patient = make_user('patient', User.Role.PATIENT)
+        PatientProfile.objects.create(user=cls.patient)
+        cls.doctor = make_user('doctor', User.Role.DOCTOR)
+        DoctorProfile.objects.create(
+            user=cls.doctor, clinic=cls.clinic, specialization='Cardiology',
+            qualification='MD', is_approved=True
+        )
+        cls.pending = make_user('pending', User.Role.DOCTOR)
+        DoctorProfile.objects.create(user=cls.pending, specialization='ENT', qualification='MD')
+        cls.newbie = make_user('newbie', User.Role.PATIENT)
+
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+
+    def post_login(self, username, password='pass12345', **extra):
+        return self.client.post(reverse('accounts:login'), {
+            'username': username, 'password': password
+        }, **extra)
+
+    def test_patient_login_within_query_budget(self):
+        with self.assertNumQueries(self.LOGIN_QUERY_BUDGET):
+            response = self.post_login('patient')
+        self.assertRedirects(response, reverse('accounts:profile_redirect'), fetch_redirect_response=False)
+
+    def test_doctor_login_within_query_budget(self):
+        with self.assertNumQueries(self.LOGIN_QUERY_BUDGET):
+            response = self.post_login('doctor')
+        self.assertRedirects(response, reverse('accounts:profile_redirect'), fetch_redirect_response=False)
+
+    def test_pending_doctor_is_not_logged_in(self):
+        with self.assertNumQueries(1):
+            response = self.post_login('pending')
+        self.assertContains(response, 'pending admin approval')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_missing_profile_redirects_to_profile_creation(self):
+        response = self.post_login('newbie')
+        self.assertRedirects(response, reverse('accounts:create_patient_profile'), fetch_redirect_response=False)
+
+    def test_decide_login(self):
+        from django.contrib.auth import authenticate
+        cases = {
+            'patient': LoginDecision.OK,
+            'doctor': LoginDecision.OK,
+            'pending': LoginDecision.PENDING_APPROVAL,
+            'newbie': LoginDecision.NEEDS_PROFILE,
+        }
+        for username, expected in cases.items():
+            user = authenticate(username=username, password='pass12345')
+            with self.assertNumQueries(0):
+                self.assertEqual(decide_login(user), expected)
+
+    def test_deactivated_patient(self):
+        PatientProfile.objects.filter(user=self.patient).update(is_active=False)
+        response = self.post_login('patient')
+        self.assertContains(response, 'deactivated')
+
+    def test_failed_passwords_lock_the_username_before_hashing(self):
+        with override_settings(LOGIN_THROTTLE={**settings.LOGIN_THROTTLE, 'USERNAME_LIMIT': 3}):
+            for _ in range(3):
+                self.assertContains(self.post_login('patient', 'wrong'), 'Invalid username or password.')
+            with self.assertNumQueries(0), mock.patch('accounts.backends.ProfileBackend.authenticate') as authenticate:
+                response = self.post_login('Patient ')
+            authenticate.assert_not_called()
+            self.assertContains(response, 'Too many login attempts', status_code=429)
+            self.assertGreater(int(response['Retry-After']), 0)
+            self.assertEqual(self.post_login('doctor').status_code, 302)
+
+    def test_successful_login_clears_failures(self):
+        with override_settings(LOGIN_THROTTLE={**settings.LOGIN_THROTTLE, 'USERNAME_LIMIT': 3}):
+            for _ in range(2):
+                self.post_login('patient', 'wrong')
+            self.assertEqual(self.post_login('patient').status_code, 302)
+            self.client.logout()
+            for _ in range(2):
+                self.post_login('patient', 'wrong')
+            self.assertEqual(self.post_login('patient').status_code, 302)
+
+    def test_attempts_are_limited_per_address(self):
+        with override_settings(LOGIN_THROTTLE={**settings.LOGIN_THROTTLE, 'IP_LIMIT': 2}):
+            for username in ('a', 'b'):
+                self.assertEqual(self.post_login(username, REMOTE_ADDR='203.0.113.5').status_code, 200)
+            self.assertEqual(self.post_login('c', REMOTE_ADDR='203.0.113.5').status_code, 429)
+            self.assertEqual(self.post_login('patient', REMOTE_ADDR='203.0.113.6').status_code, 302)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class IdentityTests(TestCase):
+    """Emails and usernames are unique and looked up ignoring case."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bob = make_user('Bob', User.Role.PATIENT, email='Bob@Example.com')
+        PatientProfile.objects.create(user=cls.bob)
+        # A username that is another user's email
+        cls.other = make_user('bob@example.org', User.Role.PATIENT, email='someone@example.org')
+
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+
+    def test_lookups_ignore_case_and_seek_the_unique_indexes(self):
+        self.assertEqual(User.objects.with_email('bob@example.COM').get(), self.bob)
+        self.assertEqual(User.objects.with_username('BOB').get(), self.bob)
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING INDEX user_email_ci_unique', User.objects.with_email('bob@example.com').explain())
+            self.assertIn('USING INDEX user_username_ci_unique', User.objects.with_username('bob').explain())
+
+    def test_case_variants_are_rejected(self):
+        form = UserRegistrationForm(data={
+            'username': 'bob', 'email': 'BOB@example.com', 'role': User.Role.PATIENT,
+            'password1': 'Str0ng-pass-phrase', 'password2': 'Str0ng-pass-phrase',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {'username', 'email'})
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            make_user('robert', User.Role.PATIENT, email='bob@EXAMPLE.com')
+
+        out = StringIO()
+        call_command('createadmin', '--username', 'root', '--email', 'BOB@example.com', '--password', 'x', '--noinput', stdout=out)
+        self.assertIn('already exists', out.getvalue())
+        self.assertFalse(User.objects.filter(username='root').exists())
+
+    def test_login_with_username_or_email_in_any_case(self):
+        for identifier in ('bob', 'BOB@example.com', ' bob@example.com '):
+            response = self.client.post(reverse('accounts:login'), {'username': identifier, 'password': 'pass12345'})
+            self.assertRedirects(response, reverse('accounts:profile_redirect'), fetch_redirect_response=False)
+            self.assertEqual(self.client.session['_auth_user_id'], str(self.bob.pk))
+            # The backend path stored in existing sessions stays valid
+            self.assertEqual(self.client.session['_auth_user_backend'], 'accounts.backends.ProfileBackend')
+            self.client.logout()
+
+    def test_email_wins_when_it_is_also_a_username(self):
+        from django.contrib.auth import authenticate
+        make_user('carol', User.Role.PATIENT, email='Bob@Example.org')
+        user = authenticate(username='bob@example.org', password='pass12345')
+        self.assertEqual(user.username, 'carol')
+        self.assertEqual(authenticate(username='someone@example.org', password='pass12345'), self.other)
+
+    def test_migration_finds_collisions_in_batches(self):
+        identity = import_module('accounts.migrations.0008_case_insensitive_identity')
+        Clinic.objects.bulk_create([Clinic(name=name) for name in ('North', 'central', 'Central', 'CENTRAL', 'east', 'East')])
+        self.assertEqual(identity.find_collisions(Clinic.objects.all(), 'name', batch_size=1), [('central', 3), ('east', 2)])
+        self.assertEqual(identity.find_collisions(User.objects.all(), 'email'), [])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RequestProfileTests(TestCase):
+    """request.profile is joined into the session user query."""
+
+    # Session SELECT and the joined user+profile+clinic SELECT
+    DASHBOARD_QUERY_BUDGET = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        clinic = Clinic.objects.create(name='Central')
+        cls.patient = make_user('patient', User.Role.PATIENT)
+        PatientProfile.objects.create(user=cls.patient)
+        cls.doctor = make_user('doctor', User.Role.DOCTOR)
+        DoctorProfile.objects.create(
+            user=cls.doctor, clinic=clinic, specialization='Cardiology',
+            qualification='MD', is_approved=True
+        )
+
+    def test_patient_dashboards(self):
+        self.client.force_login(self.patient)
+        for name in ('accounts:profile_redirect', 'accounts:patient_dashboard'):
+            with self.assertNumQueries(self.DASHBOARD_QUERY_BUDGET):
+                response = self.client.get(reverse(name))
+            self.assertTemplateUsed(response, 'accounts/patient_dashboard.html')
+
+    def test_doctor_dashboards(self):
+        self.client.force_login(self.doctor)
+        for name in ('accounts:profile_redirect', 'accounts:doctor_dashboard'):
+            with self.assertNumQueries(self.DASHBOARD_QUERY_BUDGET):
+                response = self.client.get(reverse(name))
+            self.assertContains(response, 'Central')
+
+    def test_missing_profile_redirects(self):
+        user = make_user('newdoc', User.Role.DOCTOR)
+        self.client.force_login(user)
+        response = self.client.get(reverse('accounts:doctor_dashboard'))
+        self.assertRedirects(response, reverse('accounts:create_doctor_profile'), fetch_redirect_response=False)
+
+
+class AccountStatusCacheTests(TestCase):
+    """Cached approval/active status and its invalidation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic = Clinic.objects.create(name='Central')
+        cls.doctor = make_user('doctor', User.Role.DOCTOR)
+        cls.profile = DoctorProfile.objects.create(
+            user=cls.doctor, clinic=cls.clinic, specialization='ENT', qualification='MD'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.doctor.pk)
+
+    def test_cached_status_costs_no_query(self):
+        get_account_status(self.fresh_user())
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            status = get_account_status(user)
+        self.assertTrue(status.has_profile)
+        self.assertFalse(status.is_approved)
+
+    def test_profile_save_invalidates(self):
+        self.assertFalse(get_account_status(self.fresh_user()).is_approved)
+        self.profile.is_approved = True
+        self.profile.save()
+        self.assertTrue(get_account_status(self.fresh_user()).is_approved)
+
+    def test_admin_bulk_actions_invalidate(self):
+        admin = site._registry[DoctorProfile]
+        request = RequestFactory().post('/')
+        queryset = DoctorProfile.objects.filter(pk=self.profile.pk)
+
+        self.assertFalse(get_account_status(self.fresh_user()).is_approved)
+        with mock.patch.object(admin, 'message_user'):
+            admin.approve_doctors(request, queryset)
+            self.assertTrue(get_account_status(self.fresh_user()).is_approved)
+            admin.reject_doctors(request, queryset)
+        self.assertFalse(get_account_status(self.fresh_user()).is_approved)
+
+
+FAST_SCRYPT = {'SCRYPT_WORK_FACTOR': 2 ** 10, 'SCRYPT_PARALLELISM': 1}
+
+
+@override_settings(
+    PASSWORD_HASHING=FAST_SCRYPT,
+    PASSWORD_HASHERS=[
+        'accounts.hashers.TunedScryptPasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ],
+)
+class PasswordHashingTests(TestCase):
+    """Single hash per signup, rehash-on-login and off-loop hashing."""
+
+    def test_register_hashes_once_and_logs_in(self):
+        with mock.patch.object(User, 'check_password') as check_password:
+            response = self.client.post(reverse('accounts:register'), {
+                'username': 'alice', 'email': 'alice@example.com', 'role': User.Role.PATIENT,
+                'password1': 'Str0ng-pass-phrase', 'password2': 'Str0ng-pass-phrase',
+            })
+        check_password.assert_not_called()
+        self.assertRedirects(response, reverse('accounts:create_patient_profile'), fetch_redirect_response=False)
+        self.assertEqual(str(User.objects.get(username='alice').pk), self.client.session['_auth_user_id'])
+
+    def test_legacy_hash_upgraded_on_login(self):
+        user = make_user('legacy', User.Role.ADMIN)
+        User.objects.filter(pk=user.pk).update(password=make_password('pass12345', hasher='md5'))
+        self.client.post(reverse('accounts:login'), {'username': 'legacy', 'password': 'pass12345'})
+        self.assertTrue(User.objects.get(pk=user.pk).password.startswith('scrypt$1024$'))
+
+    def test_cost_change_triggers_rehash(self):
+        user = make_user('tuned', User.Role.ADMIN)
+        with self.settings(PASSWORD_HASHING={**FAST_SCRYPT, 'SCRYPT_WORK_FACTOR': 2 ** 11}):
+            self.assertTrue(get_hasher('scrypt').must_update(user.password))
+
+    def test_run_hasher_with_bounded_executor(self):
+        with self.settings(PASSWORD_HASHING={**FAST_SCRYPT, 'EXECUTOR_WORKERS': 2}):
+            encoded = asyncio.run(run_hasher(make_password, 'secret'))
+            self.assertTrue(asyncio.run(run_hasher(check_password, 'secret', encoded)))
+
+
+class AsyncURLConf:
+    urlpatterns = [
+        path('admin/', django_admin.site.urls),
+        path('accounts/', include((build_urlpatterns(async_views), 'accounts'))),
+    ]
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, ROOT_URLCONF=AsyncURLConf)
+class AsyncViewTests(TestCase):
+    """The ASGI-native login and dashboard views."""
+
+    @classmethod
+    def setUpTestData(cls):
+        clinic = Clinic.objects.create(name='Central')
+        cls.patient = make_user('patient', User.Role.PATIENT)
+        PatientProfile.objects.create(user=cls.patient)
+        cls.doctor = make_user('doctor', User.Role.DOCTOR)
+        DoctorProfile.objects.create(
+            user=cls.doctor, clinic=clinic, specialization='Cardiology',
+            qualification='MD', is_approved=True
+        )
+        cls.pending = make_user('pending', User.Role.DOCTOR)
+        DoctorProfile.objects.create(user=cls.pending, specialization='ENT', qualification='MD')
+
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+
+    async def alogin_as(self, username):
+        return await self.async_client.post(reverse('accounts:login'), {
+            'username': username, 'password': 'pass12345'
+        })
+
+    async def test_login_then_dashboard(self):
+        response = await self.alogin_as('doctor')
+        self.assertRedirects(response, reverse('accounts:profile_redirect'), fetch_redirect_response=False)
+        response = await self.async_client.get(reverse('accounts:profile_redirect'))
+        self.assertContains(response, 'Central')
+        response = await self.async_client.get(reverse('accounts:doctor_dashboard'))
+        self.assertContains(response, 'Doctor Dashboard')
+
+    async def test_patient_dashboard(self):
+        await self.alogin_as('patient')
+        response = await self.async_client.get(reverse('accounts:patient_dashboard'))
+        self.assertTemplateUsed(response, 'accounts/patient_dashboard.html')
+        response = await self.async_client.get(reverse('accounts:doctor_dashboard'))
+        self.assertRedirects(response, reverse('accounts:profile_redirect'), fetch_redirect_response=False)
+
+    async def test_pending_doctor_rejected(self):
+        response = await self.alogin_as('pending')
+        self.assertContains(response, 'pending admin approval')
+
+    async def test_login_uses_cached_status(self):
+        await self.alogin_as('doctor')
+        self.assertEqual(await services.aget_account_status(self.doctor), (User.Role.DOCTOR, True, True, True))
+        await cache.aset(
+            services._status_key(self.doctor.pk),
+            services.AccountStatus(User.Role.DOCTOR, True, True, False),
+            version=services.STATUS_CACHE_VERSION,
+        )
+        await self.async_client.alogout()
+        response = await self.alogin_as('doctor')
+        self.assertContains(response, 'Your account has been deactivated.')
+
+    async def test_throttled_login(self):
+        with override_settings(LOGIN_THROTTLE={**settings.LOGIN_THROTTLE, 'USERNAME_LIMIT': 1}):
+            await self.async_client.post(reverse('accounts:login'), {'username': 'patient', 'password': 'wrong'})
+            response = await self.alogin_as('patient')
+        self.assertEqual(response.status_code, 429)
+
+    async def test_bad_password(self):
+        response = await self.async_client.post(reverse('accounts:login'), {
+            'username': 'patient', 'password': 'wrong'
+        })
+        self.assertContains(response, 'Invalid username or password.')
+
+    async def test_dashboard_requires_login(self):
+        response = await self.async_client.get(reverse('accounts:patient_dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+
+class DoctorDirectoryTests(TestCase):
+    """Public doctor directory: filters, keyset pagination, ETags and plans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.central = Clinic.objects.create(name='Central')
+        cls.north = Clinic.objects.create(name='North')
+        for i in range(5):
+            user = make_user(f'cardio{i}', User.Role.DOCTOR, first_name='Card', last_name=str(i))
+            DoctorProfile.objects.create(
+                user=user, clinic=cls.central, specialization='Cardiology',
+                qualification='MD', experience_years=i, is_approved=True
+            )
+        user = make_user('ent', User.Role.DOCTOR)
+        DoctorProfile.objects.create(
+            user=user, clinic=cls.north, specialization='ENT', qualification='MD', is_approved=True
+        )
+        user = make_user('unapproved', User.Role.DOCTOR)
+        DoctorProfile.objects.create(user=user, specialization='Cardiology', qualification='MD')
+
+    def get(self, **params):
+        return self.client.get(reverse('accounts:doctor_directory'), params)
+
+    def test_lists_only_approved_doctors(self):
+        with self.assertNumQueries(1):
+            data = self.get().json()
+        self.assertEqual(len(data['results']), 6)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_filters(self):
+        self.assertEqual(len(self.get(specialization='Cardiology').json()['results']), 5)
+        self.assertEqual(len(self.get(clinic=self.north.pk).json()['results']), 1)
+        self.assertEqual(len(self.get(specialization='Cardiology', min_experience=3).json()['results']), 2)
+
+    def test_keyset_pagination(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            data = self.get(**params).json()
+            seen += [doctor['id'] for doctor in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 6)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get(clinic='x').status_code, 400)
+        self.assertEqual(self.get(cursor='***').status_code, 400)
+        self.assertEqual(self.get(clinic='9' * 25).status_code, 400)
+        self.assertEqual(self.get(min_experience='-' + '9' * 25).status_code, 400)
+        self.assertEqual(self.get(cursor=base64.urlsafe_b64encode(b'9' * 25).decode()).status_code, 400)
+        response = self.client.get(reverse('accounts:first_available'), {'specialization': 'ENT', 'clinic': '9' * 25})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('accounts:doctor_slots', args=[int('9' * 25)])).status_code, 404)
+
+    def test_conditional_get(self):
+        response = self.get()
+        etag = response['ETag']
+        response = self.client.get(reverse('accounts:doctor_directory'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN output checked is SQLite-specific')
+    def test_query_plans_use_partial_indexes(self):
+        cases = {
+            'doctor_listed_spec_idx': directory_queryset(specialization='Cardiology'),
+            'doctor_listed_clinic_idx': directory_queryset(clinic_id=self.central.pk),
+            'doctor_listed_idx': directory_queryset().filter(id__gt=1),
+        }
+        for index, queryset in cases.items():
+            self.assertIn(index, queryset[:20].explain())
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'needs a full-text backend')
+class SearchTests(TestCase):
+    """Full-text search documents, matching and the admin integration."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic = Clinic.objects.create(name='Riverside Heart Centre', address='12 Mill Road')
+        cls.user = make_user('jdoe', User.Role.DOCTOR, first_name='Johanna', last_name='Doe')
+        cls.profile = DoctorProfile.objects.create(
+            user=cls.user, clinic=cls.clinic, specialization='Cardiology',
+            qualification='MD', is_approved=True
+        )
+
+    def doctors(self, query):
+        return search.search_ids(query, SearchDocument.Kind.DOCTOR)
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.doctors('cardio'), [self.profile.pk])
+        self.assertEqual(self.doctors('joh river'), [self.profile.pk])
+        self.assertEqual(self.doctors('dermatology'), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'spelling correction uses the FTS5 vocabulary')
+    def test_typo_tolerance(self):
+        self.assertEqual(self.doctors('cardiolgy'), [self.profile.pk])
+
+    def test_signals_keep_documents_in_sync(self):
+        self.user.last_name = 'Marlowe'
+        self.user.save()
+        self.assertEqual(self.doctors('marlowe'), [self.profile.pk])
+        self.clinic.name = 'Lakeside'
+        self.clinic.save()
+        self.assertEqual(self.doctors('lakeside'), [self.profile.pk])
+        self.profile.delete()
+        self.assertEqual(self.doctors('cardiology'), [])
+
+    def test_clinic_saves_reindex_only_on_searched_changes(self):
+        for i in range(5):
+            DoctorProfile.objects.create(
+                user=make_user(f'extra{i}', User.Role.DOCTOR), clinic=self.clinic,
+                specialization='ENT', qualification='MD',
+            )
+        # The UPDATE only
+        with self.assertNumQueries(1):
+            self.clinic.save(update_fields=['is_active'])
+        # The UPDATE and the comparison with the stored document
+        with self.assertNumQueries(2):
+            self.clinic.save()
+        # Savepoint, clinic upsert, doctors SELECT and upsert, release: whatever the doctor count
+        self.clinic.name = 'Lakeside'
+        with self.assertNumQueries(7):
+            self.clinic.save()
+        self.assertEqual(len(self.doctors('lakeside')), 6)
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        call_command('rebuildsearch', stdout=StringIO())
+        self.assertEqual(self.doctors('cardiology'), [self.profile.pk])
+        self.assertEqual(search.search_ids('mill', SearchDocument.Kind.CLINIC), [self.clinic.pk])
+
+    def test_search_endpoint(self):
+        data = self.client.get(reverse('accounts:search'), {'q': 'riverside'}).json()
+        self.assertEqual([doctor['id'] for doctor in data['doctors']], [self.profile.pk])
+        self.assertEqual([clinic['id'] for clinic in data['clinics']], [self.clinic.pk])
+
+    def test_admin_uses_index(self):
+        doctor_admin = site._registry[DoctorProfile]
+        queryset, may_have_duplicates = doctor_admin.get_search_results(
+            RequestFactory().get('/'), DoctorProfile.objects.all(), 'johanna'
+        )
+        self.assertEqual(list(queryset), [self.profile])
+        self.assertFalse(may_have_duplicates)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AdminChangelistTests(TestCase):
+    """Changelist query counts stay flat at 10k rows."""
+
+    ROWS = 10000
+    # Session, admin user, count, page rows, and the bounded clinic and
+    # distinct specialization filter choices. Pages showing all rows, or
+    # exactly those of a partial index (the default active ones), add one
+    # planner-statistics lookup for the estimate.
+    CHANGELIST_QUERY_BUDGET = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('root', User.Role.ADMIN, is_staff=True, is_superuser=True)
+        clinics = Clinic.objects.bulk_create([Clinic(name=f'Clinic {i:03}') for i in range(200)])
+        users = User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com', role=role)
+            for i in range(cls.ROWS)
+            for role in [User.Role.DOCTOR if i % 2 else User.Role.PATIENT]
+        ])
+        DoctorProfile.objects.bulk_create([
+            DoctorProfile(user=user, clinic=clinics[i % len(clinics)], specialization=f'Spec {i % 20}',
+                          qualification='MD', is_approved=bool(i % 3))
+            for i, user in enumerate(users) if user.role == User.Role.DOCTOR
+        ])
+        PatientProfile.objects.bulk_create([
+            PatientProfile(user=user) for user in users if user.role == User.Role.PATIENT
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_doctor_changelist_pages(self):
+        url = reverse('admin:accounts_doctorprofile_changelist')
+        for params, extra in (
+            ({}, 1), ({'p': 3}, 1), ({'status': 'all'}, 1), ({'is_approved__exact': 1}, 1),
+            ({'is_approved__exact': 0}, 0),
+        ):
+            with self.assertNumQueries(self.CHANGELIST_QUERY_BUDGET + extra):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+
+    def test_patient_changelist_pages(self):
+        url = reverse('admin:accounts_patientprofile_changelist')
+        for params in ({}, {'p': 5}):
+            with self.assertNumQueries(self.CHANGELIST_QUERY_BUDGET - 1):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+
+    def test_clinic_filter_is_bounded(self):
+        from .admin import CLINIC_FILTER_LIMIT
+        response = self.client.get(reverse('admin:accounts_doctorprofile_changelist'))
+        self.assertContains(response, 'clinic__id__exact=', count=CLINIC_FILTER_LIMIT)
+
+    def test_invalid_clinic_filter_redirects(self):
+        url = reverse('admin:accounts_doctorprofile_changelist')
+        response = self.client.get(url, {'clinic__id__exact': 'abc'})
+        self.assertRedirects(response, f'{url}?e=1', fetch_redirect_response=False)
+
+    @skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'needs planner statistics')
+    def test_paginator_uses_estimate_for_large_tables(self):
+        from .pagination import EstimatedCountPaginator
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        paginator = EstimatedCountPaginator(DoctorProfile.objects.order_by('pk'), 100)
+        with mock.patch('accounts.pagination.ESTIMATE_THRESHOLD', 1000), self.assertNumQueries(2 if connection.vendor == 'sqlite' else 1):
+            self.assertEqual(paginator.count, self.ROWS // 2)
+
+    def test_add_form_uses_autocomplete_widgets(self):
+        response = self.client.get(reverse('admin:accounts_doctorprofile_add'))
+        self.assertContains(response, 'data-field-name="user"')
+        self.assertContains(response, 'data-field-name="clinic"')
+
+
+class BulkApprovalTests(TestCase):
+    """Partitioned, chunked approval and its front ends."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic = Clinic.objects.create(name='Central')
+        cls.other = Clinic.objects.create(name='North')
+        cls.with_clinic = []
+        cls.without_clinic = []
+        for i in range(6):
+            user = make_user(f'doc{i}', User.Role.DOCTOR)
+            profile = DoctorProfile.objects.create(
+                user=user, clinic=cls.clinic if i < 4 else None,
+                specialization='ENT', qualification='MD'
+            )
+            (cls.with_clinic if i < 4 else cls.without_clinic).append(profile.pk)
+
+    def setUp(self):
+        cache.clear()
+
+    def approved_ids(self):
+        return set(DoctorProfile.objects.filter(is_approved=True).values_list('pk', flat=True))
+
+    def test_partition_and_chunked_approval(self):
+        received = []
+        handler = lambda sender, **kwargs: received.append(kwargs['doctor_ids'])
+        approvals.doctors_approved.connect(handler)
+        self.addCleanup(approvals.doctors_approved.disconnect, handler)
+
+        result = approvals.approve(DoctorProfile.objects.all(), chunk_size=3)
+        self.assertEqual(result.approved, self.with_clinic)
+        self.assertEqual(result.blocked, self.without_clinic)
+        self.assertEqual(self.approved_ids(), set(self.with_clinic))
+        # One event for the whole run, not one per chunk
+        self.assertEqual(received, [self.with_clinic])
+
+    def test_approval_refreshes_status_cache(self):
+        user = User.objects.get(doctor_profile__pk=self.with_clinic[0])
+        self.assertFalse(get_account_status(user).is_approved)
+        approvals.approve(DoctorProfile.objects.filter(pk=self.with_clinic[0]))
+        self.assertTrue(get_account_status(User.objects.get(pk=user.pk)).is_approved)
+
+    def test_single_target_clinic(self):
+        result = approvals.approve(DoctorProfile.objects.all(), clinic=self.other)
+        self.assertEqual(result.blocked, [])
+        self.assertEqual(
+            set(DoctorProfile.objects.filter(clinic=self.other).values_list('pk', flat=True)),
+            set(self.without_clinic),
+        )
+
+    def test_command_with_csv_mapping(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as csv_file:
+            csv_file.write(f'doctor_id,clinic_id\n{self.without_clinic[0]},{self.other.pk}\n')
+            csv_file.flush()
+            out = StringIO()
+            call_command('approvedoctors', '--clinic-csv', csv_file.name, '--chunk-size', '2', stdout=out)
+        self.assertIn('Approved 5 doctor(s).', out.getvalue())
+        self.assertIn('1 doctor(s) have no clinic', out.getvalue())
+
+    @override_settings(AUDIT={**settings.AUDIT, 'ENABLED': True})
+    def test_approving_twice_audits_and_emails_once(self):
+        self.addCleanup(audit.flush)
+        doctors = DoctorProfile.objects.filter(pk=self.with_clinic[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            approvals.approve(doctors)
+            again = approvals.approve(doctors)
+        audit.flush()
+        self.assertEqual((again.approved, again.already_approved), ([], [self.with_clinic[0]]))
+        self.assertEqual(Job.objects.filter(kind=notifications.DOCTOR_APPROVED).count(), 1)
+        self.assertEqual(AuditEvent.objects.filter(action=AuditEvent.Action.APPROVE).count(), 1)
+
+    def test_clinic_mapping_is_limited_to_the_selection(self):
+        mapping = {self.without_clinic[0]: self.other.pk, self.without_clinic[1]: self.other.pk}
+        result = approvals.approve(DoctorProfile.objects.filter(pk=self.without_clinic[0]), clinic_mapping=mapping)
+        self.assertEqual(result.approved, [self.without_clinic[0]])
+        self.assertIsNone(DoctorProfile.objects.get(pk=self.without_clinic[1]).clinic_id)
+        # The search documents carry the new clinic name
+        body = SearchDocument.objects.get(kind=SearchDocument.Kind.DOCTOR, object_id=self.without_clinic[0]).body
+        self.assertIn('North', body)
+
+    def test_unknown_clinics_fail_before_any_update(self):
+        mapping = {self.without_clinic[0]: self.other.pk, self.without_clinic[1]: 999}
+        with self.assertRaises(approvals.UnknownClinics):
+            approvals.approve(DoctorProfile.objects.all(), clinic_mapping=mapping)
+        self.assertFalse(DoctorProfile.objects.filter(clinic=self.other).exists())
+        self.assertEqual(self.approved_ids(), set())
+
+    def test_admin_action_approves_partial_selection(self):
+        doctor_admin = site._registry[DoctorProfile]
+        with mock.patch.object(doctor_admin, 'message_user') as message_user:
+            doctor_admin.approve_doctors(RequestFactory().post('/'), DoctorProfile.objects.all())
+        self.assertEqual(self.approved_ids(), set(self.with_clinic))
+        self.assertEqual(message_user.call_count, 2)
+
+
+class RosterExportTests(TestCase):
+    """Streaming CSV/NDJSON export with gzip and resumable cursors."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic = Clinic.objects.create(name='Central')
+        cls.profiles = []
+        for i in range(5):
+            user = make_user(f'pat{i}', User.Role.PATIENT, first_name=f'P{i}')
+            cls.profiles.append(PatientProfile.objects.create(user=user))
+
+    def read(self, *args, **kwargs):
+        return b''.join(export.stream_roster(*args, **kwargs))
+
+    def test_csv_roster(self):
+        rows = list(csv.reader(self.read('patients', chunk_size=2).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'user__username', 'user__email'])
+        self.assertEqual([row[1] for row in rows[1:]], [f'pat{i}' for i in range(5)])
+
+    def test_ndjson_resumes_after_cursor(self):
+        lines = self.read('patients', 'ndjson', after=self.profiles[2].pk).decode().splitlines()
+        self.assertEqual([json.loads(line)['user__username'] for line in lines], ['pat3', 'pat4'])
+
+    def test_gzip(self):
+        data = gzip.decompress(self.read('clinics', gzip=True)).decode()
+        self.assertIn('Central', data)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f'{tmp}/patients.ndjson.gz'
+            call_command('exportroster', 'patients', '--format', 'ndjson', '--gzip', '--output', path)
+            with gzip.open(path, 'rt') as file:
+                self.assertEqual(len(file.readlines()), 5)
+        with self.assertRaisesMessage(CommandError, '--gzip needs --output.'):
+            call_command('exportroster', 'patients', '--gzip', stdout=StringIO())
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_admin_action_streams_selection(self):
+        admin_user = make_user('root', User.Role.ADMIN, is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:accounts_patientprofile_changelist'), {
+            'action': 'export_csv', '_selected_action': [self.profiles[0].pk, self.profiles[1].pk],
+        })
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(body.splitlines()), 3)
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_admin_action_streams_asynchronously_under_asgi(self):
+        self.async_client.force_login(make_user('root', User.Role.ADMIN, is_staff=True, is_superuser=True))
+
+        async def export_selection():
+            response = await self.async_client.post(reverse('admin:accounts_patientprofile_changelist'), {
+                'action': 'export_csv', '_selected_action': [profile.pk for profile in self.profiles],
+            })
+            # A sync iterator would be read whole into memory under ASGI
+            self.assertTrue(response.is_async)
+            return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertEqual(len(async_to_sync(export_selection)().splitlines()), 6)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class BulkImportTests(TestCase):
+    """Batched import with per-row error reporting."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic = Clinic.objects.create(name='Central')
+        make_user('taken', User.Role.PATIENT)
+
+    def rows(self, *dicts):
+        return list(bulkimport.read_rows(StringIO('\n'.join(json.dumps(d) for d in dicts)), 'ndjson'))
+
+    def test_batch_import_reports_bad_rows(self):
+        rows = self.rows(
+            {'username': 'p1', 'email': 'p1@example.com', 'role': 'patient', 'password': 'secret', 'gender': 'F'},
+            {'username': 'd1', 'email': 'd1@example.com', 'role': 'DOCTOR', 'specialization': 'ENT',
+             'qualification': 'MD', 'clinic_id': self.clinic.pk},
+            {'username': 'Taken', 'email': 'new@example.com', 'role': 'PATIENT'},
+            {'username': 'p2', 'email': 'P1@example.com', 'role': 'PATIENT'},
+            {'username': 'p3', 'email': 'not-an-email', 'role': 'PATIENT'},
+            {'username': 'd2', 'email': 'd2@example.com', 'role': 'DOCTOR', 'specialization': 'ENT',
+             'qualification': 'MD', 'clinic_id': 999},
+        )
+        with bulkimport.Importer(batch_size=4) as importer:
+            report = importer.run(rows)
+        self.assertEqual(report.created, 2)
+        self.assertEqual([line for line, _ in report.errors], [3, 4, 5, 6])
+        self.assertTrue(User.objects.get(username='p1').check_password('secret'))
+        self.assertEqual(PatientProfile.objects.get(user__username='p1').gender, 'F')
+        self.assertEqual(DoctorProfile.objects.get(user__username='d1').clinic, self.clinic)
+
+    def test_rows_are_validated_like_the_model_fields(self):
+        rows = self.rows(
+            {'username': 'u' * 200, 'email': 'long@example.com', 'role': 'PATIENT'},
+            {'username': 'bad user!', 'email': 'bad@example.com', 'role': 'PATIENT'},
+            {'username': 'phone', 'email': 'phone@example.com', 'role': 'PATIENT', 'phone_number': '5' * 50},
+            {'username': 'number', 'email': 123, 'role': 'PATIENT'},
+            {'username': 'nested', 'email': 'nested@example.com', 'role': 'PATIENT', 'address': {'city': 'X'}},
+            {'username': 'born', 'email': 'born@example.com', 'role': 'PATIENT', 'date_of_birth': '1990-02-30'},
+            {'username': 'ok', 'email': 'ok@example.com', 'role': 'PATIENT', 'date_of_birth': '1990-02-03'},
+        )
+        with bulkimport.Importer() as importer:
+            report = importer.run(rows)
+        self.assertEqual(report.created, 1)
+        self.assertEqual([message.split()[0] for _, message in report.errors],
+                         ['username:', 'username:', 'phone_number:', 'email:', 'address', 'date_of_birth:'])
+        self.assertEqual(PatientProfile.objects.get(user__username='ok').date_of_birth, date(1990, 2, 3))
+
+    def test_uniqueness_is_one_query_per_batch(self):
+        rows = self.rows(*[
+            {'username': f'u{i}', 'email': f'u{i}@example.com', 'role': 'PATIENT'} for i in range(50)
+        ])
+        # Uniqueness SELECT, then the user and profile INSERTs in a savepoint
+        with self.assertNumQueries(5), bulkimport.Importer(invite=True) as importer:
+            report = importer.run(rows)
+        self.assertEqual(report.created, 50)
+        self.assertFalse(User.objects.get(username='u0').has_usable_password())
+
+    def test_command_with_process_pool(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write('username,email,role,password\n')
+            file.write('c1,c1@example.com,PATIENT,pw-one\nc2,c2@example.com,PATIENT,pw-two\n')
+            file.flush()
+            out = StringIO()
+            call_command('bulkimport', file.name, '--hash-workers', '2', stdout=out)
+        self.assertIn('Imported 2 account(s), 0 error(s)', out.getvalue())
+        self.assertTrue(User.objects.get(username='c2').check_password('pw-two'))
+
+
+class SessionTests(TestCase):
+    """Session strategies and the batched purge."""
+
+    def test_purgesessions_deletes_expired_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'old{i}', session_data='', expire_date=now - timedelta(days=1)) for i in range(25)]
+            + [Session(session_key='live', session_data='', expire_date=now + timedelta(days=1))]
+        )
+        out = StringIO()
+        call_command('purgesessions', '--batch-size', '10', stdout=out)
+        self.assertIn('Deleted 25 expired session(s) in 3 batch(es).', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+    def test_shared_session_caches_from_urls(self):
+        self.assertEqual(caches_config.shared_cache('redis://cache:6379/1'), {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/1',
+        })
+        self.assertEqual(caches_config.shared_cache('memcached://a:11211,b:11211')['LOCATION'], ['a:11211', 'b:11211'])
+        self.assertIsNone(caches_config.shared_cache(''))
+        with self.assertRaises(ImproperlyConfigured):
+            caches_config.shared_cache('locmem://')
+
+    @override_settings(
+        PASSWORD_HASHERS=FAST_HASHERS,
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+    )
+    def test_signed_cookie_sessions_need_no_session_table(self):
+        user = make_user('patient', User.Role.PATIENT)
+        PatientProfile.objects.create(user=user)
+        self.client.post(reverse('accounts:login'), {'username': 'patient', 'password': 'pass12345'})
+        self.assertFalse(Session.objects.exists())
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('accounts:patient_dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+
+class DatabaseProfileTests(TestCase):
+    """CURENET_DB profiles and the SQLite connection tuning."""
+
+    def test_sqlite_needs_a_path_or_base_dir(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'CURENET_SQLITE_PATH'):
+            database.sqlite_database({})
+        self.assertEqual(database.sqlite_database({}, Path('/srv/curenet'))['NAME'], Path('/srv/curenet/db.sqlite3'))
+
+    def test_sqlite_file_connections_are_tuned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = database.sqlite_database({'CURENET_SQLITE_PATH': os.path.join(directory, 'tuned.sqlite3')})
+            handler = ConnectionHandler({'default': config})
+            tuned = handler['default']
+            try:
+                with tuned.cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+            finally:
+                tuned.close()
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'mmap_size': 256 * 1024 * 1024,
+        })
+
+    def test_postgresql_profile_persists_connections_by_default(self):
+        config = database.databases({'CURENET_DB': 'postgresql', 'CURENET_PG_HOST': 'db'}, None)['default']
+        self.assertEqual(config['HOST'], 'db')
+        self.assertEqual(config['CONN_MAX_AGE'], 600)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', config['OPTIONS'])
+
+    def test_postgresql_pool_disables_persistent_connections(self):
+        config = database.postgresql_database({'CURENET_PG_POOL_MAX_SIZE': '20', 'CURENET_PG_POOL_MIN_SIZE': '4'})
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 4, 'max_size': 20, 'timeout': 10})
+
+    def test_replicas_mirror_the_primary_in_tests(self):
+        config = database.databases({'CURENET_DB': 'postgresql', 'CURENET_DB_REPLICAS': 'r1, r2:6432'}, None)
+        self.assertEqual(list(config), ['default', 'replica_1', 'replica_2'])
+        self.assertEqual((config['replica_2']['HOST'], config['replica_2']['PORT']), ('r2', '6432'))
+        self.assertEqual(config['replica_1']['PORT'], '5432')
+        self.assertEqual(config['replica_1']['TEST'], {'MIRROR': 'default'})
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaises(ValueError):
+            database.databases({'CURENET_DB': 'oracle'}, None)
+
+    @skipUnless(os.environ.get('CURENET_PG_NAME'), 'set CURENET_PG_* to test against a local PostgreSQL')
+    def test_postgresql_pool_serves_queries(self):
+        environ = {**os.environ, 'CURENET_PG_POOL_MAX_SIZE': os.environ.get('CURENET_PG_POOL_MAX_SIZE', '4')}
+        handler = ConnectionHandler({'default': database.postgresql_database(environ)})
+        pooled = handler['default']
+        try:
+            with pooled.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                self.assertEqual(cursor.fetchone()[0], 1)
+            self.assertIsNotNone(pooled.pool)
+        finally:
+            pooled.close_pool()
+
+
+class ReplicaRoutingTests(unittest.TestCase):
+    """
+    Reads from a replica SQLite file, writes and pinned reads from the
+    primary. A plain TestCase, since Django's test cases refuse
+    connections to aliases registered after the test databases are set up.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        replica = database.sqlite_database({'CURENET_SQLITE_PATH': os.path.join(cls.directory.name, 'replica.sqlite3')})
+        connections.settings['replica_test'] = connections.configure_settings(
+            {'default': connections.settings['default'], 'replica_test': replica}
+        )['replica_test']
+        with connections['replica_test'].schema_editor() as editor:
+            for model in (User, Clinic, PatientProfile, DoctorProfile, SearchDocument):
+                editor.create_model(model)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica_test'].close()
+        del connections['replica_test']
+        del connections.settings['replica_test']
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.settings = override_settings(DATABASE_REPLICAS=['replica_test'])
+        self.settings.enable()
+        self.atomic = transaction.atomic()
+        self.atomic.__enter__()
+
+    def tearDown(self):
+        transaction.set_rollback(True)
+        self.atomic.__exit__(None, None, None)
+        self.settings.disable()
+
+    def _visible(self):
+        return Clinic.objects.filter(name='Fresh').exists()
+
+    def test_reads_use_replica_and_writes_use_primary(self):
+        clinic = Clinic.objects.create(name='Fresh')
+        self.assertEqual(clinic._state.db, 'default')
+        self.assertFalse(self._visible())
+        with routers.primary():
+            self.assertTrue(self._visible())
+
+    def test_request_that_writes_reads_its_writes_and_sets_pin_cookie(self):
+        def view(request):
+            Clinic.objects.create(name='Fresh')
+            return HttpResponse(str(self._visible()))
+
+        response = PrimaryPinningMiddleware(view)(self.factory.post('/'))
+        self.assertEqual(response.content, b'True')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+    def test_pin_cookie_keeps_reads_on_primary(self):
+        Clinic.objects.create(name='Fresh')
+        middleware = PrimaryPinningMiddleware(lambda request: HttpResponse(str(self._visible())))
+
+        self.assertEqual(middleware(self.factory.get('/')).content, b'False')
+        pinned = self.factory.get('/')
+        pinned.COOKIES[PIN_COOKIE] = '1'
+        response = middleware(pinned)
+        self.assertEqual(response.content, b'True')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class InstrumentationTests(TestCase):
+    """Per-view metrics, Server-Timing and query budgets."""
+
+    def setUp(self):
+        instrumentation.registry.clear()
+        self.user = make_user('patient', User.Role.PATIENT)
+        PatientProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def test_request_is_recorded_under_its_url_name(self):
+        response = self.client.get(reverse('accounts:patient_dashboard'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="2 queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        metrics = instrumentation.registry.get('accounts:patient_dashboard')
+        self.assertEqual((metrics.requests, metrics.queries), (1, 2))
+        self.assertGreater(metrics.template_time, 0)
+        self.assertEqual(metrics.response_bytes, len(response.content))
+
+    def test_metrics_endpoint_serves_prometheus_text(self):
+        self.client.get(reverse('accounts:patient_dashboard'))
+        response = self.client.get(reverse('accounts:metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('curenet_view_duration_seconds_count{view="accounts:patient_dashboard"} 1', body)
+        self.assertIn('curenet_view_db_queries_total{view="accounts:patient_dashboard"} 2', body)
+
+    def test_metrics_endpoint_is_internal(self):
+        response = self.client.get(reverse('accounts:metrics'), REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(VIEW_QUERY_BUDGETS={'accounts:patient_dashboard': 0})
+    def test_over_budget_view_raises_under_tests(self):
+        with self.assertRaisesMessage(instrumentation.QueryBudgetExceeded, 'over its budget of 0'):
+            self.client.get(reverse('accounts:patient_dashboard'))
+
+    @override_settings(VIEW_QUERY_BUDGETS={'accounts:patient_dashboard': 0}, QUERY_BUDGET_ACTION='log')
+    def test_over_budget_view_is_logged_otherwise(self):
+        with self.assertLogs('accounts.instrumentation', 'WARNING'):
+            response = self.client.get(reverse('accounts:patient_dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class TemplateCachingTests(TestCase):
+    """Fragment caching by role and the hashed, compressed static files."""
+
+    def setUp(self):
+        caches['template_fragments'].clear()
+
+    def _dashboard(self, username, role):
+        user = make_user(username, role)
+        if role == User.Role.PATIENT:
+            PatientProfile.objects.create(user=user)
+        else:
+            DoctorProfile.objects.create(
+                user=user, specialization='Cardiology', qualification='MD',
+                clinic=Clinic.objects.create(name='Central'), is_approved=True,
+            )
+        self.client.force_login(user)
+        return self.client.get(reverse('accounts:profile_redirect'))
+
+    def test_card_grids_are_cached_per_role(self):
+        self.assertContains(self._dashboard('patient', User.Role.PATIENT), 'Access your medical history')
+        self.assertContains(self._dashboard('other', User.Role.PATIENT), 'Access your medical history')
+        response = self._dashboard('doctor', User.Role.DOCTOR)
+        self.assertContains(response, 'Access patient records')
+        self.assertNotContains(response, 'Access your medical history')
+        # The user-specific parts stay live
+        self.assertContains(response, 'doctor (Doctor)')
+
+    def test_collectstatic_writes_hashed_and_gzipped_files(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(
+            STATIC_ROOT=root,
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'accounts.storage.CompressedManifestStaticFilesStorage',
+            }},
+        ):
+            call_command('collectstatic', '--noinput', verbosity=0)
+            with open(os.path.join(root, 'staticfiles.json')) as file:
+                hashed = json.load(file)['paths']['css/curenet.css']
+            self.assertRegex(hashed, r'^css/curenet\.[0-9a-f]{12}\.css$')
+            with open(os.path.join(root, hashed), 'rb') as original, gzip.open(os.path.join(root, hashed + '.gz')) as compressed:
+                self.assertEqual(compressed.read(), original.read())
+
+
+# A Monday, far enough ahead for every test slot to be in the future
+SCHEDULE_DAY = date(2099, 1, 5)
+
+
+def make_doctor_with_hours(username, start=time(9), end=time(12), slot_minutes=30, **profile):
+    doctor = DoctorProfile.objects.create(
+        user=make_user(username, User.Role.DOCTOR), specialization=profile.pop('specialization', 'Cardiology'),
+        qualification='MD', clinic=profile.pop('clinic', None) or Clinic.objects.create(name=f'{username} clinic'),
+        is_approved=profile.pop('is_approved', True), **profile,
+    )
+    AvailabilityRule.objects.create(
+        doctor=doctor, weekday=SCHEDULE_DAY.weekday(), start_time=start, end_time=end, slot_minutes=slot_minutes,
+    )
+    return doctor
+
+
+def at(hour, minute=0, day=SCHEDULE_DAY):
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AppointmentTests(TestCase):
+    """Slot materialization, booking and the slot/booking API."""
+
+    def setUp(self):
+        self.doctor = make_doctor_with_hours('doctor')
+        self.patient = PatientProfile.objects.create(user=make_user('patient', User.Role.PATIENT))
+
+    def test_materialize_follows_rules_and_is_idempotent(self):
+        doctors = DoctorProfile.objects.all()
+        appointments.materialize(doctors, SCHEDULE_DAY, days=7)
+        appointments.materialize(doctors, SCHEDULE_DAY, days=7)
+        # Saving the rule already materialized the next HORIZON_DAYS
+        starts = list(Slot.objects.filter(start__gte=at(0)).order_by('start').values_list('start', flat=True))
+        self.assertEqual(starts, [at(9), at(9, 30), at(10), at(10, 30), at(11), at(11, 30)])
+        self.assertTrue(all(slot.clinic_id == self.doctor.clinic_id for slot in Slot.objects.all()))
+
+    def test_rule_edits_rebuild_free_slots_and_the_index(self):
+        appointments.materialize(DoctorProfile.objects.all(), SCHEDULE_DAY, days=1)
+        appointment = appointments.book(self.patient, self.doctor.pk, at(10))
+        rule = self.doctor.availability_rules.get()
+        rule.start_time, rule.end_time = time(14), time(15)
+        rule.save()
+        day = Slot.objects.filter(doctor=self.doctor, start__gte=at(0), start__lt=at(0) + timedelta(days=1))
+        self.assertEqual(sorted(day.values_list('start', flat=True)), [at(10), at(14), at(14, 30)])
+        self.assertEqual(Slot.objects.get(start=at(10)).pk, appointment.slot_id)
+        row = self.doctor.availability_days.get(day=SCHEDULE_DAY)
+        self.assertEqual(availability.set_bits(availability.decode(row.bitmap)), [168, 174])
+
+        rule.delete()
+        self.assertEqual(list(day.values_list('start', flat=True)), [at(10)])
+        self.assertEqual(self.doctor.availability_days.get(day=SCHEDULE_DAY).free_slots, 0)
+
+    def test_booking_claims_slot_once_and_cancel_frees_it(self):
+        appointments.materialize(DoctorProfile.objects.all(), SCHEDULE_DAY, days=1)
+        appointment = appointments.book(self.patient, self.doctor.pk, at(10))
+        with self.assertRaises(appointments.SlotUnavailable):
+            appointments.book(self.patient, self.doctor.pk, at(10))
+        with self.assertRaises(appointments.SlotUnavailable):
+            appointments.book(self.patient, self.doctor.pk, at(10, 15))
+        free = appointments.free_slots([self.doctor.pk], after=at(0), limit=2)
+        self.assertEqual([slot.start for slot in free], [at(9), at(9, 30)])
+
+        self.assertTrue(appointments.cancel(appointment))
+        self.assertFalse(appointments.cancel(appointment))
+        rebooked = appointments.book(self.patient, self.doctor.pk, at(10))
+        self.assertEqual(Appointment.objects.filter(start=at(10)).count(), 2)
+        self.assertEqual(rebooked.status, Appointment.Status.BOOKED)
+
+    def test_slot_and_booking_endpoints(self):
+        appointments.materialize(DoctorProfile.objects.all(), SCHEDULE_DAY, days=1)
+        slots_url = reverse('accounts:doctor_slots', args=[self.doctor.pk])
+        response = self.client.get(slots_url, {'after': at(11).isoformat()})
+        self.assertEqual([slot['start'] for slot in response.json()['results']], [at(11).isoformat(), at(11, 30).isoformat()])
+
+        book_url = reverse('accounts:book_appointment', args=[self.doctor.pk])
+        self.client.force_login(self.patient.user)
+        self.assertEqual(self.client.post(book_url, {'start': at(11).isoformat()}).status_code, 201)
+        self.assertEqual(self.client.post(book_url, {'start': at(11).isoformat()}).status_code, 409)
+        self.assertEqual(self.client.post(book_url, {'start': 'soon'}).status_code, 400)
+        response = self.client.get(slots_url, {'after': at(11).isoformat()})
+        self.assertEqual(len(response.json()['results']), 1)
+
+        self.client.force_login(self.doctor.user)
+        self.assertEqual(self.client.post(book_url, {'start': at(11, 30).isoformat()}).status_code, 403)
+
+    def test_booking_needs_a_patient_profile(self):
+        appointments.materialize(DoctorProfile.objects.all(), SCHEDULE_DAY, days=1)
+        self.client.force_login(make_user('newcomer', User.Role.PATIENT))
+        response = self.client.post(reverse('accounts:book_appointment', args=[self.doctor.pk]),
+                                    {'start': at(11).isoformat()})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_unlisted_doctors_take_no_bookings(self):
+        appointments.materialize(DoctorProfile.objects.all(), SCHEDULE_DAY, days=1)
+        DoctorProfile.objects.filter(pk=self.doctor.pk).update(is_approved=False)
+        self.client.force_login(self.patient.user)
+        response = self.client.post(reverse('accounts:book_appointment', args=[self.doctor.pk]),
+                                    {'start': at(11).isoformat()})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Slot.objects.filter(is_booked=True).exists())
+
+    def test_past_slots_cannot_be_booked(self):
+        past = timezone.now().date() - timedelta(days=7)
+        past -= timedelta(days=(past.weekday() - SCHEDULE_DAY.weekday()) % 7)
+        appointments.materialize(DoctorProfile.objects.all(), past, days=1)
+        self.client.force_login(self.patient.user)
+        response = self.client.post(reverse('accounts:book_appointment', args=[self.doctor.pk]),
+                                    {'start': at(11, day=past).isoformat()})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Slot.objects.filter(is_booked=True).exists())
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Many threads competing for few slots never double-book one."""
+    WORKERS = 8
+    ATTEMPTS = 400
+
+    def test_no_double_bookings_under_contention(self):
+        # Seeding commits for real; leave nothing in the audit buffer
+        with override_settings(PASSWORD_HASHERS=FAST_HASHERS, AUDIT={**settings.AUDIT, 'ENABLED': False}):
+            doctor = make_doctor_with_hours('doctor', start=time(8), end=time(18), slot_minutes=15)
+            patients = [PatientProfile.objects.create(user=make_user(f'p{i}', User.Role.PATIENT)) for i in range(20)]
+        appointments.materialize(DoctorProfile.objects.all(), SCHEDULE_DAY, days=1)
+        # Only the scheduled day; saving the rule also filled the next days
+        starts = list(Slot.objects.filter(start__gte=at(0)).values_list('start', flat=True))
+
+        def attempt(i):
+            try:
+                appointments.book(patients[i % len(patients)], doctor.pk, starts[(i * 7) % len(starts)])
+                return True
+            except (appointments.SlotUnavailable, OperationalError):
+                return False
+            finally:
+                connection.close()
+
+        # Index refreshes that lose every lock retry are logged, not raised
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool, mock.patch('accounts.signals.logger'):
+            successes = sum(pool.map(attempt, range(self.ATTEMPTS)))
+
+        booked = Appointment.objects.filter(status=Appointment.Status.BOOKED)
+        self.assertEqual(successes, booked.count())
+        self.assertEqual(booked.values('start').distinct().count(), booked.count())
+        self.assertEqual(Slot.objects.filter(is_booked=True).count(), booked.count())
+        self.assertEqual(booked.count(), len(starts))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AvailabilityIndexTests(TestCase):
+    """The per-day free-slot bitmaps and the cross-doctor query."""
+
+    def setUp(self):
+        clinic = Clinic.objects.create(name='Central')
+        self.early = make_doctor_with_hours('early', start=time(8), end=time(9), clinic=clinic)
+        self.late = make_doctor_with_hours('late', start=time(10), end=time(11), clinic=clinic)
+        make_doctor_with_hours('skin', start=time(7), end=time(8), specialization='Dermatology')
+        make_doctor_with_hours('pending', start=time(6), end=time(7), is_approved=False)
+        appointments.materialize(DoctorProfile.objects.all(), SCHEDULE_DAY, days=1)
+        self.patient = PatientProfile.objects.create(user=make_user('patient', User.Role.PATIENT))
+
+    def test_bitmaps_mirror_free_slots(self):
+        row = self.early.availability_days.get(day=SCHEDULE_DAY)
+        self.assertEqual(availability.set_bits(availability.decode(row.bitmap)), [96, 102])
+        self.assertEqual(row.free_slots, 2)
+
+    def test_first_available_scans_listed_doctors_of_the_specialization(self):
+        with self.assertNumQueries(1):
+            found = availability.first_available('Cardiology', after=at(0), limit=3)
+        self.assertEqual(found, [(at(8), self.early.pk), (at(8, 30), self.early.pk), (at(10), self.late.pk)])
+        self.assertEqual(availability.first_available('Cardiology', after=at(8, 1), limit=1), [(at(8, 30), self.early.pk)])
+        self.assertEqual(availability.first_available('Cardiology', after=at(0), days=0), [])
+
+    def test_bookings_and_cancellations_update_the_index(self):
+        booked = appointments.book(self.patient, self.early.pk, at(8))
+        appointments.book(self.patient, self.early.pk, at(8, 30))
+        self.assertEqual(availability.first_available('Cardiology', after=at(0), limit=1), [(at(10), self.late.pk)])
+        appointments.cancel(booked)
+        self.assertEqual(availability.first_available('Cardiology', after=at(0), limit=1), [(at(8), self.early.pk)])
+
+    def test_first_available_endpoint(self):
+        response = self.client.get(reverse('accounts:first_available'), {
+            'specialization': 'Cardiology', 'after': at(9).isoformat(), 'limit': 1,
+        })
+        [result] = response.json()['results']
+        self.assertEqual((result['start'], result['doctor']['id']), (at(10).isoformat(), self.late.pk))
+        self.assertEqual(self.client.get(reverse('accounts:first_available')).status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class MedicalRecordTests(TestCase):
+    """Deduplicated record storage, access control and ranged downloads."""
+    CONTENT = bytes(range(256)) * 64
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.settings_override = override_settings(MEDICAL_RECORDS_ROOT=root.name, MEDICAL_RECORD_MAX_BYTES=64 * 1024)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.root = root.name
+        self.patient = PatientProfile.objects.create(user=make_user('patient', User.Role.PATIENT))
+        self.doctor = make_doctor_with_hours('doctor')
+
+    def _upload(self, content=CONTENT, name='scan.pdf', **data):
+        return self.client.post(reverse('accounts:upload_medical_record'), {
+            'file': SimpleUploadedFile(name, content, content_type='application/pdf'), **data,
+        })
+
+    def _stored_files(self):
+        return sorted(name for _, _, names in os.walk(self.root) for name in names)
+
+    def test_uploads_are_deduplicated_by_content(self):
+        self.client.force_login(self.patient.user)
+        first = self._upload(title='MRI').json()
+        second = self._upload(name='copy.pdf').json()
+        self.assertEqual(first['sha256'], second['sha256'])
+        self.assertEqual(RecordBlob.objects.count(), 1)
+        self.assertEqual(MedicalRecord.objects.count(), 2)
+        # One blob and no leftover temporary files
+        self.assertEqual(self._stored_files(), [first['sha256']])
+        with open(records.blob_path(first['sha256']), 'rb') as file:
+            self.assertEqual(file.read(), self.CONTENT)
+
+        listed = self.client.get(reverse('accounts:medical_records')).json()['results']
+        self.assertEqual([record['title'] for record in listed], ['copy.pdf', 'MRI'])
+
+    def test_oversized_upload_is_rejected_without_leftovers(self):
+        self.client.force_login(self.patient.user)
+        self.assertEqual(self._upload(content=b'x' * (64 * 1024 + 1)).status_code, 413)
+        self.assertEqual(self._stored_files(), [])
+        self.assertFalse(MedicalRecord.objects.exists())
+
+    def test_only_the_patient_and_their_doctors_have_access(self):
+        record = records.store_file(BytesIO(self.CONTENT), self.patient, 'Scan', 'scan.pdf')
+        download_url = reverse('accounts:download_medical_record', args=[record.pk])
+        self.client.force_login(self.doctor.user)
+        self.assertEqual(self.client.get(download_url).status_code, 404)
+        self.assertEqual(self._upload(patient=self.patient.pk).status_code, 404)
+
+        appointments.materialize(DoctorProfile.objects.all(), SCHEDULE_DAY, days=1)
+        appointments.book(self.patient, self.doctor.pk, at(9))
+        self.assertEqual(self.client.get(download_url).status_code, 200)
+        self.assertEqual(self._upload(patient=self.patient.pk, title='Report').status_code, 201)
+        self.assertEqual(MedicalRecord.objects.get(title='Report').doctor, self.doctor)
+
+        other = PatientProfile.objects.create(user=make_user('other', User.Role.PATIENT))
+        self.client.force_login(other.user)
+        self.assertEqual(self.client.get(download_url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('accounts:medical_records'), {'patient': self.patient.pk}).status_code, 404)
+
+    def test_cancelled_appointment_grants_no_access(self):
+        record = records.store_file(BytesIO(self.CONTENT), self.patient, 'Scan', 'scan.pdf')
+        appointments.materialize(DoctorProfile.objects.all(), SCHEDULE_DAY, days=1)
+        appointment = appointments.book(self.patient, self.doctor.pk, at(9))
+        self.assertTrue(appointments.cancel(appointment))
+        self.client.force_login(self.doctor.user)
+        self.assertEqual(self.client.get(reverse('accounts:download_medical_record', args=[record.pk])).status_code, 404)
+        self.assertEqual(self._upload(patient=self.patient.pk).status_code, 404)
+
+    def test_downloads_stream_whole_files_and_byte_ranges(self):
+        record = records.store_file(BytesIO(self.CONTENT), self.patient, 'Scan', 'scan.pdf', 'application/pdf')
+        url = reverse('accounts:download_medical_record', args=[record.pk])
+        self.client.force_login(self.patient.user)
+
+        response = self.client.get(url)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT)
+
+        response = self.client.get(url, headers={'Range': 'bytes=100-299'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-299/{len(self.CONTENT)}')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[100:300])
+
+        response = self.client.get(url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[-10:])
+        self.assertEqual(self.client.get(url, headers={'Range': f'bytes={len(self.CONTENT)}-'}).status_code, 416)
+        # A stale If-Range gets the whole file
+        response = self.client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_asgi_downloads_use_async_iterators(self):
+        record = records.store_file(BytesIO(self.CONTENT), self.patient, 'Scan', 'scan.pdf', 'application/pdf')
+        url = reverse('accounts:download_medical_record', args=[record.pk])
+        self.async_client.force_login(self.patient.user)
+
+        async def download(**headers):
+            response = await self.async_client.get(url, headers=headers)
+            # A sync iterator would be read whole into memory under ASGI
+            self.assertTrue(response.is_async)
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        response, content = async_to_sync(download)()
+        self.assertEqual((response['Content-Length'], content), (str(len(self.CONTENT)), self.CONTENT))
+        response, content = async_to_sync(download)(Range='bytes=100-299')
+        self.assertEqual((response.status_code, content), (206, self.CONTENT[100:300]))
+
+    def test_patients_without_a_profile_have_no_records(self):
+        self.client.force_login(make_user('newcomer', User.Role.PATIENT))
+        self.assertEqual(self.client.get(reverse('accounts:medical_records')).status_code, 404)
+        self.assertEqual(self._upload().status_code, 404)
+        self.assertEqual(self._stored_files(), [])
+
+    def test_front_server_sends_the_file_when_configured(self):
+        record = records.store_file(BytesIO(self.CONTENT), self.patient, 'Scan', 'scan.pdf')
+        self.client.force_login(self.patient.user)
+        with override_settings(MEDICAL_RECORDS_SENDFILE='x-accel', MEDICAL_RECORDS_ACCEL_PREFIX='/protected/'):
+            response = self.client.get(reverse('accounts:download_medical_record', args=[record.pk]))
+        sha = record.blob.sha256
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{sha[:2]}/{sha[2:4]}/{sha}')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProfileArchivalTests(TestCase):
+    """Active-only managers and the archival of long-inactive profiles."""
+
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+        self.active = PatientProfile.objects.create(user=make_user('active', User.Role.PATIENT))
+        self.idle = PatientProfile.objects.create(user=make_user('idle', User.Role.PATIENT), is_active=False)
+        self.recent = PatientProfile.objects.create(user=make_user('recent', User.Role.PATIENT), is_active=False)
+        self.doctor = DoctorProfile.objects.create(
+            user=make_user('doc', User.Role.DOCTOR), specialization='Cardiology', qualification='MD',
+            is_approved=True, is_active=False,
+        )
+        self.long_ago = timezone.now() - timedelta(days=400)
+        PatientProfile.all_objects.filter(pk=self.idle.pk).update(updated_at=self.long_ago)
+        DoctorProfile.all_objects.filter(pk=self.doctor.pk).update(updated_at=self.long_ago)
+
+    def test_default_managers_hide_inactive_profiles(self):
+        self.assertEqual(list(PatientProfile.objects.all()), [self.active])
+        self.assertEqual(PatientProfile.all_objects.count(), 3)
+        self.assertFalse(DoctorProfile.objects.exists())
+        # Reverse accessors and the admin still see deactivated profiles
+        self.assertEqual(self.idle.user.patient_profile, self.idle)
+        self.assertIs(PatientProfile._default_manager, PatientProfile.all_objects)
+
+    def test_admin_changelist_shows_active_profiles_by_default(self):
+        self.client.force_login(make_user('root', User.Role.ADMIN, is_staff=True, is_superuser=True))
+        url = reverse('admin:accounts_patientprofile_changelist')
+        self.assertEqual(list(self.client.get(url).context['cl'].result_list), [self.active])
+        inactive = self.client.get(url, {'status': 'inactive'}).context['cl'].result_list
+        self.assertEqual({profile.pk for profile in inactive}, {self.idle.pk, self.recent.pk})
+        self.assertEqual(len(self.client.get(url, {'status': 'all'}).context['cl'].result_list), 3)
+
+    @skipUnless(connection.vendor == 'sqlite', 'reads sqlite_stat1')
+    def test_paginator_estimates_active_rows_from_partial_index(self):
+        from .pagination import EstimatedCountPaginator
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        paginator = EstimatedCountPaginator(PatientProfile.objects.order_by('-pk'), 100)
+        with mock.patch('accounts.pagination.ESTIMATE_THRESHOLD', 1), self.assertNumQueries(2):
+            self.assertEqual(paginator.count, 1)
+
+    def test_archive_moves_long_inactive_profiles(self):
+        archived = archival.archive(PatientProfile, days=365, batch_size=1)
+        self.assertEqual(archived, 1)
+        self.assertEqual(
+            set(PatientProfile.all_objects.values_list('pk', flat=True)), {self.active.pk, self.recent.pk}
+        )
+        copy = ArchivedPatientProfile.objects.get(pk=self.idle.pk)
+        self.assertEqual(copy.user_id, self.idle.user_id)
+        self.assertEqual(copy.updated_at, self.long_ago)
+
+        self.assertEqual(archival.archive(DoctorProfile, days=365), 1)
+        self.assertFalse(SearchDocument.objects.filter(kind=SearchDocument.Kind.DOCTOR, object_id=self.doctor.pk).exists())
+
+    def test_referenced_profiles_stay_in_the_hot_table(self):
+        AvailabilityRule.objects.create(
+            doctor=self.doctor, weekday=0, start_time=time(9), end_time=time(12),
+        )
+        with tempfile.TemporaryDirectory() as root, override_settings(MEDICAL_RECORDS_ROOT=root):
+            records.store_file(BytesIO(b'scan'), self.idle, 'Scan', 'scan.pdf')
+        self.assertEqual(archival.archive(PatientProfile, days=365), 0)
+        self.assertEqual(archival.archive(DoctorProfile, days=365), 0)
+        self.assertFalse(ArchivedPatientProfile.objects.exists())
+
+    def test_archived_users_are_refused_as_deactivated(self):
+        archival.archive(PatientProfile, days=365)
+        response = self.client.post(reverse('accounts:login'), {'username': 'idle', 'password': 'pass12345'})
+        self.assertContains(response, 'deactivated')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_restore_keeps_ids_and_creation_time(self):
+        created_at = self.doctor.created_at
+        archival.archive(DoctorProfile, days=365)
+        call_command('archiveprofiles', kind='doctors', restore=[self.doctor.pk], stdout=StringIO())
+        restored = DoctorProfile.all_objects.get(pk=self.doctor.pk)
+        self.assertEqual(restored.created_at, created_at)
+        self.assertFalse(restored.is_active)
+        self.assertGreater(restored.updated_at, self.long_ago)
+        self.assertFalse(ArchivedDoctorProfile.objects.exists())
+        self.assertTrue(SearchDocument.objects.filter(kind=SearchDocument.Kind.DOCTOR, object_id=self.doctor.pk).exists())
+        # Restored but still deactivated
+        self.assertEqual(decide_login(User.objects.get(username='doc')), LoginDecision.DEACTIVATED)
+
+    def test_restore_skips_users_with_a_new_profile(self):
+        archival.archive(PatientProfile, days=365)
+        archival.archive(DoctorProfile, days=365)
+        PatientProfile.objects.create(user=self.idle.user)
+        out = StringIO()
+        call_command('archiveprofiles', kind='patients', restore=[self.idle.pk], stdout=out)
+        self.assertIn('Skipped 1 patient profile(s) whose user has a new profile', out.getvalue())
+        self.assertTrue(ArchivedPatientProfile.objects.filter(pk=self.idle.pk).exists())
+
+        result = archival.restore(DoctorProfile, [self.doctor.pk])
+        self.assertEqual((result.restored, result.skipped), ([self.doctor.pk], []))
+
+    def test_command_dry_run_moves_nothing(self):
+        out = StringIO()
+        call_command('archiveprofiles', days=365, dry_run=True, stdout=out)
+        self.assertIn('1 patient profile(s) would be archived.', out.getvalue())
+        self.assertFalse(ArchivedPatientProfile.objects.exists())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AuditTrailTests(TestCase):
+    """Buffered, batched audit events of profile changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('root', User.Role.ADMIN, is_staff=True, is_superuser=True)
+        cls.clinic = Clinic.objects.create(name='Central')
+        cls.doctors = [
+            DoctorProfile.objects.create(
+                user=make_user(f'doc{i}', User.Role.DOCTOR), clinic=cls.clinic,
+                specialization='ENT', qualification='MD',
+            ).pk
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(audit.flush)
+
+    def events(self, action):
+        return AuditEvent.objects.filter(action=action).order_by('subject_id')
+
+    def test_admin_approval_is_audited_with_its_actor(self):
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:accounts_doctorprofile_changelist'), {
+                'action': 'approve_doctors', '_selected_action': self.doctors,
+            })
+        # One INSERT for the whole selection
+        with self.assertNumQueries(1):
+            self.assertEqual(audit.flush(), len(self.doctors))
+        events = self.events(AuditEvent.Action.APPROVE)
+        self.assertEqual([event.subject_id for event in events], self.doctors)
+        self.assertEqual({(event.subject, event.actor_id) for event in events},
+                         {(AuditEvent.Subject.DOCTOR, self.admin.pk)})
+
+    def test_events_wait_for_commit(self):
+        with self.assertRaises(ZeroDivisionError), self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                approvals.reject(DoctorProfile.objects.all())
+                1 / 0
+        self.assertEqual(audit.pending(), 0)
+
+    def test_batch_size_triggers_a_flush(self):
+        with override_settings(AUDIT={**settings.AUDIT, 'BATCH_SIZE': 2}), \
+                self.captureOnCommitCallbacks(execute=True):
+            approvals.reject(DoctorProfile.objects.all(), chunk_size=2)
+        # Two full chunks were written as they committed; the last one waits
+        self.assertEqual(self.events(AuditEvent.Action.REJECT).count(), 4)
+        self.assertEqual(audit.pending(), 1)
+
+    def test_requests_leave_the_flush_to_request_finished(self):
+        token = audit.bind_request(RequestFactory().get('/'))
+        try:
+            with override_settings(AUDIT={**settings.AUDIT, 'BATCH_SIZE': 2}), \
+                    self.captureOnCommitCallbacks(execute=True):
+                approvals.reject(DoctorProfile.objects.all(), chunk_size=2)
+        finally:
+            audit.unbind_request(token)
+        self.assertEqual(audit.pending(), len(self.doctors))
+        self.assertFalse(self.events(AuditEvent.Action.REJECT).exists())
+        signals.flush_audit_trail(sender=None)
+        self.assertEqual(self.events(AuditEvent.Action.REJECT).count(), len(self.doctors))
+
+    def test_profile_saves_and_clinic_assignments_are_audited(self):
+        profile = DoctorProfile.objects.get(pk=self.doctors[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.experience_years = 7
+            profile.save(update_fields=['experience_years', 'updated_at'])
+            approvals.assign_clinics({self.doctors[1]: self.clinic.pk})
+        audit.flush()
+        update = self.events(AuditEvent.Action.UPDATE).get()
+        self.assertEqual(update.changes, {'fields': ['experience_years', 'updated_at']})
+        self.assertIsNone(update.actor_id)
+        assigned = self.events(AuditEvent.Action.ASSIGN_CLINIC).get()
+        self.assertEqual((assigned.subject_id, assigned.changes), (self.doctors[1], {'clinic_id': self.clinic.pk}))
+
+    def test_failed_flush_keeps_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            approvals.reject(DoctorProfile.objects.all())
+        with mock.patch.object(AuditEvent.objects, 'bulk_create', side_effect=DatabaseError), \
+                mock.patch('accounts.audit.logger'):
+            self.assertEqual(audit.flush(), 0)
+        self.assertEqual(audit.pending(), len(self.doctors))
+        self.assertEqual(audit.flush(), len(self.doctors))
+
+    def test_events_are_append_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            approvals.reject(DoctorProfile.objects.all())
+        audit.flush()
+        event = AuditEvent.objects.first()
+        with self.assertRaises(NotSupportedError):
+            AuditEvent.objects.update(action=AuditEvent.Action.APPROVE)
+        with self.assertRaises(NotSupportedError):
+            AuditEvent.objects.all().delete()
+        with self.assertRaises(NotSupportedError):
+            event.save()
+
+
+@override_settings(
+    PASSWORD_HASHERS=FAST_HASHERS, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    AUDIT={**settings.AUDIT, 'ENABLED': False},
+)
+class JobQueueTests(TestCase):
+    """Emails and other side effects queued as jobs and run by workers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic = Clinic.objects.create(name='Central')
+
+    def setUp(self):
+        cache.clear()
+        self.failures = []
+        jobs.HANDLERS['flaky'] = jobs.Handler(self.fail_job, batch_size=10)
+        self.addCleanup(jobs.HANDLERS.pop, 'flaky')
+
+    def fail_job(self, payloads):
+        self.failures.append(payloads)
+        raise RuntimeError('SMTP down')
+
+    def work(self):
+        return jobs.work('test', threading.Event(), once=True)
+
+    def test_register_queues_the_welcome_email(self):
+        self.client.post(reverse('accounts:register'), {
+            'username': 'alice', 'email': 'alice@example.com', 'role': User.Role.PATIENT,
+            'password1': 'Str0ng-pass-phrase', 'password2': 'Str0ng-pass-phrase',
+        })
+        # Nothing is sent by the request itself
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Job.objects.get().kind, notifications.WELCOME)
+        self.assertEqual(self.work(), 1)
+        self.assertEqual([message.to for message in mail.outbox], [['alice@example.com']])
+        self.assertFalse(Job.objects.exists())
+
+    def test_approval_emails_are_sent_in_one_batch(self):
+        for i in range(3):
+            DoctorProfile.objects.create(
+                user=make_user(f'doc{i}', User.Role.DOCTOR), clinic=self.clinic,
+                specialization='ENT', qualification='MD',
+            )
+        approvals.approve(DoctorProfile.objects.all())
+        self.assertEqual(Job.objects.filter(kind=notifications.DOCTOR_APPROVED).count(), 3)
+        with mock.patch('accounts.notifications.get_connection', wraps=notifications.get_connection) as get_connection:
+            self.assertEqual(self.work(), 3)
+        # One claim, one SMTP connection
+        get_connection.assert_called_once()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['doc0@example.com', 'doc1@example.com', 'doc2@example.com'])
+
+    def test_failed_jobs_back_off_then_fail(self):
+        job = jobs.enqueue('flaky', {'n': 1})
+        with override_settings(JOBS={**settings.JOBS, 'MAX_ATTEMPTS': 2}), mock.patch('accounts.jobs.logger'):
+            self.assertEqual(self.work(), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+            self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=settings.JOBS['BACKOFF'] - 5))
+            self.assertIn('SMTP down', job.last_error)
+            # Not due yet
+            self.assertEqual(self.work(), 0)
+            Job.objects.update(run_at=timezone.now())
+            self.assertEqual(self.work(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+        self.assertEqual(len(self.failures), 2)
+        self.assertEqual(jobs.backoff(20), settings.JOBS['BACKOFF_MAX'])
+
+    def test_claims_do_not_overlap(self):
+        jobs.enqueue_many('flaky', [{'n': n} for n in range(15)])
+        first, second = jobs.claim('a'), jobs.claim('b')
+        self.assertEqual((len(first), len(second)), (10, 5))
+        self.assertFalse({job.pk for job in first} & {job.pk for job in second})
+        self.assertEqual(jobs.claim('c'), [])
+
+    def test_stale_claims_are_requeued(self):
+        jobs.enqueue('flaky')
+        jobs.claim('dead-worker')
+        self.assertEqual(jobs.requeue_stale(), 0)
+        Job.objects.update(claimed_at=timezone.now() - timedelta(seconds=settings.JOBS['LEASE'] + 1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get().status, Job.Status.QUEUED)
+
+    def test_unknown_kinds_are_rejected(self):
+        with self.assertRaises(KeyError):
+            jobs.enqueue('no-such-job')
+
+    def test_runworker_once(self):
+        user = make_user('bob', User.Role.PATIENT)
+        notifications.queue_welcome(user)
+        out = StringIO()
+        call_command('runworker', '--once', stdout=out)
+        self.assertIn('Ran 1 job(s).', out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
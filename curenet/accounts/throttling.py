@@ -0,0 +1,136 @@
+"""
+Login throttling.
+
+Checked before ``authenticate()``, so an attempt over the limit costs a
+couple of cache round trips instead of a password hash and a query.
+Two sliding-window counters are kept in the ``LOGIN_THROTTLE`` cache:
+every attempt from an IP address, and failed attempts per username. A
+window's count is the current fixed window plus the previous one
+weighted by how much of it still overlaps, which is accurate enough for
+rate limiting and needs one atomic ``incr`` per hit.
+
+The counters must live in a cache all workers share (memcached, Redis)
+in production; with locmem every process throttles on its own.
+"""
+import hashlib
+import math
+import time
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.shortcuts import render
+
+
+def _config():
+    return settings.LOGIN_THROTTLE
+
+
+def _cache():
+    return caches[_config()['CACHE_ALIAS']]
+
+
+def client_ip(request):
+    """Address of the client; the front server must set REMOTE_ADDR to it."""
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def _username_key(username):
+    # Bounded, cache-safe keys whatever the submitted username
+    return 'user:' + hashlib.sha256(username.strip().casefold().encode()).hexdigest()
+
+
+def _windows(scope):
+    window = _config()['WINDOW']
+    index, offset = divmod(time.time(), window)
+    index = int(index)
+    prefix = f'throttle:login:{scope}'
+    return f'{prefix}:{index}', f'{prefix}:{index - 1}', offset / window, window
+
+
+def _weighted(current, previous, progress):
+    return current + previous * (1 - progress)
+
+
+def _retry_after(progress, window):
+    return max(1, math.ceil(window * (1 - progress)))
+
+
+def _incr(cache, key, window):
+    # add() is a no-op when the key exists; incr() is atomic in every backend
+    cache.add(key, 0, timeout=window * 2)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired between the two calls
+        cache.add(key, 1, timeout=window * 2)
+        return 1
+
+
+async def _aincr(cache, key, window):
+    await cache.aadd(key, 0, timeout=window * 2)
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 1, timeout=window * 2)
+        return 1
+
+
+def check(request, username):
+    """
+    Count a login attempt and return None if it may proceed, or the
+    seconds to wait before retrying if the client or username is over its
+    limit.
+    """
+    config, cache = _config(), _cache()
+    ip_current, ip_previous, progress, window = _windows(client_ip(request))
+    user_current, user_previous, _, _ = _windows(_username_key(username or ''))
+    # Reads first, so the attempt itself is the only write
+    counts = cache.get_many([ip_previous, user_current, user_previous])
+    attempts = _weighted(_incr(cache, ip_current, window), counts.get(ip_previous, 0), progress)
+    failures = _weighted(counts.get(user_current, 0), counts.get(user_previous, 0), progress)
+    if attempts > config['IP_LIMIT'] or failures >= config['USERNAME_LIMIT']:
+        return _retry_after(progress, window)
+    return None
+
+
+async def acheck(request, username):
+    """Async counterpart of check."""
+    config, cache = _config(), _cache()
+    ip_current, ip_previous, progress, window = _windows(client_ip(request))
+    user_current, user_previous, _, _ = _windows(_username_key(username or ''))
+    counts = await cache.aget_many([ip_previous, user_current, user_previous])
+    attempts = _weighted(await _aincr(cache, ip_current, window), counts.get(ip_previous, 0), progress)
+    failures = _weighted(counts.get(user_current, 0), counts.get(user_previous, 0), progress)
+    if attempts > config['IP_LIMIT'] or failures >= config['USERNAME_LIMIT']:
+        return _retry_after(progress, window)
+    return None
+
+
+def record_failure(username):
+    """Count a failed password for ``username``."""
+    current, _, _, window = _windows(_username_key(username or ''))
+    _incr(_cache(), current, window)
+
+
+async def arecord_failure(username):
+    current, _, _, window = _windows(_username_key(username or ''))
+    await _aincr(_cache(), current, window)
+
+
+def reset(username):
+    """Forget the failures of ``username`` after a successful login."""
+    current, previous, _, _ = _windows(_username_key(username or ''))
+    _cache().delete_many([current, previous])
+
+
+async def areset(username):
+    current, previous, _, _ = _windows(_username_key(username or ''))
+    await _cache().adelete_many([current, previous])
+
+
+def throttled_response(request, retry_after, context=None):
+    """The login page, answered 429 with Retry-After."""
+    messages.error(request, f'Too many login attempts. Please try again in {retry_after} seconds.')
+    response = render(request, 'accounts/login.html', {'error': 'Too many attempts', **(context or {})}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
@@ -1,16 +1,34 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, instrumentation, views
 
 app_name = 'accounts'
 
-urlpatterns = [
-    path('register/', views.register_view, name='register'),
-    path('login/', views.login_view, name='login'),
-    path('logout/', views.logout_view, name='logout'),
-    path('profile/create/patient/', views.create_patient_profile, name='create_patient_profile'),
-    path('profile/create/doctor/', views.create_doctor_profile, name='create_doctor_profile'),
-    path('dashboard/', views.profile_redirect, name='profile_redirect'),
-    path('dashboard/patient/', views.patient_dashboard, name='patient_dashboard'),
-    path('dashboard/doctor/', views.doctor_dashboard, name='doctor_dashboard'),
-]
 
+def build_urlpatterns(hot_views):
+    """
+    URL patterns with the login and dashboard views taken from
+    ``hot_views`` (``views`` for WSGI, ``async_views`` for ASGI).
+    """
+    return [
+        path('register/', views.register_view, name='register'),
+        path('login/', hot_views.login_view, name='login'),
+        path('logout/', views.logout_view, name='logout'),
+        path('profile/create/patient/', views.create_patient_profile, name='create_patient_profile'),
+        path('profile/create/doctor/', views.create_doctor_profile, name='create_doctor_profile'),
+        path('dashboard/', hot_views.profile_redirect, name='profile_redirect'),
+        path('dashboard/patient/', hot_views.patient_dashboard, name='patient_dashboard'),
+        path('dashboard/doctor/', hot_views.doctor_dashboard, name='doctor_dashboard'),
+        path('api/doctors/', views.doctor_directory, name='doctor_directory'),
+        path('api/search/', views.search_view, name='search'),
+        path('api/availability/', views.first_available, name='first_available'),
+        path('api/doctors/<int:doctor_id>/slots/', views.doctor_slots, name='doctor_slots'),
+        path('api/doctors/<int:doctor_id>/appointments/', views.book_appointment, name='book_appointment'),
+        path('api/records/', views.medical_records, name='medical_records'),
+        path('api/records/upload/', views.upload_medical_record, name='upload_medical_record'),
+        path('api/records/<int:record_id>/', views.download_medical_record, name='download_medical_record'),
+        path('metrics/', instrumentation.metrics_view, name='metrics'),
+    ]
+
+
+urlpatterns = build_urlpatterns(async_views if settings.ASYNC_VIEWS else views)
@@ -1,10 +1,31 @@
+import base64
+import binascii
+from django.http import Http404, JsonResponse
+from django.db import connection
+from django.middleware.http import ConditionalGetMiddleware
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.views.decorators.http import require_http_methods
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import decorator_from_middleware
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
+from . import appointments, availability, notifications, records, search, throttling
 from .forms import UserRegistrationForm, PatientProfileForm, DoctorProfileForm
-from .models import User, PatientProfile, DoctorProfile
+from .models import User, Clinic, DoctorProfile, MedicalRecord, PatientProfile, SearchDocument
+from .services import LoginDecision, decide_login, directory_queryset
+
+DIRECTORY_PAGE_SIZE = 20
+SLOT_PAGE_SIZE = 20
+AVAILABILITY_MAX_DAYS = 31
+DIRECTORY_MAX_PAGE_SIZE = 100
+SEARCH_RESULT_LIMIT = 20
+
+# Adds an ETag to the response and answers matching If-None-Match with 304
+conditional_get = decorator_from_middleware(ConditionalGetMiddleware)
 
 
 def register_view(request):
@@ -16,19 +37,17 @@ def register_view(request):
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
             user = form.save()
-            # Log the user in
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password1')
-            user = authenticate(username=username, password=password)
-            if user:
-                login(request, user)
-                # Redirect to profile creation based on role
-                if user.role == User.Role.PATIENT:
-                    return redirect('accounts:create_patient_profile')
-                elif user.role == User.Role.DOCTOR:
-                    return redirect('accounts:create_doctor_profile')
-                elif user.role == User.Role.ADMIN:
-                    return redirect('accounts:profile_redirect')
+            # Sent by `manage.py runworker`, not in this request
+            notifications.queue_welcome(user)
+            # The form has just hashed the password, so log the user in
+            # directly instead of hashing it again through authenticate().
+            login(request, user, backend='accounts.backends.ProfileBackend')
+            # Redirect to profile creation based on role
+            if user.role == User.Role.PATIENT:
+                return redirect('accounts:create_patient_profile')
+            elif user.role == User.Role.DOCTOR:
+                return redirect('accounts:create_doctor_profile')
+            return redirect('accounts:profile_redirect')
     else:
         form = UserRegistrationForm()
     
@@ -44,38 +63,33 @@ def login_view(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
         
+        # Refused before any password hashing or query
+        retry_after = throttling.check(request, username)
+        if retry_after is not None:
+            return throttling.throttled_response(request, retry_after)
+        
+        # ProfileBackend joins both profiles, so decide_login needs no query
         user = authenticate(request, username=username, password=password)
         
         if user is not None:
-            # Check if user is a doctor and if they're approved
-            if user.role == User.Role.DOCTOR:
-                try:
-                    doctor_profile = user.doctor_profile
-                    if not doctor_profile.is_approved:
-                        messages.error(request, 'Your account is pending admin approval. Please wait for approval before logging in.')
-                        return render(request, 'accounts/login.html', {'error': 'Account pending approval'})
-                    if not doctor_profile.is_active:
-                        messages.error(request, 'Your account has been deactivated. Please contact admin.')
-                        return render(request, 'accounts/login.html', {'error': 'Account deactivated'})
-                except DoctorProfile.DoesNotExist:
-                    # Doctor registered but profile not created yet
-                    return redirect('accounts:create_doctor_profile')
+            throttling.reset(username)
+            decision = decide_login(user)
+            if decision == LoginDecision.PENDING_APPROVAL:
+                messages.error(request, 'Your account is pending admin approval. Please wait for approval before logging in.')
+                return render(request, 'accounts/login.html', {'error': 'Account pending approval'})
+            if decision == LoginDecision.DEACTIVATED:
+                messages.error(request, 'Your account has been deactivated. Please contact admin.')
+                return render(request, 'accounts/login.html', {'error': 'Account deactivated'})
             
-            # Check if user is a patient and profile exists
-            if user.role == User.Role.PATIENT:
-                try:
-                    patient_profile = user.patient_profile
-                    if not patient_profile.is_active:
-                        messages.error(request, 'Your account has been deactivated. Please contact admin.')
-                        return render(request, 'accounts/login.html', {'error': 'Account deactivated'})
-                except PatientProfile.DoesNotExist:
-                    # Patient registered but profile not created yet
-                    return redirect('accounts:create_patient_profile')
-            
-            # All checks passed, log in
             login(request, user)
+            if decision == LoginDecision.NEEDS_PROFILE:
+                # Registered but profile not created yet
+                if user.role == User.Role.DOCTOR:
+                    return redirect('accounts:create_doctor_profile')
+                return redirect('accounts:create_patient_profile')
             return redirect('accounts:profile_redirect')
         else:
+            throttling.record_failure(username)
             messages.error(request, 'Invalid username or password.')
     
     return render(request, 'accounts/login.html')
@@ -144,30 +158,27 @@ def create_doctor_profile(request):
 def profile_redirect(request):
     """Redirect user based on their role and profile status."""
     user = request.user
+    profile = request.profile
     
     if user.role == User.Role.PATIENT:
-        try:
-            profile = user.patient_profile
-            return render(request, 'accounts/patient_dashboard.html', {
-                'user': user,
-                'profile': profile
-            })
-        except PatientProfile.DoesNotExist:
+        if not profile:
             return redirect('accounts:create_patient_profile')
+        return render(request, 'accounts/patient_dashboard.html', {
+            'user': user,
+            'profile': profile
+        })
     
     elif user.role == User.Role.DOCTOR:
-        try:
-            profile = user.doctor_profile
-            if profile.is_approved:
-                return render(request, 'accounts/doctor_dashboard.html', {
-                    'user': user,
-                    'profile': profile
-                })
-            else:
-                messages.warning(request, 'Your account is pending admin approval.')
-                return render(request, 'accounts/pending_approval.html', {'user': user})
-        except DoctorProfile.DoesNotExist:
+        if not profile:
             return redirect('accounts:create_doctor_profile')
+        if profile.is_approved:
+            return render(request, 'accounts/doctor_dashboard.html', {
+                'user': user,
+                'profile': profile
+            })
+        else:
+            messages.warning(request, 'Your account is pending admin approval.')
+            return render(request, 'accounts/pending_approval.html', {'user': user})
     
     elif user.role == User.Role.ADMIN:
         return redirect('admin:index')
@@ -182,9 +193,8 @@ def patient_dashboard(request):
         messages.error(request, 'Access denied.')
         return redirect('accounts:profile_redirect')
     
-    try:
-        profile = request.user.patient_profile
-    except PatientProfile.DoesNotExist:
+    profile = request.profile
+    if not profile:
         return redirect('accounts:create_patient_profile')
     
     return render(request, 'accounts/patient_dashboard.html', {
@@ -200,13 +210,12 @@ def doctor_dashboard(request):
         messages.error(request, 'Access denied.')
         return redirect('accounts:profile_redirect')
     
-    try:
-        profile = request.user.doctor_profile
-        if not profile.is_approved:
-            messages.warning(request, 'Your account is pending admin approval.')
-            return render(request, 'accounts/pending_approval.html', {'user': request.user})
-    except DoctorProfile.DoesNotExist:
+    profile = request.profile
+    if not profile:
         return redirect('accounts:create_doctor_profile')
+    if not profile.is_approved:
+        messages.warning(request, 'Your account is pending admin approval.')
+        return render(request, 'accounts/pending_approval.html', {'user': request.user})
     
     return render(request, 'accounts/doctor_dashboard.html', {
         'user': request.user,
@@ -221,3 +230,260 @@ def logout_view(request):
     logout(request)
     messages.success(request, 'You have been logged out successfully.')
     return redirect('accounts:login')
+
+
+def _doctor_json(doctor):
+    return {
+        'id': doctor.id,
+        'name': f'Dr. {doctor.user.first_name} {doctor.user.last_name}'.strip(),
+        'specialization': doctor.specialization,
+        'qualification': doctor.qualification,
+        'experience_years': doctor.experience_years,
+        'clinic': {'id': doctor.clinic.id, 'name': doctor.clinic.name} if doctor.clinic else None,
+    }
+
+
+def _encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode()
+
+
+def _in_db_range(value):
+    # Larger ints overflow the database driver (OverflowError on SQLite)
+    low, high = connection.ops.integer_field_range('BigIntegerField')
+    return low <= value <= high
+
+
+def _decode_cursor(cursor):
+    try:
+        last_id = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor.')
+    if not _in_db_range(last_id):
+        raise ValueError('Invalid cursor.')
+    return last_id
+
+
+def _datetime_param(data, name):
+    value = data.get(name)
+    if value in (None, ''):
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'{name} must be an ISO 8601 datetime.')
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def _int_param(data, name):
+    value = data.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer.')
+    if not _in_db_range(value):
+        raise ValueError(f'{name} is out of range.')
+    return value
+
+
+@require_GET
+@cache_control(public=True, max_age=60)
+@conditional_get
+def doctor_directory(request):
+    """Public JSON listing of approved doctors with keyset pagination."""
+    try:
+        clinic_id = _int_param(request.GET, 'clinic')
+        min_experience = _int_param(request.GET, 'min_experience')
+        limit = _int_param(request.GET, 'limit') or DIRECTORY_PAGE_SIZE
+        cursor = request.GET.get('cursor')
+        after = _decode_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    limit = max(1, min(limit, DIRECTORY_MAX_PAGE_SIZE))
+
+    doctors = directory_queryset(
+        specialization=request.GET.get('specialization'),
+        clinic_id=clinic_id,
+        min_experience=min_experience,
+    )
+    if after is not None:
+        doctors = doctors.filter(id__gt=after)
+    # Fetch one extra row to know whether there is a next page
+    page = list(doctors[:limit + 1])
+    has_next = len(page) > limit
+    page = page[:limit]
+
+    return JsonResponse({
+        'results': [_doctor_json(doctor) for doctor in page],
+        'next_cursor': _encode_cursor(page[-1].id) if has_next else None,
+    })
+
+
+@require_GET
+@conditional_get
+def search_view(request):
+    """Public JSON full-text search over listed doctors and active clinics."""
+    query = request.GET.get('q', '')
+    doctor_ids = search.search_ids(query, SearchDocument.Kind.DOCTOR, limit=SEARCH_RESULT_LIMIT)
+    clinic_ids = search.search_ids(query, SearchDocument.Kind.CLINIC, limit=SEARCH_RESULT_LIMIT)
+
+    # Keep the relevance order of the index
+    doctors = directory_queryset().in_bulk(doctor_ids)
+    clinics = Clinic.objects.filter(is_active=True).only('id', 'name').in_bulk(clinic_ids)
+    return JsonResponse({
+        'doctors': [_doctor_json(doctors[pk]) for pk in doctor_ids if pk in doctors],
+        'clinics': [{'id': pk, 'name': clinics[pk].name} for pk in clinic_ids if pk in clinics],
+    })
+
+
+@require_GET
+def doctor_slots(request, doctor_id):
+    """Public JSON list of a listed doctor's next free slots."""
+    try:
+        after = _datetime_param(request.GET, 'after')
+        limit = _int_param(request.GET, 'limit') or SLOT_PAGE_SIZE
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    if not DoctorProfile.objects.listed().filter(pk=doctor_id).exists():
+        return JsonResponse({'error': 'Doctor not found.'}, status=404)
+    slots = appointments.free_slots([doctor_id], after=after, limit=max(1, min(limit, DIRECTORY_MAX_PAGE_SIZE)))
+    return JsonResponse({
+        'results': [{'start': slot.start.isoformat(), 'end': slot.end.isoformat()} for slot in slots],
+    })
+
+
+@login_required
+@require_POST
+def book_appointment(request, doctor_id):
+    """Book one of a doctor's free slots for the logged-in patient."""
+    profile = request.profile
+    if request.user.role != User.Role.PATIENT or not profile:
+        return JsonResponse({'error': 'Only patients can book appointments.'}, status=403)
+    try:
+        start = _datetime_param(request.POST, 'start')
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    if start is None:
+        return JsonResponse({'error': 'start is required.'}, status=400)
+    try:
+        appointment = appointments.book(profile, doctor_id, start, reason=request.POST.get('reason', '')[:255])
+    except appointments.DoctorNotListed:
+        return JsonResponse({'error': 'Doctor not found.'}, status=404)
+    except appointments.SlotUnavailable as exc:
+        return JsonResponse({'error': str(exc)}, status=409)
+    return JsonResponse({'id': appointment.id, 'start': appointment.start.isoformat()}, status=201)
+
+
+@require_GET
+def first_available(request):
+    """Public JSON list of the earliest free slots across doctors of a specialization."""
+    specialization = request.GET.get('specialization')
+    if not specialization:
+        return JsonResponse({'error': 'specialization is required.'}, status=400)
+    try:
+        after = _datetime_param(request.GET, 'after')
+        clinic_id = _int_param(request.GET, 'clinic')
+        days = _int_param(request.GET, 'days') or 7
+        limit = _int_param(request.GET, 'limit') or SLOT_PAGE_SIZE
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    found = availability.first_available(
+        specialization, after=after, clinic_id=clinic_id,
+        days=max(1, min(days, AVAILABILITY_MAX_DAYS)), limit=max(1, min(limit, DIRECTORY_MAX_PAGE_SIZE)),
+    )
+    doctors = directory_queryset().in_bulk({doctor_id for _, doctor_id in found})
+    return JsonResponse({
+        'results': [
+            {'start': start.isoformat(), 'doctor': _doctor_json(doctors[doctor_id])}
+            for start, doctor_id in found if doctor_id in doctors
+        ],
+    })
+
+
+def _record_json(record):
+    return {
+        'id': record.id,
+        'title': record.title,
+        'filename': record.filename,
+        'content_type': record.content_type,
+        'size': record.blob.size,
+        'sha256': record.blob.sha256,
+        'created_at': record.created_at.isoformat(),
+    }
+
+
+def _record_patient(request, patient_id):
+    """The patient whose records ``request.user`` may use, or None."""
+    if patient_id is None and request.user.role == User.Role.PATIENT:
+        # request.profile is lazy: never None itself
+        return request.profile if request.profile else None
+    if patient_id is None:
+        return None
+    patient = PatientProfile.all_objects.filter(pk=patient_id).first()
+    if patient is None or not records.can_access(request.user, patient):
+        return None
+    return patient
+
+
+@login_required
+@require_GET
+def medical_records(request):
+    """JSON index of a patient's records, newest first."""
+    try:
+        patient_id = _int_param(request.GET, 'patient')
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    patient = _record_patient(request, patient_id)
+    if patient is None:
+        return JsonResponse({'error': 'Patient not found.'}, status=404)
+    listed = MedicalRecord.objects.filter(patient=patient).select_related('blob').order_by('-created_at', '-id')
+    return JsonResponse({'results': [_record_json(record) for record in listed]})
+
+
+@csrf_exempt
+@login_required
+@require_POST
+def upload_medical_record(request):
+    """
+    Add an uploaded file to a patient's records. Patients upload their own;
+    doctors and staff pass ``patient``.
+    """
+    # Must be installed before the body is read, so CSRF is checked afterwards
+    handler = records.HashingUploadHandler(request)
+    request.upload_handlers = [handler]
+    try:
+        return _upload_medical_record(request, handler)
+    finally:
+        # Uploads not stored, including rejected requests and other fields
+        for upload in request.FILES.values():
+            records.discard(upload)
+
+
+@csrf_protect
+def _upload_medical_record(request, handler):
+    upload = request.FILES.get('file')
+    if handler.too_large:
+        return JsonResponse({'error': 'File is too large.'}, status=413)
+    if upload is None:
+        return JsonResponse({'error': 'file is required.'}, status=400)
+    try:
+        patient_id = _int_param(request.POST, 'patient')
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    patient = _record_patient(request, patient_id)
+    if patient is None:
+        return JsonResponse({'error': 'Patient not found.'}, status=404)
+    doctor = request.profile if request.user.role == User.Role.DOCTOR else None
+    record = records.store(upload, patient, request.POST.get('title', '')[:200], doctor=doctor)
+    return JsonResponse(_record_json(record), status=201)
+
+
+@login_required
+@require_GET
+def download_medical_record(request, record_id):
+    """Stream a record's content; supports single byte ranges."""
+    record = MedicalRecord.objects.select_related('blob', 'patient').filter(pk=record_id).first()
+    if record is None or not records.can_access(request.user, record.patient):
+        raise Http404('Record not found.')
+    return records.record_response(request, record)
@@ -0,0 +1,85 @@
+"""
+Performance benchmarks for CureNet.
+
+Run from the ``curenet`` directory, e.g. ``python -m benchmarks.signup``.
+Each benchmark runs against a throwaway test database.
+"""
+import json
+import os
+import re
+import subprocess
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'curenet.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Create a fresh test database for the duration of the block."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def rate(count, func):
+    """Call ``func(i)`` for i in range(count) and return calls per second."""
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return count / (time.perf_counter() - start)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (pct in 0..100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples, queries=None):
+    """p50/p95/p99/mean in milliseconds of ``samples`` (seconds)."""
+    summary = {
+        'requests': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+    }
+    if queries:
+        summary['queries_per_request'] = round(sum(queries) / len(queries), 2)
+    return summary
+
+
+def queries_of(response):
+    """Query count from the ``Server-Timing`` header (accounts.instrumentation)."""
+    match = re.search(r'desc="(\d+) queries"', response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def write_results(name, results, path=None):
+    """Print ``results`` as JSON, tagged with the commit, or write them to ``path``."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    document = json.dumps({'benchmark': name, 'commit': commit, 'results': results}, indent=2)
+    if path:
+        with open(path, 'w') as file:
+            file.write(document + '\n')
+    else:
+        print(document)
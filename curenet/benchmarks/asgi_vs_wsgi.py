@@ -0,0 +1,153 @@
+"""
+Load test of the login and dashboard flow: uvicorn (async views) against
+gunicorn with sync workers (sync views).
+
+A throwaway SQLite database is migrated and seeded with patients, then
+each server is started in turn on a local port and driven by concurrent
+virtual users that log in once and load the dashboard repeatedly.
+Servers whose package is not installed are skipped.
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from pathlib import Path
+from . import percentile
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+PASSWORD = 'Str0ng-pass-phrase'
+
+
+def seed(db_path, users):
+    """Migrate ``db_path`` and create ``users`` patients with profiles."""
+    os.environ['CURENET_SQLITE_PATH'] = str(db_path)
+    from . import setup_django
+    setup_django()
+    from django.contrib.auth.hashers import make_password
+    from django.core.management import call_command
+    from accounts.models import User, PatientProfile
+
+    call_command('migrate', verbosity=0)
+    encoded = make_password(PASSWORD)
+    created = User.objects.bulk_create([
+        User(username=f'load{i}', email=f'load{i}@example.com', password=encoded, role=User.Role.PATIENT)
+        for i in range(users)
+    ])
+    PatientProfile.objects.bulk_create([PatientProfile(user=user) for user in created])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def virtual_user(base_url, username, requests):
+    """Log in as ``username`` and fetch the dashboard; return latencies."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    login_url = f'{base_url}/accounts/login/'
+    page = opener.open(login_url).read().decode()
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+    data = urllib.parse.urlencode({
+        'csrfmiddlewaretoken': token, 'username': username, 'password': PASSWORD,
+    }).encode()
+
+    start = time.perf_counter()
+    opener.open(urllib.request.Request(login_url, data=data, headers={'Referer': login_url})).read()
+    login_latency = time.perf_counter() - start
+
+    dashboard = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        opener.open(f'{base_url}/accounts/dashboard/').read()
+        dashboard.append(time.perf_counter() - start)
+    return login_latency, dashboard
+
+
+def drive(port, users, concurrency, requests):
+    base_url = f'http://127.0.0.1:{port}'
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda i: virtual_user(base_url, f'load{i}', requests), range(users)
+        ))
+    elapsed = time.perf_counter() - start
+    logins = [login for login, _ in results]
+    dashboards = [latency for _, samples in results for latency in samples]
+    return {
+        'requests_per_second': (len(logins) + len(dashboards)) / elapsed,
+        'login_p50_ms': percentile(logins, 50) * 1000,
+        'login_p95_ms': percentile(logins, 95) * 1000,
+        'dashboard_p50_ms': percentile(dashboards, 50) * 1000,
+        'dashboard_p95_ms': percentile(dashboards, 95) * 1000,
+    }
+
+
+def server_commands(port, workers):
+    bind = f'127.0.0.1:{port}'
+    return {
+        'uvicorn (ASGI, async views)': ('uvicorn', [
+            sys.executable, '-m', 'uvicorn', 'curenet.asgi:application',
+            '--port', str(port), '--workers', str(workers), '--log-level', 'warning',
+        ]),
+        'gunicorn (WSGI, sync workers)': ('gunicorn', [
+            sys.executable, '-m', 'gunicorn', 'curenet.wsgi:application',
+            '--bind', bind, '--workers', str(workers), '--worker-class', 'sync',
+            '--log-level', 'warning',
+        ]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=20, help='dashboard hits per user')
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'load.sqlite3'
+        seed(db_path, args.users)
+
+        port = free_port()
+        for label, (package, command) in server_commands(port, args.workers).items():
+            if find_spec(package) is None:
+                print(f'{label}: skipped ({package} not installed)')
+                continue
+            # Every virtual user logs in from 127.0.0.1
+            env = {**os.environ, 'CURENET_SQLITE_PATH': str(db_path), 'CURENET_LOGIN_IP_LIMIT': str(10 ** 9)}
+            env.pop('CURENET_ASYNC_VIEWS', None)
+            server = subprocess.Popen(command, cwd=PROJECT_DIR, env=env)
+            try:
+                wait_for_port(port)
+                stats = drive(port, args.users, args.concurrency, args.requests)
+            finally:
+                server.terminate()
+                server.wait()
+            print(f'{label}: ' + ', '.join(f'{key}={value:.1f}' for key, value in stats.items()))
+
+
+if __name__ == '__main__':
+    main()
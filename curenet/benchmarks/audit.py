@@ -0,0 +1,77 @@
+"""
+Overhead of the audit trail on bulk doctor approval.
+
+Seeds a throwaway test database with ``--doctors`` pending doctors and
+approves them all ``--rounds`` times through ``accounts.approvals``: with
+auditing off, with the buffered trail (the approval itself, then the
+flush a request would run after its response), and with one INSERT per
+audited row as a synchronous baseline. Reports median times and the
+audit statements issued: the buffered trail writes a batch whenever
+``AUDIT['BATCH_SIZE']`` events are pending, in as few INSERTs as the
+backend's parameter limit allows (about 140 rows each on SQLite).
+"""
+import argparse
+import statistics
+import time
+from . import setup_django, test_database
+from .factories import build
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--doctors', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import override_settings
+    from django.utils import timezone
+    from accounts import approvals, audit
+    from accounts.models import AuditEvent, DoctorProfile
+
+    statements = []
+
+    def count_audit_inserts(execute, sql, params, many, context):
+        if sql.startswith('INSERT INTO "accounts_auditevent"'):
+            statements.append(sql)
+        return execute(sql, params, many, context)
+
+    def approve_with_row_inserts(queryset):
+        # What auditing inline would cost: one INSERT per approved doctor
+        result = approvals.approve(queryset)
+        for pk in result.approved:
+            AuditEvent.objects.create(
+                subject=AuditEvent.Subject.DOCTOR, subject_id=pk, action=AuditEvent.Action.APPROVE, at=timezone.now(),
+            )
+
+    def run(label, approve, enabled):
+        timings, flushes = [], []
+        with override_settings(AUDIT={**audit._config(), 'ENABLED': enabled}):
+            for _ in range(args.rounds):
+                DoctorProfile.all_objects.update(is_approved=False)
+                statements.clear()
+                with connection.execute_wrapper(count_audit_inserts):
+                    began = time.perf_counter()
+                    approve(DoctorProfile.objects.all())
+                    timings.append(time.perf_counter() - began)
+                    began = time.perf_counter()
+                    audit.flush()
+                    flushes.append(time.perf_counter() - began)
+        approval_ms = statistics.median(timings) * 1000
+        flush_ms = statistics.median(flushes) * 1000
+        print(f'{label:>22}: approve {approval_ms:8.1f} ms, then flush {flush_ms:7.1f} ms, '
+              f'{len(statements):6} audit INSERTs per run')
+        return approval_ms
+
+    with test_database():
+        build(clinics=5, doctors=args.doctors, patients=0)
+        print(f'{args.doctors} doctors, median of {args.rounds} runs')
+        off = run('auditing off', approvals.approve, False)
+        buffered = run('buffered audit trail', approvals.approve, True)
+        inline = run('one INSERT per row', approve_with_row_inserts, False)
+        print(f'in-request overhead: buffered {buffered - off:+.1f} ms, per-row inserts {inline - off:+.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+"First free slot this week" across all doctors of a specialization.
+
+Compares the bitmap index (accounts.availability.first_available) with
+asking each candidate doctor for its next free slots, on a throwaway
+test database seeded with ``factories.build`` and a week of slots.
+"""
+import argparse
+import time
+from . import setup_django, summarize, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--queries', type=int, default=50)
+    parser.add_argument('--doctors', type=int, default=600)
+    parser.add_argument('--days', type=int, default=7)
+    args = parser.parse_args()
+
+    setup_django()
+    from datetime import datetime, time as clock, timedelta
+    from django.utils import timezone
+    from accounts import appointments, availability
+    from accounts.models import AvailabilityRule, DoctorProfile
+    from .factories import build
+
+    with test_database():
+        build(clinics=20, doctors=args.doctors, patients=10)
+        AvailabilityRule.objects.bulk_create([
+            AvailabilityRule(doctor_id=pk, weekday=weekday, start_time=clock(9), end_time=clock(17))
+            for pk in DoctorProfile.objects.values_list('pk', flat=True) for weekday in range(7)
+        ])
+        start = timezone.localdate() + timedelta(days=1)
+        appointments.materialize(DoctorProfile.objects.all(), start, args.days)
+        after = timezone.make_aware(datetime.combine(start, clock(0)))
+
+        def per_doctor():
+            candidates = DoctorProfile.objects.listed().filter(specialization='Cardiology').values_list('pk', flat=True)
+            found = []
+            for doctor_id in candidates:
+                found.extend((slot.start, doctor_id) for slot in appointments.free_slots([doctor_id], after=after, limit=10))
+            return sorted(found)[:10]
+
+        def indexed():
+            return availability.first_available('Cardiology', after=after, days=args.days, limit=10)
+
+        assert per_doctor() == indexed()
+        for label, query in (('per-doctor slot queries', per_doctor), ('bitmap index', indexed)):
+            samples = []
+            for _ in range(args.queries):
+                began = time.perf_counter()
+                query()
+                samples.append(time.perf_counter() - began)
+            stats = summarize(samples)
+            print(f'{label:>24}: p50 {stats["p50_ms"]:8.2f} ms, p95 {stats["p95_ms"]:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
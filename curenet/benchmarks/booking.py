@@ -0,0 +1,100 @@
+"""
+Concurrent booking throughput and correctness.
+
+A throwaway SQLite file (the tuned WAL profile) is seeded with doctors,
+patients and materialized slots; worker processes then book random
+slots as fast as they can, so most attempts collide. Reports successful
+bookings and attempts per second, and checks that no slot was booked
+twice.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from . import setup_django
+
+
+def seed(doctors, patients, days):
+    from datetime import time as clock, timedelta
+    from django.core.management import call_command
+    from django.utils import timezone
+    from accounts import appointments
+    from accounts.models import AvailabilityRule, DoctorProfile
+    from .factories import build
+
+    call_command('migrate', verbosity=0)
+    build(clinics=5, doctors=doctors, patients=patients)
+    AvailabilityRule.objects.bulk_create([
+        AvailabilityRule(doctor_id=pk, weekday=weekday, start_time=clock(9), end_time=clock(17), slot_minutes=15)
+        for pk in DoctorProfile.objects.values_list('pk', flat=True) for weekday in range(7)
+    ])
+    return appointments.materialize(DoctorProfile.objects.all(), timezone.localdate() + timedelta(days=1), days)
+
+
+def _init_worker():
+    setup_django()
+
+
+def worker(seed_value, attempts):
+    from django.db import OperationalError, connection
+    from accounts import appointments
+    from accounts.models import PatientProfile, Slot
+
+    rng = random.Random(seed_value)
+    slots = list(Slot.objects.values_list('doctor_id', 'start'))
+    patients = list(PatientProfile.objects.all()[:200])
+    booked = errors = 0
+    for _ in range(attempts):
+        doctor_id, start = rng.choice(slots)
+        try:
+            appointments.book(rng.choice(patients), doctor_id, start)
+            booked += 1
+        except appointments.SlotUnavailable:
+            pass
+        except OperationalError:
+            errors += 1
+    connection.close()
+    return booked, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--attempts', type=int, default=500, help='booking attempts per worker')
+    parser.add_argument('--doctors', type=int, default=10)
+    parser.add_argument('--days', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['CURENET_SQLITE_PATH'] = str(Path(tmp) / 'booking.sqlite3')
+        setup_django()
+        slots = seed(args.doctors, 200, args.days)
+        from django.db import connection
+        connection.close()
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+            results = list(pool.map(worker, range(args.workers), [args.attempts] * args.workers))
+        elapsed = time.perf_counter() - start
+
+        from django.db.models import Count
+        from accounts.models import Appointment, Slot
+        booked = sum(count for count, _ in results)
+        errors = sum(count for _, count in results)
+        doubles = (
+            Appointment.objects.filter(status=Appointment.Status.BOOKED)
+            .values('doctor_id', 'start').annotate(n=Count('id')).filter(n__gt=1).count()
+        )
+        consistent = Slot.objects.filter(is_booked=True).count() == booked
+
+        attempts = args.workers * args.attempts
+        print(f'{slots} slots, {attempts} attempts by {args.workers} workers in {elapsed:.2f}s')
+        print(f'bookings/s: {booked / elapsed:8.1f}  attempts/s: {attempts / elapsed:8.1f}')
+        print(f'booked: {booked}  lock errors: {errors}  double bookings: {doubles}  slots consistent: {consistent}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Data generators for benchmarks.
+
+``build`` creates clinics, approved doctors and patients with
+``bulk_create`` (one password hash shared by every account) and indexes
+them for search. Usernames are predictable: ``patient<i>``,
+``doctor<i>`` and ``admin``, all with ``PASSWORD``.
+"""
+from dataclasses import dataclass
+
+PASSWORD = 'Str0ng-pass-phrase'
+SPECIALIZATIONS = ['Cardiology', 'Dermatology', 'Neurology', 'Oncology', 'Pediatrics', 'Radiology']
+BATCH_SIZE = 1000
+
+
+@dataclass
+class Dataset:
+    clinics: int
+    doctors: int
+    patients: int
+
+
+def build(clinics=20, doctors=500, patients=2000, password=PASSWORD):
+    from django.contrib.auth.hashers import make_password
+    from accounts import search
+    from accounts.models import Clinic, DoctorProfile, PatientProfile, User
+
+    encoded = make_password(password)
+    User.objects.create_superuser('admin', 'admin@example.com', password, role=User.Role.ADMIN)
+    clinic_rows = Clinic.objects.bulk_create(
+        [Clinic(name=f'Clinic {i}', address=f'{i} Main Street', email=f'clinic{i}@example.com')
+         for i in range(clinics)],
+        batch_size=BATCH_SIZE,
+    )
+
+    def users(prefix, count, role):
+        return User.objects.bulk_create(
+            [User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=encoded, role=role,
+                  first_name=prefix.title(), last_name=str(i))
+             for i in range(count)],
+            batch_size=BATCH_SIZE,
+        )
+
+    DoctorProfile.objects.bulk_create(
+        [DoctorProfile(
+            user=user, specialization=SPECIALIZATIONS[i % len(SPECIALIZATIONS)], qualification='MD',
+            experience_years=i % 30, clinic=clinic_rows[i % clinics] if clinics else None,
+            is_approved=bool(clinics),
+        ) for i, user in enumerate(users('doctor', doctors, User.Role.DOCTOR))],
+        batch_size=BATCH_SIZE,
+    )
+    PatientProfile.objects.bulk_create(
+        [PatientProfile(user=user) for user in users('patient', patients, User.Role.PATIENT)],
+        batch_size=BATCH_SIZE,
+    )
+    # bulk_create sends no signals, so build the search documents in one go
+    search.rebuild()
+    return Dataset(clinics, doctors, patients)
@@ -0,0 +1,142 @@
+"""
+Concurrent load test against a locally launched server.
+
+A throwaway SQLite database is migrated and seeded with
+``factories.build``, a server is started on a local port (gunicorn,
+uvicorn, or ``runserver`` as a fallback), and virtual users log in as
+patients, then repeatedly load the dashboard, the doctor directory API
+and search. Per-endpoint p50/p95/p99 latency and queries per request
+(read from the ``Server-Timing`` header) are reported as JSON.
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from pathlib import Path
+from . import queries_of, summarize, write_results
+from .asgi_vs_wsgi import free_port, wait_for_port
+from .factories import PASSWORD
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+ENDPOINTS = {
+    'dashboard': '/accounts/dashboard/',
+    'doctor_directory': '/accounts/api/doctors/?specialization=Cardiology',
+    'search': '/accounts/api/search/?q=cardio',
+}
+
+
+def seed(db_path, clinics, doctors, patients):
+    os.environ['CURENET_SQLITE_PATH'] = str(db_path)
+    from . import setup_django
+    setup_django()
+    from django.core.management import call_command
+    from .factories import build
+
+    call_command('migrate', verbosity=0)
+    build(clinics, doctors, patients)
+
+
+def server_command(server, port, workers):
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', 'curenet.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers), '--log-level', 'warning']
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'curenet.asgi:application', '--port', str(port),
+                '--workers', str(workers), '--log-level', 'warning']
+    return [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}']
+
+
+class VirtualUser:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def fetch(self, path, data=None, headers=None):
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers or {})
+        start = time.perf_counter()
+        with self.opener.open(request) as response:
+            response.read()
+            return time.perf_counter() - start, queries_of(response)
+
+    def login(self, username):
+        login_url = self.base_url + '/accounts/login/'
+        page = self.opener.open(login_url).read().decode()
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+        data = urllib.parse.urlencode({'csrfmiddlewaretoken': token, 'username': username, 'password': PASSWORD})
+        return self.fetch('/accounts/login/', data.encode(), {'Referer': login_url})
+
+
+def run_user(base_url, username, rounds):
+    """Log in and make ``rounds`` passes over ENDPOINTS; return samples per endpoint."""
+    user = VirtualUser(base_url)
+    samples = {'login': [user.login(username)]}
+    for _ in range(rounds):
+        for name, path in ENDPOINTS.items():
+            samples.setdefault(name, []).append(user.fetch(path))
+    return samples
+
+
+def drive(base_url, users, concurrency, rounds):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        per_user = list(pool.map(lambda i: run_user(base_url, f'patient{i}', rounds), range(users)))
+    elapsed = time.perf_counter() - start
+
+    merged = {}
+    for samples in per_user:
+        for name, pairs in samples.items():
+            merged.setdefault(name, []).extend(pairs)
+    results = {
+        name: summarize([latency for latency, _ in pairs], [q for _, q in pairs if q is not None])
+        for name, pairs in merged.items()
+    }
+    results['overall'] = {'requests_per_second': round(sum(len(p) for p in merged.values()) / elapsed, 1)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--server', choices=['gunicorn', 'uvicorn', 'runserver'],
+                        default='gunicorn' if find_spec('gunicorn') else 'runserver')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--rounds', type=int, default=10, help='passes over the endpoints per user')
+    parser.add_argument('--clinics', type=int, default=20)
+    parser.add_argument('--doctors', type=int, default=500)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    if args.users > args.patients:
+        parser.error('--users cannot exceed --patients')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'load.sqlite3'
+        seed(db_path, args.clinics, args.doctors, args.patients)
+
+        port = free_port()
+        # Every virtual user logs in from 127.0.0.1
+        env = {**os.environ, 'CURENET_SQLITE_PATH': str(db_path), 'CURENET_LOGIN_IP_LIMIT': str(10 ** 9)}
+        server = subprocess.Popen(server_command(args.server, port, args.workers), cwd=PROJECT_DIR, env=env)
+        try:
+            wait_for_port(port)
+            results = drive(f'http://127.0.0.1:{port}', args.users, args.concurrency, args.rounds)
+        finally:
+            server.terminate()
+            server.wait()
+
+    results['overall'].update(server=args.server, workers=args.workers, users=args.users,
+                              concurrency=args.concurrency)
+    write_results('load', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Memory use of medical record uploads and downloads.
+
+Uploads a generated file of each ``--sizes`` (MiB) through the WSGI and
+ASGI handlers (``--servers``) as a streamed multipart body, uploads it
+again (a deduplicated copy), downloads it whole and reads a byte range
+from its middle, reporting throughput and how much each step raised the
+process's peak RSS. Streaming keeps the growth flat under both: a 1 GiB
+file should cost about as much memory as a 16 MiB one. Needs free disk
+for about twice the largest size.
+"""
+import argparse
+import asyncio
+import resource
+import tempfile
+import time
+from io import BufferedReader, BytesIO, RawIOBase
+from . import setup_django, test_database
+
+BOUNDARY = 'curenet-benchmark-boundary'
+BLOCK = bytes(range(256)) * 4096  # 1 MiB
+
+
+class MultipartBody(RawIOBase):
+    """A multipart/form-data body with one ``size``-byte file, generated as it is read."""
+
+    def __init__(self, size, fields):
+        super().__init__()
+        head = ''.join(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="scan.bin"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+        )
+        self.head, self.tail = BytesIO(head.encode()), BytesIO(f'\r\n--{BOUNDARY}--\r\n'.encode())
+        self.remaining = size
+        self.length = len(self.head.getvalue()) + size + len(self.tail.getvalue())
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        chunk = self.head.read(size)
+        if not chunk and self.remaining:
+            chunk = BLOCK[:min(size, self.remaining, len(BLOCK))]
+            self.remaining -= len(chunk)
+        if not chunk:
+            chunk = self.tail.read(size)
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def peak_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 1024], help='file sizes in MiB')
+    parser.add_argument('--servers', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.handlers.asgi import ASGIHandler
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from accounts.models import PatientProfile, User
+
+    handler, asgi_handler = WSGIHandler(), ASGIHandler()
+    csrf = 'b' * 32
+
+    def wsgi_call(method, path, cookie, body=None, **headers):
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80', 'wsgi.url_scheme': 'http', 'wsgi.errors': None,
+            'wsgi.input': BufferedReader(body) if body is not None else BytesIO(),
+            'HTTP_COOKIE': f'{settings.SESSION_COOKIE_NAME}={cookie}; {settings.CSRF_COOKIE_NAME}={csrf}',
+            'HTTP_X_CSRFTOKEN': csrf, **headers,
+        }
+        if body is not None:
+            environ['CONTENT_TYPE'] = f'multipart/form-data; boundary={BOUNDARY}'
+            environ['CONTENT_LENGTH'] = str(body.length)
+        status, received = [], 0
+        response = handler(environ, lambda code, response_headers, exc_info=None: status.append(code))
+        try:
+            for chunk in response:
+                received += len(chunk)
+        finally:
+            response.close()
+        return status[0], received
+
+    async def asgi_request(method, path, cookie, body, headers):
+        sent = {'status': None, 'received': 0}
+        scope_headers = [
+            (b'cookie', f'{settings.SESSION_COOKIE_NAME}={cookie}; {settings.CSRF_COOKIE_NAME}={csrf}'.encode()),
+            (b'x-csrftoken', csrf.encode()), (b'host', b'testserver'),
+        ]
+        scope_headers += [(name[5:].lower().replace('_', '-').encode(), value.encode()) for name, value in headers.items()]
+        if body is not None:
+            scope_headers += [
+                (b'content-type', f'multipart/form-data; boundary={BOUNDARY}'.encode()),
+                (b'content-length', str(body.length).encode()),
+            ]
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': scope_headers, 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+        reader = BufferedReader(body) if body is not None else BytesIO()
+        body_read = asyncio.Event()
+
+        async def receive():
+            if body_read.is_set():
+                # Stay connected until the handler stops listening
+                await asyncio.Event().wait()
+            chunk = reader.read(2 ** 20)
+            if not chunk:
+                body_read.set()
+            return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunk)}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                sent['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                sent['received'] += len(message.get('body', b''))
+
+        await asgi_handler(scope, receive, send)
+        return sent['status'], sent['received']
+
+    def asgi_call(method, path, cookie, body=None, **headers):
+        return asyncio.run(asgi_request(method, path, cookie, body, headers))
+
+    def step(label, size, operation):
+        before = peak_rss_mib()
+        began = time.perf_counter()
+        status, received = operation()
+        elapsed = time.perf_counter() - began
+        print(f'  {label:>18}: {status:<16} {received / 2 ** 20:8.1f} MiB out, '
+              f'{size / 2 ** 20 / elapsed:8.1f} MiB/s, peak RSS +{peak_rss_mib() - before:.1f} MiB')
+
+    with tempfile.TemporaryDirectory() as root, test_database(), override_settings(
+        ALLOWED_HOSTS=['testserver'], MEDICAL_RECORDS_ROOT=root, QUERY_BUDGET_ACTION='log',
+        MEDICAL_RECORD_MAX_BYTES=max(args.sizes) * 2 ** 20,
+    ):
+        user = User.objects.create_user('patient', password='unused', role=User.Role.PATIENT)
+        PatientProfile.objects.create(user=user)
+        client = Client()
+        client.force_login(user)
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        upload_url = reverse('accounts:upload_medical_record')
+
+        print(f'peak RSS before: {peak_rss_mib():.1f} MiB')
+        for mib in args.sizes:
+            size = mib * 2 ** 20
+            for server in args.servers:
+                call = wsgi_call if server == 'wsgi' else asgi_call
+                print(f'{mib} MiB file, {server.upper()}:')
+                step('upload', size, lambda: call('POST', upload_url, cookie, MultipartBody(size, {'title': 'scan'})))
+                step('duplicate upload', size, lambda: call('POST', upload_url, cookie, MultipartBody(size, {})))
+                record = user.patient_profile.medical_records.latest('pk')
+                download_url = reverse('accounts:download_medical_record', args=[record.pk])
+                step('download', size, lambda: call('GET', download_url, cookie))
+                half = size // 2
+                step('range download', half, lambda: call(
+                    'GET', download_url, cookie, HTTP_RANGE=f'bytes={size // 4}-{size // 4 + half - 1}',
+                ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Per-request session cost of each session strategy.
+
+Logs a patient in and times repeated dashboard requests under the 'db',
+'cached_db' and 'signed_cookies' engines, reporting the mean latency and
+the database queries each request issues.
+"""
+import argparse
+import time
+from . import percentile, setup_django, test_database
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import caches
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from accounts.models import PatientProfile, User
+
+    with test_database(), override_settings(PASSWORD_HASHERS=FAST_HASHERS):
+        user = User.objects.create_user('bench', 'bench@example.com', 'pass12345', role=User.Role.PATIENT)
+        PatientProfile.objects.create(user=user)
+        url = reverse('accounts:patient_dashboard')
+
+        for name, engine in ENGINES.items():
+            with override_settings(SESSION_ENGINE=engine):
+                caches['sessions'].clear()
+                client = Client()
+                client.login(username='bench', password='pass12345')
+                client.get(url)  # warm caches
+
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+                query_count = len(queries)  # the next request resets the log
+                samples = []
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    client.get(url)
+                    samples.append((time.perf_counter() - start) * 1000)
+            mean = sum(samples) / len(samples)
+            print(f'{name:>14}: {mean:6.2f} ms mean, {percentile(samples, 95):6.2f} ms p95, '
+                  f'{query_count} queries/request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Signups per second, before and after removing the second hash.
+
+"before" replays the old register_view: form.save() followed by
+authenticate(), i.e. two hashes per signup. "after" is the current path,
+which saves the form and logs the user in without re-hashing.
+"""
+import argparse
+from . import rate, setup_django, test_database
+
+PBKDF2 = ['django.contrib.auth.hashers.PBKDF2PasswordHasher']
+TUNED_SCRYPT = ['accounts.hashers.TunedScryptPasswordHasher']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--signups', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import authenticate
+    from django.test import override_settings
+    from accounts.forms import UserRegistrationForm
+
+    def signup(prefix, i, reauthenticate):
+        username = f'{prefix}{i}'
+        password = 'Str0ng-pass-phrase'
+        form = UserRegistrationForm({
+            'username': username, 'email': f'{username}@example.com', 'role': 'PATIENT',
+            'password1': password, 'password2': password,
+        })
+        assert form.is_valid(), form.errors
+        form.save()
+        if reauthenticate:
+            assert authenticate(username=username, password=password)
+
+    scenarios = [
+        ('before (pbkdf2, save + authenticate)', PBKDF2, True),
+        ('after  (pbkdf2, save + login)', PBKDF2, False),
+        ('after  (tuned scrypt, save + login)', TUNED_SCRYPT, False),
+    ]
+    with test_database():
+        for index, (label, hashers, reauthenticate) in enumerate(scenarios):
+            with override_settings(PASSWORD_HASHERS=hashers):
+                per_second = rate(args.signups, lambda i: signup(f's{index}_', i, reauthenticate))
+            print(f'{label}: {per_second:8.2f} signups/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Micro-benchmarks of the accounts flows through the test client.
+
+Seeds a throwaway test database with ``factories.build`` and times
+login, registration, the dashboard redirect and the admin changelists,
+reporting p50/p95/p99 latency and queries per request as JSON. Save a
+run with ``--output`` and pass it as ``--baseline`` to a later run to
+print the change per scenario, e.g. between two commits.
+"""
+import argparse
+import json
+import time
+from . import queries_of, setup_django, summarize, test_database, write_results
+from .factories import PASSWORD, build
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def measure(count, request):
+    """Call ``request(i)`` ``count`` times; return latencies and query counts."""
+    samples, queries = [], []
+    for i in range(count):
+        start = time.perf_counter()
+        response = request(i)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code < 400, (response.status_code, response.content[:200])
+        ran = queries_of(response)
+        if ran is not None:
+            queries.append(ran)
+    return summarize(samples, queries)
+
+
+def scenarios(iterations):
+    from django.test import Client
+    from django.urls import reverse
+    from accounts.models import User
+
+    login_url = reverse('accounts:login')
+    anonymous = Client()
+
+    def login(i):
+        response = anonymous.post(login_url, {'username': f'patient{i}', 'password': PASSWORD})
+        anonymous.logout()
+        return response
+
+    def register(i):
+        return Client().post(reverse('accounts:register'), {
+            'username': f'bench{i}', 'email': f'bench{i}@example.com', 'role': User.Role.PATIENT,
+            'password1': PASSWORD, 'password2': PASSWORD,
+        })
+
+    patient = Client()
+    patient.force_login(User.objects.get(username='patient0'))
+    doctor = Client()
+    doctor.force_login(User.objects.get(username='doctor0'))
+    admin = Client()
+    admin.force_login(User.objects.get(username='admin'))
+
+    return {
+        'login': (login, iterations),
+        'register': (register, iterations),
+        'profile_redirect_patient': (lambda i: patient.get(reverse('accounts:profile_redirect')), iterations * 5),
+        'profile_redirect_doctor': (lambda i: doctor.get(reverse('accounts:profile_redirect')), iterations * 5),
+        'admin_doctor_changelist': (lambda i: admin.get(reverse('admin:accounts_doctorprofile_changelist')), iterations),
+        'admin_patient_changelist': (lambda i: admin.get(reverse('admin:accounts_patientprofile_changelist')), iterations),
+        'admin_clinic_changelist': (lambda i: admin.get(reverse('admin:accounts_clinic_changelist')), iterations),
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    print(f'against {baseline_path} (commit {baseline.get("commit")}):')
+    for name, current in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        change = (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        print(f'  {name:>26}: p95 {before["p95_ms"]:8.2f} -> {current["p95_ms"]:8.2f} ms ({change:+.1f}%), '
+              f'queries {before.get("queries_per_request")} -> {current.get("queries_per_request")}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--iterations', type=int, default=20)
+    parser.add_argument('--clinics', type=int, default=20)
+    parser.add_argument('--doctors', type=int, default=500)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--only', action='append', help='run only the named scenario (repeatable)')
+    parser.add_argument('--fast-hashers', action='store_true',
+                        help='use MD5 so login and register timings exclude password hashing')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import override_settings
+
+    hashing = override_settings(PASSWORD_HASHERS=FAST_HASHERS) if args.fast_hashers else override_settings()
+    results = {}
+    # Every scenario logs in from the same address
+    unthrottled = override_settings(LOGIN_THROTTLE={**settings.LOGIN_THROTTLE, 'IP_LIMIT': 10 ** 9})
+    with test_database(), hashing, unthrottled, override_settings(ALLOWED_HOSTS=['testserver'], QUERY_BUDGET_ACTION='log'):
+        build(args.clinics, args.doctors, args.patients)
+        for name, (request, count) in scenarios(args.iterations).items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = measure(count, request)
+
+    write_results('suite', results, args.output)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Render time of each dashboard template.
+
+Every template is rendered with in-memory users and profiles (no
+database) under three setups: the template loaders without caching and
+no fragment cache, the cached loader with a cold fragment cache (as
+right after a restart), and the cached loader with warm fragments.
+"""
+import argparse
+import time
+from . import setup_django, summarize
+
+TEMPLATES = ('accounts/patient_dashboard.html', 'accounts/doctor_dashboard.html', 'accounts/pending_approval.html')
+UNCACHED_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+NO_FRAGMENTS = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--renders', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory, override_settings
+    from accounts.models import Clinic, DoctorProfile, PatientProfile, User
+
+    patient = User(username='patient', first_name='Pat', role=User.Role.PATIENT)
+    doctor = User(username='doctor', first_name='Doc', role=User.Role.DOCTOR)
+    profiles = {
+        'accounts/patient_dashboard.html': (patient, PatientProfile(user=patient, phone_number='555-0100')),
+        'accounts/doctor_dashboard.html': (doctor, DoctorProfile(
+            user=doctor, specialization='Cardiology', qualification='MD', experience_years=12,
+            clinic=Clinic(name='Central'), is_approved=True,
+        )),
+        'accounts/pending_approval.html': (doctor, None),
+    }
+
+    uncached_templates = [{**settings.TEMPLATES[0], 'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'], 'loaders': UNCACHED_LOADERS,
+    }}]
+    setups = {
+        'uncached loader, no fragments': override_settings(
+            TEMPLATES=uncached_templates, CACHES={**settings.CACHES, 'template_fragments': NO_FRAGMENTS},
+        ),
+        'cached loader, cold fragments': override_settings(
+            CACHES={**settings.CACHES, 'template_fragments': NO_FRAGMENTS},
+        ),
+        'cached loader, warm fragments': override_settings(),
+    }
+    factory = RequestFactory()
+    for template in TEMPLATES:
+        user, profile = profiles[template]
+        print(template)
+        for label, setup in setups.items():
+            with setup:
+                request = factory.get('/')
+                request.user, request.profile = user, profile
+                context = {'user': user, 'profile': profile}
+                render_to_string(template, context, request)  # warm the loader
+                samples = []
+                for _ in range(args.renders):
+                    start = time.perf_counter()
+                    render_to_string(template, context, request)
+                    samples.append(time.perf_counter() - start)
+            stats = summarize(samples)
+            print(f'  {label:>30}: p50 {stats["p50_ms"]:.3f} ms, p95 {stats["p95_ms"]:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
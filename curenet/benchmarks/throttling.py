@@ -0,0 +1,160 @@
+"""
+Legitimate login latency during a credential-stuffing attack.
+
+A throwaway SQLite database is seeded with patients and a gunicorn
+worker (threaded, so all requests share one throttle cache) is started
+three times: with no attack, under attack with throttling lifted, and
+under attack throttled to ``--ip-limit`` attempts per address. Attackers
+post wrong passwords for ``patient0``.. at a fixed total rate from their
+own loopback addresses while other patients log in one after another,
+each from its own address, and are timed. Without throttling every
+attempt costs a password hash and legitimate logins queue behind them;
+with it the attackers are answered 429 from the cache.
+"""
+import argparse
+import http.client
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from importlib.util import find_spec
+from pathlib import Path
+from . import summarize
+from .asgi_vs_wsgi import free_port, wait_for_port
+from .factories import PASSWORD
+from .load import seed
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+LOGIN_PATH = '/accounts/login/'
+
+
+class Client:
+    """A keep-alive HTTP client bound to a source address, with a cookie jar."""
+
+    def __init__(self, port, address):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, source_address=(address, 0), timeout=120)
+        self.cookies = {}
+
+    def request(self, method, path, form=None):
+        headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in self.cookies.items())}
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        content = response.read()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            name, _, rest = header.partition('=')
+            self.cookies[name] = rest.split(';', 1)[0]
+        return response.status, content
+
+    def login(self, username, password):
+        """Fetch the form for a CSRF token, then post it; returns the POST status and seconds."""
+        _, page = self.request('GET', LOGIN_PATH)
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1).decode()
+        start = time.perf_counter()
+        status, _ = self.request('POST', LOGIN_PATH, {
+            'csrfmiddlewaretoken': token, 'username': username, 'password': password,
+        })
+        return status, time.perf_counter() - start
+
+
+def attack(port, address, usernames, interval, stop, statuses):
+    """Post wrong passwords every ``interval`` seconds until ``stop`` is set."""
+    client = Client(port, address)
+    due, i = time.monotonic(), 0
+    while not stop.wait(max(0.0, due - time.monotonic())):
+        status, _ = client.login(usernames[i % len(usernames)], 'wrong-password')
+        statuses.append(status)
+        # Attempts that fell behind are dropped, not sent in a burst
+        due = max(due + interval, time.monotonic())
+        i += 1
+
+
+def scenario(db_path, extra_env, args, attackers):
+    port = free_port()
+    env = {**os.environ, **extra_env, 'CURENET_SQLITE_PATH': str(db_path)}
+    command = [sys.executable, '-m', 'gunicorn', 'curenet.wsgi:application', '--bind', f'127.0.0.1:{port}',
+               '--workers', '1', '--threads', str(args.attackers + 2), '--worker-class', 'gthread',
+               '--log-level', 'warning']
+    # Django logs every 429 as a warning
+    server = subprocess.Popen(command, cwd=PROJECT_DIR, env=env, stderr=subprocess.DEVNULL)
+    stop, statuses, threads = threading.Event(), [], []
+    try:
+        wait_for_port(port)
+        targets = [f'patient{i}' for i in range(args.targets)]
+        for i in range(attackers):
+            interval = attackers / args.attack_rate
+            thread = threading.Thread(target=attack, args=(port, f'127.0.1.{i + 1}', targets, interval, stop, statuses))
+            thread.start()
+            threads.append(thread)
+        if attackers:
+            # Let the throttled attackers use up their allowance first
+            time.sleep(args.warmup)
+        samples, failed = [], 0
+        began, first_attempt = time.perf_counter(), len(statuses)
+        for i in range(args.logins):
+            # A fresh client per login, as a new browser would be
+            client = Client(port, f'127.0.2.{i % 250 + 1}')
+            status, elapsed = client.login(f'patient{args.targets + i}', PASSWORD)
+            client.connection.close()
+            samples.append(elapsed)
+            failed += status != 302
+        duration = time.perf_counter() - began
+        # Attack attempts made while the legitimate logins were timed
+        attempts = statuses[first_attempt:]
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        server.terminate()
+        server.wait()
+    result = summarize(samples)
+    result['failed_logins'] = failed
+    if attackers:
+        result['attack_attempts_per_second'] = round(len(attempts) / duration, 1)
+        result['attack_throttled_share'] = round(attempts.count(429) / len(attempts), 3) if attempts else 0.0
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=30, help='legitimate logins per scenario')
+    parser.add_argument('--attackers', type=int, default=8, help='attacking addresses (one thread each)')
+    parser.add_argument('--attack-rate', type=float, default=40, help='attempts per second across all attackers')
+    parser.add_argument('--targets', type=int, default=200, help='usernames the attackers cycle through')
+    parser.add_argument('--ip-limit', type=int, default=10, help='attempts per address per window when throttled')
+    parser.add_argument('--warmup', type=float, default=15, help='seconds the attack runs before logins are timed')
+    args = parser.parse_args()
+    if find_spec('gunicorn') is None:
+        parser.error('gunicorn is required')
+
+    lifted = {'CURENET_LOGIN_IP_LIMIT': str(10 ** 9), 'CURENET_LOGIN_USERNAME_LIMIT': str(10 ** 9)}
+    throttled = {'CURENET_LOGIN_IP_LIMIT': str(args.ip_limit)}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'throttling.sqlite3'
+        seed(db_path, clinics=1, doctors=1, patients=args.targets + args.logins)
+        from django.db import connections
+        connections.close_all()
+        for label, env, attackers in (
+            ('no attack', lifted, 0),
+            ('attack, throttling off', lifted, args.attackers),
+            ('attack, throttling on', throttled, args.attackers),
+        ):
+            result = scenario(db_path, env, args, attackers)
+            line = f'{label:>24}: login p50 {result["p50_ms"]:8.1f} ms, p95 {result["p95_ms"]:8.1f} ms'
+            if attackers:
+                line += (f', attack {result["attack_attempts_per_second"]:7.1f}/s '
+                         f'({result["attack_throttled_share"]:.0%} throttled)')
+            if result['failed_logins']:
+                line += f', {result["failed_logins"]} failed'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""
+Shared cache configuration from a URL.
+
+``redis://`` and ``rediss://`` URLs select Django's Redis backend,
+``memcached://host:port[,host:port...]`` its pymemcache backend. Caches
+that every worker must agree on (e.g. sessions under ``cached_db``) take
+their URL from the environment; without one they stay process-local.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+MEMCACHED = 'memcached://'
+
+
+def shared_cache(url):
+    """A CACHES entry for ``url``, or None when ``url`` is empty."""
+    if not url:
+        return None
+    if url.startswith(('redis://', 'rediss://')):
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': url}
+    if url.startswith(MEMCACHED):
+        return {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': url[len(MEMCACHED):].split(','),
+        }
+    raise ImproperlyConfigured(f'Unsupported cache URL {url!r}; use redis://, rediss:// or memcached://.')
@@ -0,0 +1,105 @@
+"""
+Environment-driven database profiles.
+
+``CURENET_DB`` selects the profile:
+
+``sqlite`` (default)
+    A single-node SQLite file at ``CURENET_SQLITE_PATH`` (default
+    ``db.sqlite3`` in the project directory). Every new
+    connection gets the ``SQLITE_PRAGMAS`` below (WAL journal,
+    ``synchronous=NORMAL``, busy timeout, mmap) from a
+    ``connection_created`` hook in ``accounts.signals``, and write
+    transactions start ``IMMEDIATE`` so concurrent writers queue on the
+    busy timeout instead of failing on lock upgrade. Connections persist
+    for ``CURENET_SQLITE_CONN_MAX_AGE`` seconds.
+
+``postgresql``
+    ``CURENET_PG_NAME``/``USER``/``PASSWORD``/``HOST``/``PORT``. With
+    ``CURENET_PG_POOL_MAX_SIZE`` set, connections come from psycopg's
+    pool (Django 5.1+), sized by ``CURENET_PG_POOL_MIN_SIZE`` and
+    ``..._MAX_SIZE``. Otherwise connections persist for
+    ``CURENET_PG_CONN_MAX_AGE`` seconds with health checks. Pooling and
+    persistent connections are mutually exclusive.
+
+``CURENET_DB_REPLICAS`` adds read replicas ``replica_1``, ``replica_2``...
+as a comma-separated list of SQLite paths or PostgreSQL ``host[:port]``
+entries, configured like the primary otherwise. Tests mirror them to
+``default``.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+def _int(environ, name, default):
+    return int(environ.get(name, default))
+
+
+def sqlite_database(environ, base_dir=None):
+    """SQLite settings; the file defaults to ``db.sqlite3`` in ``base_dir``."""
+    name = environ.get('CURENET_SQLITE_PATH')
+    if not name:
+        if base_dir is None:
+            raise ImproperlyConfigured('Set CURENET_SQLITE_PATH or pass the base directory for db.sqlite3.')
+        name = base_dir / 'db.sqlite3'
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        # Keep connections (and their pragmas) across requests
+        'CONN_MAX_AGE': _int(environ, 'CURENET_SQLITE_CONN_MAX_AGE', 600),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+    }
+
+
+def postgresql_database(environ):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('CURENET_PG_NAME', 'curenet'),
+        'USER': environ.get('CURENET_PG_USER', 'curenet'),
+        'PASSWORD': environ.get('CURENET_PG_PASSWORD', ''),
+        'HOST': environ.get('CURENET_PG_HOST', 'localhost'),
+        'PORT': environ.get('CURENET_PG_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if environ.get('CURENET_PG_POOL_MAX_SIZE'):
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': _int(environ, 'CURENET_PG_POOL_MIN_SIZE', 2),
+            'max_size': _int(environ, 'CURENET_PG_POOL_MAX_SIZE', 10),
+            'timeout': _int(environ, 'CURENET_PG_POOL_TIMEOUT', 10),
+        }
+    else:
+        database['CONN_MAX_AGE'] = _int(environ, 'CURENET_PG_CONN_MAX_AGE', 600)
+    return database
+
+
+def databases(environ, base_dir):
+    """The DATABASES setting for the profile named by ``CURENET_DB``."""
+    profile = environ.get('CURENET_DB', 'sqlite')
+    if profile == 'sqlite':
+        primary = sqlite_database(environ, base_dir)
+    elif profile == 'postgresql':
+        primary = postgresql_database(environ)
+    else:
+        raise ValueError(f'Unknown CURENET_DB profile {profile!r}.')
+
+    databases = {'default': primary}
+    entries = [entry.strip() for entry in environ.get('CURENET_DB_REPLICAS', '').split(',') if entry.strip()]
+    for number, entry in enumerate(entries, start=1):
+        replica = {**primary, 'OPTIONS': dict(primary['OPTIONS']), 'TEST': {'MIRROR': 'default'}}
+        if profile == 'sqlite':
+            replica['NAME'] = entry
+        else:
+            replica['HOST'], _, port = entry.partition(':')
+            replica['PORT'] = port or primary['PORT']
+        databases[f'replica_{number}'] = replica
+    return databases
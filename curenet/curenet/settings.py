@@ -10,8 +10,16 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
+from importlib.util import find_spec
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
+from . import database
+from .caches import shared_cache
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -25,8 +33,13 @@ SECRET_KEY = 'django-insecure-_ou1seqr)-dc-0!dn)urmsgg*f_%%8^yi270$596vc87ylch0d
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+TESTING = 'test' in sys.argv[1:2]
+
 ALLOWED_HOSTS = []
 
+# Addresses allowed to scrape /accounts/metrics/ without a staff login
+INTERNAL_IPS = ['127.0.0.1']
+
 
 # Application definition
 
@@ -41,11 +54,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'accounts.middleware.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.ProfileMiddleware',
+    'accounts.middleware.AuditMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,15 +71,24 @@ ROOT_URLCONF = 'curenet.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing renders for accounts.instrumentation
+        'BACKEND': 'accounts.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory; runserver still
+            # reloads them when a template file changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.context_processors.profile',
             ],
         },
     },
@@ -70,16 +96,121 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'curenet.wsgi.application'
 
+# Serve the login and dashboard views from accounts.async_views. asgi.py
+# turns this on; WSGI deployments keep the sync views.
+ASYNC_VIEWS = os.environ.get('CURENET_ASYNC_VIEWS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# CURENET_DB picks the 'sqlite' (default) or 'postgresql' profile; see
+# curenet/database.py for the variables each one reads.
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+DATABASES = database.databases(os.environ, BASE_DIR)
+SQLITE_PRAGMAS = database.SQLITE_PRAGMAS
+
+# Accounts reads go to the replicas (CURENET_DB_REPLICAS) and writes to
+# 'default'; a browser that wrote reads from 'default' for a few seconds.
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# The default cache holds account statuses (accounts.services), which
+# each worker invalidates only in its own cache unless it is shared: set
+# CURENET_CACHE_URL (redis://... or memcached://...) when running more
+# than one worker process.
+DEFAULT_CACHE_URL = os.environ.get('CURENET_CACHE_URL')
+
+CACHES = {
+    'default': shared_cache(DEFAULT_CACHE_URL) or {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # {% cache %} fragments of base.html and the dashboards. Process-local,
+    # so a restart after a deploy drops fragments of old templates.
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template_fragments',
+    },
+    # Session cache in front of the database (cached_db), see Sessions below
+    'sessions': shared_cache(os.environ.get('CURENET_SESSION_CACHE_URL')) or {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    # Login throttle counters (accounts.throttling). Point this at a cache
+    # shared by all workers in production.
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Seconds a user's approval/active status is cached (see accounts.services).
+# Also how long other workers may still admit a deactivated or rejected
+# account when the default cache is process-local.
+ACCOUNT_STATUS_CACHE_TIMEOUT = int(os.environ.get('CURENET_STATUS_CACHE_TIMEOUT', 300 if DEFAULT_CACHE_URL else 15))
+
+# Login attempts allowed per client IP, and failed passwords per username,
+# in any WINDOW seconds. Further attempts get 429 without hashing.
+LOGIN_THROTTLE = {
+    'CACHE_ALIAS': 'throttle',
+    'WINDOW': 300,
+    'IP_LIMIT': int(os.environ.get('CURENET_LOGIN_IP_LIMIT', 100)),
+    'USERNAME_LIMIT': int(os.environ.get('CURENET_LOGIN_USERNAME_LIMIT', 10)),
+}
+
+
+# Performance instrumentation (accounts.instrumentation)
+#
+# Most queries a view may run per request. Over-budget requests are
+# logged, or raise under tests.
+
+VIEW_QUERY_BUDGETS = {
+    'accounts:register': 15,  # form checks, validation of the Lower() unique constraints, welcome email job
+    'accounts:login': 10,
+    'accounts:profile_redirect': 2,
+    'accounts:patient_dashboard': 2,
+    'accounts:doctor_dashboard': 2,
+    'accounts:doctor_directory': 2,
+    'accounts:search': 8,
+    'accounts:doctor_slots': 2,
+    'accounts:first_available': 2,
+    'accounts:book_appointment': 12,  # includes the availability index refresh
+    'accounts:medical_records': 3,
+    'accounts:upload_medical_record': 9,
+    'accounts:download_medical_record': 4,
 }
+QUERY_BUDGET_ACTION = 'raise' if TESTING else 'log'
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+#
+# 'db' is Django's default. 'cached_db' reads sessions from the 'sessions'
+# cache and writes through to the database; it needs that cache shared by
+# every worker (CURENET_SESSION_CACHE_URL), since a logout or key rotation
+# only evicts the copy of the worker serving it. 'signed_cookies' keeps
+# sessions client-side for stateless nodes. Purge expired database
+# sessions with `manage.py purgesessions`.
+
+SESSION_STRATEGY = os.environ.get('CURENET_SESSION_STRATEGY', 'db')
+if SESSION_STRATEGY == 'cached_db' and not os.environ.get('CURENET_SESSION_CACHE_URL'):
+    raise ImproperlyConfigured(
+        "CURENET_SESSION_STRATEGY='cached_db' needs CURENET_SESSION_CACHE_URL "
+        "(redis://... or memcached://...) so all workers share the session cache."
+    )
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_STRATEGY]
+SESSION_CACHE_ALIAS = 'sessions'
 
 
 # Password validation
@@ -101,6 +232,43 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+#
+# TIER picks the preferred hasher: 'argon2' (needs argon2-cffi, falls back
+# to scrypt without it), 'scrypt' or 'pbkdf2'. Hashes made by any other
+# listed hasher, or with a different cost, are upgraded on next login.
+# EXECUTOR_WORKERS bounds the thread pool that async views hash in.
+
+PASSWORD_HASHING = {
+    'TIER': os.environ.get('CURENET_PASSWORD_TIER', 'scrypt'),
+    'SCRYPT_WORK_FACTOR': 2 ** 14,
+    'SCRYPT_PARALLELISM': 1,
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 64 * 1024,
+    'ARGON2_PARALLELISM': 2,
+    'EXECUTOR_WORKERS': int(os.environ.get('CURENET_HASHING_WORKERS', 0)) or None,
+}
+
+_PREFERRED_HASHERS = {
+    'argon2': 'accounts.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'accounts.hashers.TunedScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+_tier = PASSWORD_HASHING['TIER']
+if _tier == 'argon2' and find_spec('argon2') is None:
+    _tier = 'scrypt'
+
+PASSWORD_HASHERS = [_PREFERRED_HASHERS[_tier]] + [
+    hasher for hasher in (
+        'accounts.hashers.TunedArgon2PasswordHasher',
+        'accounts.hashers.TunedScryptPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    ) if hasher != _PREFERRED_HASHERS[_tier]
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -120,6 +288,71 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Outside DEBUG, collectstatic writes content-hashed (cache-forever) and
+# gzipped files to STATIC_ROOT. WhiteNoise, when installed, serves them
+# with far-future cache headers; otherwise point the front server at
+# STATIC_ROOT with gzip_static and a long expiry for hashed names.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'accounts.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+if find_spec('whitenoise') is not None:
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+                      'whitenoise.middleware.WhiteNoiseMiddleware')
+    WHITENOISE_MAX_AGE = 0 if DEBUG else 3600  # unhashed names; hashed ones are cached forever
+
+
+# Medical records (accounts.records)
+#
+# Contents are stored once per SHA-256 under MEDICAL_RECORDS_ROOT, which
+# must not be served publicly. CURENET_RECORDS_SENDFILE hands downloads to
+# the front server: 'x-accel' for nginx (an internal location mapping
+# MEDICAL_RECORDS_ACCEL_PREFIX to the root) or 'x-sendfile' for Apache.
+
+MEDICAL_RECORDS_ROOT = Path(os.environ.get('CURENET_RECORDS_ROOT', BASE_DIR / 'records'))
+MEDICAL_RECORDS_SENDFILE = os.environ.get('CURENET_RECORDS_SENDFILE') or None
+MEDICAL_RECORDS_ACCEL_PREFIX = os.environ.get('CURENET_RECORDS_ACCEL_PREFIX', '/protected-records/')
+MEDICAL_RECORD_MAX_BYTES = int(os.environ.get('CURENET_RECORD_MAX_BYTES', 4 * 1024 ** 3))
+
+# Audit trail (accounts.audit)
+#
+# Profile changes are buffered per process and written in batches of
+# BATCH_SIZE, once the oldest has waited MAX_AGE seconds, and after each
+# request. Up to MAX_PENDING events are kept while the database refuses
+# writes; older ones are dropped with an error log.
+AUDIT = {
+    'ENABLED': os.environ.get('CURENET_AUDIT', '1') == '1',
+    'BATCH_SIZE': 500,
+    'MAX_AGE': 5.0,
+    'MAX_PENDING': 50000,
+}
+
+# Background jobs (accounts.jobs), run by `manage.py runworker`
+#
+# Failed jobs are retried after BACKOFF * 2 ** (attempts - 1) seconds, at
+# most BACKOFF_MAX, until MAX_ATTEMPTS. A job still running LEASE seconds
+# after it was claimed is assumed lost with its worker and queued again.
+JOBS = {
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 30,
+    'BACKOFF_MAX': 3600,
+    'LEASE': 600,
+    'POLL_INTERVAL': 1.0,
+}
+
+# Email, sent from background jobs (accounts.notifications)
+EMAIL_BACKEND = os.environ.get('CURENET_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('CURENET_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('CURENET_EMAIL_PORT', 25))
+DEFAULT_FROM_EMAIL = os.environ.get('CURENET_FROM_EMAIL', 'CureNet <no-reply@curenet.local>')
+
 # Login URLs
 LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'accounts:profile_redirect'
@@ -132,3 +365,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
+
+# Authentication backend that joins role profiles on login
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.ProfileBackend',
+]